@@ -0,0 +1,247 @@
+"""
+    Microbenchmarks of the publish and consume hot paths:
+
+    - measurements: building the batch of one publish cycle.
+    - publish: sensors Messaging.publish, serialization with every codec.
+    - decode: monitoring Messaging.decode_message_data of every codec's payload.
+    - consumer: Consumer._process_message through 1, 4 and 16 stages.
+    - workflow: SensorsWorkflow.process and flush into a fake Firebase sink.
+
+    Redis is replaced by an in-memory stand-in unless --redis is given, then the
+    REDIS_URL server is used. The results are saved as JSON, --compare prints the
+    change against the results of another commit.
+    Usage: python -m benchmarks --output results.json --compare baseline.json
+"""
+import argparse
+import contextlib
+import json
+import platform
+import queue
+import statistics
+import subprocess
+import time
+import timeit
+
+from benchmarks.fakes import fake_firebase, memory_redis
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import codecs
+from nucuhub.infrastructure.catalog import SensorCatalog, channel_key
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.monitoring import ConsumerStage
+from nucuhub.monitoring import infrastructure as monitoring_infrastructure
+from nucuhub.monitoring import internals
+from nucuhub.monitoring.workflows import SensorsWorkflow
+from nucuhub.sensors import infrastructure as sensors_infrastructure
+
+CHANNELS = [
+    ("bme680", "temperature", "bme680 temperature, celsius", 21.52),
+    ("bme680", "pressure", "bme680 pressure. hPa", 1012.35),
+    ("bme680", "humidity", "bme680 humidity, %RH", 45.121),
+    ("bme680", "gas_resistance", "bme680 gas resistance, Ohms", 120533),
+    ("bme680", "heat_stable", "bme680 heat_stable, boolean", True),
+    (
+        "cpu_temperature_sensor",
+        "thermal_zone0",
+        "CPU package temperature in celsius",
+        48.3,
+    ),
+]
+STAGES = (1, 4, 16)
+
+
+class PassStage(ConsumerStage):
+    def __init__(self, index):
+        self.name = f"PassStage{index}"
+
+    def process(self, message):
+        return True
+
+
+def create_batch() -> MeasurementBatch:
+    batch = MeasurementBatch()
+    timestamp = time.time()
+    for sensor_id, name, description, value in CHANNELS:
+        batch.append(sensor_id, name, timestamp, value, description)
+    return batch
+
+
+def sensors_message(codec_name: str) -> dict:
+    """
+        Builds the message the monitoring Producer gets for one publish cycle.
+    """
+    data = codecs.get_codec(codec_name).encode(create_batch())
+    if isinstance(data, str):
+        data = data.encode()
+    return {"type": "message", "pattern": None, "channel": b"sensors", "data": data}
+
+
+@contextlib.contextmanager
+def encoder(name: str):
+    previous = ApplicationConfig.SENSORS_ENCODER
+    ApplicationConfig.SENSORS_ENCODER = name
+    try:
+        yield
+    finally:
+        ApplicationConfig.SENSORS_ENCODER = previous
+
+
+def bench_measurements():
+    yield "measurements.batch", create_batch
+
+
+def bench_publish():
+    messaging = sensors_infrastructure.Messaging()
+    batch = create_batch()
+    for codec in codecs.CODECS:
+        with encoder(codec):
+            yield f"publish.{codec}", lambda: messaging.publish(batch)
+
+
+def bench_decode():
+    decode = monitoring_infrastructure.Messaging.decode_message_data
+    for codec in codecs.CODECS:
+        message = sensors_message(codec)
+        yield f"decode.{codec}", lambda: decode(message)
+
+
+def bench_consumer():
+    message = sensors_message("json")
+    for stages in STAGES:
+        shared_queue = queue.Queue()
+        consumer = internals.Consumer(shared_queue)
+        for index in range(stages):
+            consumer.add_stage(PassStage(index))
+
+        def process():
+            shared_queue.put(message)
+            consumer._process_message()
+
+        yield f"consumer.stages_{stages}", process
+
+
+def bench_workflow():
+    SensorCatalog().register(
+        {
+            channel_key(sensor_id, name): {
+                "sensor_id": sensor_id,
+                "name": name,
+                "description": description,
+            }
+            for sensor_id, name, description, _ in CHANNELS
+        }
+    )
+    for codec in codecs.CODECS:
+        workflow = SensorsWorkflow()
+        message = sensors_message(codec)
+
+        def process(workflow=workflow, message=message):
+            # Like the Consumer, which flushes the stages after every message.
+            workflow.process(message)
+            workflow.flush()
+
+        yield f"workflow.{codec}", process
+
+
+BENCHMARKS = (
+    bench_measurements,
+    bench_publish,
+    bench_decode,
+    bench_consumer,
+    bench_workflow,
+)
+
+
+def measure(function, repeat: int, min_time: float) -> dict:
+    """
+        Times the function like timeit: the number of calls per run is calibrated to
+        take at least min_time seconds.
+    :return: The nanoseconds per call of the fastest and the median run.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    runs = [seconds / number * 1e9 for seconds in timer.repeat(repeat, number)]
+    return {
+        "min_ns": min(runs),
+        "median_ns": statistics.median(runs),
+        "calls": number,
+        "repeat": repeat,
+    }
+
+
+def run(selected, repeat: int, min_time: float) -> dict:
+    results = {}
+    for benchmark in BENCHMARKS:
+        # The cases are set up lazily, every one runs while its generator is suspended.
+        for name, function in benchmark():
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            results[name] = measure(function, repeat, min_time)
+            print(f"{name:>24} {results[name]['median_ns']:>12.0f} ns")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nchange against {baseline['meta']['commit']}:")
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        change = result["median_ns"] / previous["median_ns"] - 1
+        print(f"{name:>24} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("benchmarks", nargs="*", help="Substrings of the names to run.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument(
+        "--redis", action="store_true", help="Use the REDIS_URL server."
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Results of a previous run.")
+    args = parser.parse_args()
+
+    redis = contextlib.nullcontext() if args.redis else memory_redis()
+    with redis, fake_firebase():
+        results = run(args.benchmarks, args.repeat, args.min_time)
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "redis": ApplicationConfig.REDIS_URL if args.redis else "memory",
+            "time": time.time(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"saved the results to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
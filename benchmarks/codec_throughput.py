@@ -0,0 +1,90 @@
+"""
+    Measures the encode and decode time and the payload size of every sensors topic codec
+    on batches shaped like the ones published by the BME680 and the CPU temperature
+    sensors: five BME680 channels and one thermal zone per publish cycle.
+
+    Usage: python -m benchmarks.codec_throughput --cycles 1 10 100 --repeat 2000
+"""
+import argparse
+import random
+import time
+import timeit
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import codecs
+from nucuhub.infrastructure.measurements import MeasurementBatch
+
+CHANNELS = [
+    ("bme680", "temperature", "bme680 temperature, celsius"),
+    ("bme680", "pressure", "bme680 pressure. hPa"),
+    ("bme680", "humidity", "bme680 humidity, %RH"),
+    ("bme680", "gas_resistance", "bme680 gas resistance, Ohms"),
+    ("bme680", "heat_stable", "bme680 heat_stable, boolean"),
+    ("cpu_temperature_sensor", "thermal_zone0", "CPU package temperature in celsius"),
+]
+
+
+def reading(name):
+    if name == "temperature":
+        return round(random.uniform(18, 30), 2)
+    if name == "pressure":
+        return round(random.uniform(990, 1030), 2)
+    if name == "humidity":
+        return round(random.uniform(30, 60), 3)
+    if name == "gas_resistance":
+        return random.randint(5000, 200000)
+    if name == "heat_stable":
+        return random.random() > 0.1
+    return random.randint(35000, 80000) / 1000
+
+
+def create_batch(cycles: int) -> MeasurementBatch:
+    """
+        Builds a batch with the readings of the given number of publish cycles.
+    """
+    batch = MeasurementBatch()
+    timestamp = time.time()
+    for cycle in range(cycles):
+        for sensor_id, name, description in CHANNELS:
+            batch.append(
+                sensor_id, name, timestamp + cycle * 10, reading(name), description
+            )
+    return batch
+
+
+def measure(codec: codecs.Codec, batch: MeasurementBatch, repeat: int) -> dict:
+    payload = codec.encode(batch)
+    encode = timeit.timeit(lambda: codec.encode(batch), number=repeat) / repeat
+    decode = timeit.timeit(lambda: codecs.decode(payload), number=repeat) / repeat
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return {"bytes": len(payload), "encode": encode, "decode": decode}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cycles", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    variants = [
+        ("json", "json", False),
+        ("json-compact", "json", True),
+        ("columns", "columns", True),
+    ]
+    print(
+        f"{'cycles':>7} {'codec':>13} {'bytes':>8} {'encode us':>10} {'decode us':>10}"
+    )
+    for cycles in args.cycles:
+        batch = create_batch(cycles)
+        for label, name, compact in variants:
+            ApplicationConfig.SENSORS_COMPACT_READINGS = compact
+            result = measure(codecs.get_codec(name), batch, args.repeat)
+            print(
+                f"{cycles:>7} {label:>13} {result['bytes']:>8}"
+                f" {result['encode'] * 1e6:>10.1f} {result['decode'] * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
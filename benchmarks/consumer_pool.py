@@ -0,0 +1,86 @@
+"""
+    Measures the throughput of the monitoring ConsumerPool in readings/sec for an
+    increasing number of workers. Every message carries one reading of every sensor
+    and the stage simulates an upload by sleeping for every reading, so the thread
+    pool should scale close to linearly while there are more sensors than workers.
+
+    Usage: python -m benchmarks.consumer_pool --workers 1 2 4 8 --sensors 32 --delay 0.001
+"""
+import argparse
+import json
+import queue
+import time
+
+from benchmarks.fakes import memory_redis
+from nucuhub.monitoring import internals
+
+
+class UploadStage(internals.ConsumerStage):
+    name = "UploadStage"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def process(self, message):
+        time.sleep(self.delay * len(message["data"]))
+        return True
+
+
+def create_messages(sensors: int, messages: int) -> list:
+    return [
+        {
+            "type": "message",
+            "channel": b"sensors",
+            "data": json.dumps(
+                [
+                    {"channel": f"sensor{sensor}:value", "value": index}
+                    for sensor in range(sensors)
+                ]
+            ).encode(),
+        }
+        for index in range(messages)
+    ]
+
+
+def run(workers: int, mode: str, messages: list, delay: float) -> float:
+    """
+        Dispatches the messages to the pool and waits for the workers to finish.
+    :return: The number of readings processed per second.
+    """
+    shared_queue = queue.Queue()
+    for message in messages:
+        shared_queue.put(message)
+    pool = internals.ConsumerPool(shared_queue, workers=workers, mode=mode)
+    pool.add_stage(UploadStage(delay))
+    start = time.perf_counter()
+    pool.start()
+    while not shared_queue.empty():
+        pool._process_message()
+    pool.stop()
+    elapsed = time.perf_counter() - start
+    readings = sum(len(json.loads(message["data"])) for message in messages)
+    return readings / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--sensors", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.001)
+    args = parser.parse_args()
+
+    messages = create_messages(args.sensors, args.messages)
+    baseline = None
+    with memory_redis():
+        for workers in args.workers:
+            rate = run(workers, args.mode, messages, args.delay)
+            baseline = baseline or rate
+            print(
+                f"{workers:>3} workers: {rate:10.1f} readings/sec, {rate / baseline:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
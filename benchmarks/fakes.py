@@ -0,0 +1,155 @@
+"""
+    In-memory stand-ins for redis and Firebase, so the benchmarks measure our code
+    instead of the network. They implement only the commands used on the hot paths.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import itertools
+
+from nucuhub.infrastructure.redis import RedisService
+from nucuhub.monitoring import infrastructure as monitoring_infrastructure
+
+
+def _bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class MemoryPubSub:
+    def subscribe(self, *channels):
+        pass
+
+    def unsubscribe(self, *channels):
+        pass
+
+    def get_message(self, ignore_subscribe_messages=False, timeout=0):
+        return None
+
+
+class MemoryRedis:
+    """
+        Keeps the published messages and the stream entries in bounded deques.
+    """
+
+    def __init__(self, history: int = 1000):
+        self.published = collections.defaultdict(
+            lambda: collections.deque(maxlen=history)
+        )
+        self.streams = collections.defaultdict(
+            lambda: collections.deque(maxlen=history)
+        )
+        self.hashes = collections.defaultdict(dict)
+        self.values = {}
+        self._ids = itertools.count(1)
+
+    def pubsub(self):
+        return MemoryPubSub()
+
+    def publish(self, channel, payload):
+        self.published[channel].append(payload)
+        return 1
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        entry_id = f"{next(self._ids)}-0".encode()
+        self.streams[name].append((entry_id, fields))
+        return entry_id
+
+    def xack(self, name, group, *ids):
+        return len(ids)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        entries = dict(mapping or {})
+        if field is not None:
+            entries[field] = value
+        self.hashes[key].update(
+            {_bytes(name): _bytes(value) for name, value in entries.items()}
+        )
+        return len(entries)
+
+    def hget(self, key, field):
+        return self.hashes[key].get(_bytes(field))
+
+    def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = _bytes(value)
+        return True
+
+
+class MemoryRedisService:
+    def __init__(self):
+        self.redis = MemoryRedis()
+
+    def get_redis(self):
+        return self.redis
+
+
+class FakeFirebase:
+    """
+        Firebase sink counting the saved entries.
+    """
+
+    saved = 0
+    paths = {}
+    _keys = itertools.count()
+
+    @classmethod
+    def instance(cls):
+        return cls
+
+    @classmethod
+    def save(cls, collection_name, data):
+        cls.saved += 1
+        return {"name": f"-{cls.saved}"}
+
+    @classmethod
+    def set(cls, path, data):
+        cls.paths[path] = data
+        return data
+
+    @classmethod
+    def generate_key(cls):
+        return f"-{next(cls._keys):019d}"
+
+    @classmethod
+    def update(cls, path, updates):
+        cls.saved += len(updates)
+        return updates
+
+    @classmethod
+    def update_async(cls, path, updates):
+        future = concurrent.futures.Future()
+        future.set_result(cls.update(path, updates))
+        return future
+
+
+@contextlib.contextmanager
+def memory_redis():
+    """
+        Makes RedisService.instance() return a MemoryRedisService.
+    """
+    service = MemoryRedisService()
+    RedisService.set_singleton(service)
+    try:
+        yield service.redis
+    finally:
+        RedisService.set_singleton(None)
+
+
+@contextlib.contextmanager
+def fake_firebase():
+    """
+        Replaces the Firebase sink of the monitoring workflows with FakeFirebase.
+    """
+    firebase = monitoring_infrastructure.Firebase
+    monitoring_infrastructure.Firebase = FakeFirebase
+    try:
+        yield FakeFirebase
+    finally:
+        monitoring_infrastructure.Firebase = firebase
@@ -0,0 +1,83 @@
+"""
+    Compares writing sensors readings to Firebase with one push request per reading
+    against the FirebaseBatchSink multi-path updates, in readings/sec.
+
+    Firebase is replaced by a local HTTP server implementing the authentication and
+    Realtime Database REST calls used by the monitoring worker, it answers after
+    --latency milliseconds to simulate the round trip to the real database. The
+    uploader runs up to --max-in-flight requests at once.
+    Usage: python -m benchmarks.firebase_sink --readings 600 --latency 20 --max-in-flight 4
+"""
+import argparse
+import time
+
+from nucuhub.monitoring.infrastructure import Firebase
+from nucuhub.monitoring.sink import FirebaseBatchSink
+from nucuhub.monitoring.tests.mocks import FakeFirebaseServer
+from nucuhub.monitoring.uploader import FirebaseUploader
+
+FLUSH_SIZES = (6, 100, 500)
+
+
+def use_server(server: FakeFirebaseServer, max_in_flight: int):
+    """
+        Points the Firebase writes to the local server.
+    """
+    Firebase._configure(server.config())
+    Firebase.set_singleton(Firebase())
+    Firebase._uploader = FirebaseUploader(server.config(), max_in_flight=max_in_flight)
+
+
+def readings(count: int) -> list:
+    return [
+        {"channel": "bme680:temperature", "timestamp": index, "value": 21.5}
+        for index in range(count)
+    ]
+
+
+def bench_push(count: int):
+    for reading in readings(count):
+        Firebase.save("sensors", reading)
+
+
+def bench_sink(count: int, flush_size: int):
+    # Flushes by size only, the size of a BME680 cycle is like the default interval 0.
+    sink = FirebaseBatchSink("sensors", flush_size=flush_size, flush_interval=3600)
+    # One BME680 cycle publishes 6 readings per message.
+    entries = readings(count)
+    for start in range(0, count, 6):
+        sink.add(entries[start : start + 6])
+        sink.flush_if_due()
+    sink.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--readings", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=20, help="Milliseconds.")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeFirebaseServer(latency=args.latency / 1000).start()
+    use_server(server, args.max_in_flight)
+    cases = [("push", lambda: bench_push(args.readings))] + [
+        (f"update.{size}", lambda size=size: bench_sink(args.readings, size))
+        for size in FLUSH_SIZES
+    ]
+    for name, run in cases:
+        server.requests = 0
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>12}: {args.readings / elapsed:10.1f} readings/sec, "
+            f"{server.requests} requests"
+        )
+    Firebase._uploader.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+    Compares the memory and time needed to build and serialize one publish cycle of
+    measurements with:
+
+    - legacy: a regular dataclass per sample, serialized through item.__dict__.
+    - slotted: the slotted SensorMeasurement, serialized through to_dict().
+    - batch: the columnar MeasurementBatch, serialized with to_json().
+
+    Every variant runs in a fresh interpreter so the RSS numbers don't influence each other.
+    Usage: python -m benchmarks.measurements --samples 1000 5000 20000
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing
+from dataclasses import dataclass
+
+from nucuhub.infrastructure.measurements import (  # isort:skip
+    MeasurementBatch,
+    SensorMeasurement,
+)
+
+VARIANTS = ("legacy", "slotted", "batch")
+CHANNELS = [
+    ("bme680", "temperature", "bme680 temperature, celsius"),
+    ("bme680", "pressure", "bme680 pressure. hPa"),
+    ("bme680", "humidity", "bme680 humidity, %RH"),
+    ("bme680", "gas_resistance", "bme680 gas resistance, Ohms"),
+    ("bme680", "heat_stable", "bme680 heat_stable, boolean"),
+    ("cpu_temperature_sensor", "thermal_zone0", "CPU package temperature in celsius"),
+]
+
+
+@dataclass
+class LegacyMeasurement:
+    sensor_id: str
+    name: str
+    description: str
+    timestamp: int
+    value: typing.Union[int, float, str]
+
+
+def samples(count):
+    timestamp = time.time()
+    for index in range(count):
+        sensor_id, name, description = CHANNELS[index % len(CHANNELS)]
+        # Copy the strings, sensor modules build them for every read.
+        yield f"{sensor_id}", f"{name}", f"{description}", timestamp, index * 0.5
+
+
+def build(variant, count):
+    if variant == "legacy":
+        return [LegacyMeasurement(*sample) for sample in samples(count)]
+    if variant == "slotted":
+        return [SensorMeasurement(*sample) for sample in samples(count)]
+    batch = MeasurementBatch()
+    for sensor_id, name, description, timestamp, value in samples(count):
+        batch.append(sensor_id, name, timestamp, value, description)
+    return batch
+
+
+def serialize(variant, data):
+    if variant == "legacy":
+        return json.dumps([item.__dict__ for item in data])
+    if variant == "slotted":
+        return json.dumps([item.to_dict() for item in data])
+    return data.to_json()
+
+
+def current_rss():
+    """
+        The resident set size of the process in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as fd:
+            return int(fd.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_child(variant, count):
+    gc.collect()
+    rss_before = current_rss()
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build(variant, count)
+    retained, _ = tracemalloc.get_traced_memory()
+    payload = serialize(variant, data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = current_rss() - rss_before
+    print(
+        json.dumps(
+            {
+                "retained_bytes": retained,
+                "peak_bytes": peak,
+                "rss_bytes": rss,
+                "seconds": elapsed,
+                "payload_bytes": len(payload),
+            }
+        )
+    )
+    return data
+
+
+def run(variant, count) -> dict:
+    """
+        Runs a variant in a new interpreter.
+    :return: The measured numbers.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.measurements", "--child", variant]
+        + ["--samples", str(count)],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.samples[0])
+        return
+
+    print(
+        f"{'samples':>8} {'variant':>8} {'retained KiB':>13} {'peak KiB':>10}"
+        f" {'RSS KiB':>9} {'ms':>8}"
+    )
+    for count in args.samples:
+        for variant in VARIANTS:
+            result = run(variant, count)
+            print(
+                f"{count:>8} {variant:>8} {result['retained_bytes'] / 1024:>13.1f}"
+                f" {result['peak_bytes'] / 1024:>10.1f} {result['rss_bytes'] / 1024:>9.0f}"
+                f" {result['seconds'] * 1000:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+    Measures the throughput of the monitoring Producer -> Consumer pipeline in
+    messages/sec, once with the sleeping run mode and once with the event driven one.
+
+    Requires a running redis server, see the REDIS_URL environment variable.
+    Usage: python -m benchmarks.monitoring_throughput --messages 5000 --duration 5
+"""
+import argparse
+import queue
+import threading
+import time
+
+from nucuhub.infrastructure.redis import RedisService
+from nucuhub.monitoring import internals
+
+TOPIC = "benchmark_monitoring_throughput"
+
+
+class CountingStage(internals.ConsumerStage):
+    name = "CountingStage"
+
+    def __init__(self):
+        self.count = 0
+        self.done = threading.Event()
+        self.expected = 0
+
+    def process(self, message):
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+        return True
+
+
+def run(event_driven: bool, messages: int, duration: float) -> float:
+    """
+        Pushes messages through a Producer and a Consumer.
+    :return: The number of messages processed per second.
+    """
+    shared_queue = queue.Queue(maxsize=100)
+    producer = internals.Producer(shared_queue)
+    producer.set_topics(TOPIC)
+    consumer = internals.Consumer(shared_queue)
+    stage = CountingStage()
+    stage.expected = messages
+    consumer.add_stage(stage)
+    for worker in (producer, consumer):
+        worker.event_driven = event_driven
+
+    threads = [
+        threading.Thread(target=producer.loop_forever),
+        threading.Thread(target=consumer.loop_forever),
+    ]
+    for thread in threads:
+        thread.start()
+    # Messages published before the subscription is active are lost.
+    time.sleep(0.5)
+
+    redis = RedisService.instance().get_redis()
+    start = time.perf_counter()
+    for index in range(messages):
+        redis.publish(TOPIC, index)
+    stage.done.wait(timeout=duration)
+    elapsed = time.perf_counter() - start
+
+    producer.shutdown()
+    consumer.shutdown()
+    for thread in threads:
+        thread.join()
+    return stage.count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    for name, event_driven in (("sleep", False), ("event-driven", True)):
+        rate = run(event_driven, args.messages, args.duration)
+        print(f"{name:>12}: {rate:10.1f} messages/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+    Measures how long the sensors worker takes to discover and import its sensor modules:
+
+    - scan: imports every module of the sensor modules package and scans it for
+      SensorModule sub-classes, like the worker did before the manifest.
+    - manifest-cold: builds the manifest and imports only the enabled sensors.
+    - manifest-warm: same, with the manifest read from its cache.
+
+    The sensors are enabled according to their default config, --disabled disables more
+    of them, e.g. --disabled bme680 on a board without the BME680. Every variant runs in
+    a fresh interpreter.
+    Usage: python -m benchmarks.sensors_startup --runs 5 --disabled bme680
+"""
+import argparse
+import importlib
+import json
+import os
+import pathlib
+import pkgutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+VARIANTS = ("scan", "manifest-cold", "manifest-warm")
+HARDWARE_LIBRARIES = ("bme680", "smbus", "smbus2")
+
+
+def scan_import():
+    from nucuhub.sensors.types import SensorModule
+
+    sensor_modules = []
+    module_path = (
+        pathlib.Path(__file__).parent.parent / "nucuhub" / "sensors" / "modules"
+    )
+    for (_, submodule_name, _) in pkgutil.iter_modules([str(module_path)]):
+        module = importlib.import_module(
+            f".modules.{submodule_name}", package="nucuhub.sensors"
+        )
+        for mod in dir(module):
+            if mod.startswith("_") or mod == "SensorModule":
+                continue
+            try:
+                sensor_module = getattr(module, mod)
+                if issubclass(sensor_module, SensorModule):
+                    sensor_modules.append(sensor_module)
+            except TypeError:
+                pass
+    return sensor_modules
+
+
+def manifest_import(cache_path, disabled):
+    from nucuhub.sensors.manifest import SensorManifest
+
+    entries = SensorManifest(cache_path=cache_path).load()
+    return [
+        entry.load_class()
+        for entry in entries.values()
+        if entry.enabled is not False and entry.sensor_id not in disabled
+    ]
+
+
+def run_child(variant, cache_path, disabled):
+    start = time.perf_counter()
+    if variant == "scan":
+        sensor_modules = scan_import()
+    else:
+        sensor_modules = manifest_import(cache_path, disabled)
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "sensors": len(sensor_modules),
+                "hardware": [
+                    name for name in HARDWARE_LIBRARIES if name in sys.modules
+                ],
+            }
+        )
+    )
+
+
+def run(variant, cache_path, disabled) -> dict:
+    """
+        Runs a variant in a new interpreter.
+    :return: The measured numbers.
+    """
+    if variant == "manifest-cold" and os.path.exists(cache_path):
+        os.remove(cache_path)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.sensors_startup", "--child", variant]
+        + ["--cache", cache_path, "--disabled", *disabled],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--disabled", nargs="*", default=[])
+    parser.add_argument("--cache", help=argparse.SUPPRESS)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.cache, set(args.disabled))
+        return
+
+    cache_path = os.path.join(tempfile.mkdtemp(), "manifest.json")
+    print(f"{'variant':>14} {'median ms':>10} {'sensors':>8}  hardware libraries")
+    for variant in VARIANTS:
+        results = [run(variant, cache_path, args.disabled) for _ in range(args.runs)]
+        median = statistics.median(result["seconds"] for result in results)
+        print(
+            f"{variant:>14} {median * 1000:>10.1f} {results[-1]['sensors']:>8}"
+            f"  {', '.join(results[-1]['hardware']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
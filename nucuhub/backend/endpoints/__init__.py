@@ -1 +1,2 @@
+from .catalog import CatalogEndpoint
 from .sensors import SensorsEndpoint
@@ -0,0 +1,20 @@
+from nucuhub.infrastructure.catalog import CatalogCache
+from starlette.concurrency import run_in_threadpool
+from starlette.endpoints import HTTPEndpoint
+from starlette.responses import UJSONResponse
+
+catalog_cache = CatalogCache()
+
+
+class CatalogEndpoint(HTTPEndpoint):
+    async def get(self, request):
+        """
+            Returns the sensor channels catalog or the metadata of a single channel.
+        """
+        channel = request.path_params.get("channel")
+        if channel is None:
+            return UJSONResponse(await run_in_threadpool(catalog_cache.all))
+        metadata = await run_in_threadpool(catalog_cache.resolve, channel)
+        if metadata is None:
+            return UJSONResponse({"error": "unknown channel"}, status_code=404)
+        return UJSONResponse(metadata)
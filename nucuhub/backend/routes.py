@@ -1,4 +1,4 @@
-from nucuhub.backend.endpoints import SensorsEndpoint
+from nucuhub.backend.endpoints import CatalogEndpoint, SensorsEndpoint
 from starlette.routing import Route
 
 
@@ -6,5 +6,7 @@ def get_default_routes():
     routes = [
         Route("/", SensorsEndpoint),
         Route("/api/v1/sensors", SensorsEndpoint),
+        Route("/api/v1/sensors/catalog", CatalogEndpoint),
+        Route("/api/v1/sensors/catalog/{channel}", CatalogEndpoint),
     ]
     return routes
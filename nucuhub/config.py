@@ -1,4 +1,6 @@
 import os
+import socket
+import tempfile
 
 
 class ApplicationConfig:
@@ -6,8 +8,105 @@ class ApplicationConfig:
     BACKEND_DEBUG = bool(os.getenv("BACKEND_DEBUG", False))
     # Affects the logging level across all modules.
     LOGGING_LEVEL = os.getenv("LOG_LEVEL")
+    # The runtime used by the sensors and monitoring workers: threaded or asyncio.
+    RUNTIME = os.getenv("RUNTIME") or "threaded"
     # Override the REDIS_URL, useful for testing & debugging.
     REDIS_URL = os.getenv("REDIS_URL") or "redis_service"
+    # The transport between the sensors and monitoring workers: pubsub or streams.
+    MESSAGING_TRANSPORT = os.getenv("MESSAGING_TRANSPORT") or "pubsub"
+    # Streams are trimmed to approximately this number of entries.
+    STREAMS_MAXLEN = int(os.getenv("STREAMS_MAXLEN", 10000))
+    # The consumer group shared by the monitoring processes and this process' name in it.
+    STREAMS_CONSUMER_GROUP = os.getenv("STREAMS_CONSUMER_GROUP") or "monitoring"
+    STREAMS_CONSUMER_NAME = os.getenv("STREAMS_CONSUMER_NAME") or socket.gethostname()
+    # Maximum number of entries read from the streams at once.
+    STREAMS_READ_COUNT = int(os.getenv("STREAMS_READ_COUNT", 100))
+    # Entries pending for longer than this, e.g. of a crashed consumer, are claimed.
+    STREAMS_CLAIM_IDLE_MS = int(os.getenv("STREAMS_CLAIM_IDLE_MS", 60000))
+    # If true the monitoring workers block on their source instead of also sleeping
+    # when there was no work.
+    MONITORING_EVENT_DRIVEN = os.getenv("MONITORING_EVENT_DRIVEN", "1") == "1"
+    # Maximum number of messages the monitoring consumer takes through its stages at
+    # once and milliseconds it waits to fill a batch, a size of 1 disables batching.
+    MONITORING_BATCH_SIZE = int(os.getenv("MONITORING_BATCH_SIZE", 1))
+    MONITORING_BATCH_TIMEOUT_MS = int(os.getenv("MONITORING_BATCH_TIMEOUT_MS", 50))
+    # Maximum number of messages the monitoring producer buffers while the queue is full
+    # and what happens once the buffer is full: drop-oldest, drop-newest, block or spill,
+    # see monitoring.buffer.OverflowPolicy. Spilled messages are written to a file, the
+    # pid of the worker is appended to its path. The spill file isn't durable: messages
+    # left in it when the worker stops are lost and the next worker removes it.
+    MONITORING_BUFFER_SIZE = int(os.getenv("MONITORING_BUFFER_SIZE", 1000))
+    MONITORING_BUFFER_POLICY = os.getenv("MONITORING_BUFFER_POLICY") or "drop-oldest"
+    MONITORING_SPILL_PATH = os.getenv("MONITORING_SPILL_PATH") or os.path.join(
+        tempfile.gettempdir(), "nucuhub_monitoring_spill"
+    )
+    MONITORING_SPILL_MAX_BYTES = int(os.getenv("MONITORING_SPILL_MAX_BYTES", 64 << 20))
+    # If set the monitoring producer and consumer exchange messages through a segment log
+    # in this directory instead of memory, see monitoring.segmentlog. The log is split
+    # into segments of MONITORING_LOG_SEGMENT_BYTES, holds at most MONITORING_LOG_MAX_BYTES
+    # and is fsynced every MONITORING_LOG_FSYNC_RECORDS records or MONITORING_LOG_FSYNC_MS.
+    # Messages that failed are delivered again after MONITORING_LOG_RETRY_MS.
+    MONITORING_LOG_DIR = os.getenv("MONITORING_LOG_DIR")
+    MONITORING_LOG_SEGMENT_BYTES = int(
+        os.getenv("MONITORING_LOG_SEGMENT_BYTES", 16 << 20)
+    )
+    MONITORING_LOG_MAX_BYTES = int(os.getenv("MONITORING_LOG_MAX_BYTES", 1 << 30))
+    MONITORING_LOG_FSYNC_RECORDS = int(os.getenv("MONITORING_LOG_FSYNC_RECORDS", 100))
+    MONITORING_LOG_FSYNC_MS = int(os.getenv("MONITORING_LOG_FSYNC_MS", 1000))
+    MONITORING_LOG_RETRY_MS = int(os.getenv("MONITORING_LOG_RETRY_MS", 5000))
+    # The sensors readings are written to Firebase with multi-path updates of at most
+    # MONITORING_FIREBASE_FLUSH_SIZE readings, once that many are pending or the oldest
+    # one is MONITORING_FIREBASE_FLUSH_INTERVAL_MS old, 0 writes them after every message.
+    # Their messages are acknowledged once they were written.
+    MONITORING_FIREBASE_FLUSH_SIZE = int(
+        os.getenv("MONITORING_FIREBASE_FLUSH_SIZE", 500)
+    )
+    MONITORING_FIREBASE_FLUSH_INTERVAL_MS = int(
+        os.getenv("MONITORING_FIREBASE_FLUSH_INTERVAL_MS", 0)
+    )
+    # Flushes that retry the readings of a failed update before they are dropped, if
+    # their messages aren't delivered again: with the pub/sub transport and without
+    # MONITORING_LOG_DIR.
+    MONITORING_FIREBASE_RETRIES = int(os.getenv("MONITORING_FIREBASE_RETRIES", 3))
+    # Number of monitoring consumer workers and whether they are threads, for I/O bound
+    # stages, or processes, for CPU bound stages. Readings of a sensor stay in order.
+    MONITORING_CONSUMER_WORKERS = int(os.getenv("MONITORING_CONSUMER_WORKERS", 1))
+    MONITORING_CONSUMER_POOL = os.getenv("MONITORING_CONSUMER_POOL", "thread")
+    # If true the published readings only carry the channel key, the timestamp and the value.
+    SENSORS_COMPACT_READINGS = os.getenv("SENSORS_COMPACT_READINGS", "1") == "1"
+    # The codec used to publish readings: json, which every consumer understands, or columns.
+    SENSORS_ENCODER = os.getenv("SENSORS_ENCODER") or "json"
+    # The codecs accepted by consumers, payloads without a codec version byte are decoded as json.
+    SENSORS_DECODERS = (os.getenv("SENSORS_DECODERS") or "json,columns").split(",")
+    # Seconds between two writes of the changed sensor configs.
+    SENSORS_CONFIG_FLUSH_INTERVAL = float(os.getenv("SENSORS_CONFIG_FLUSH_INTERVAL", 5))
+    # Cache of the sensors manifest, it maps the sensor ids to their modules.
+    SENSORS_MANIFEST_CACHE = os.getenv("SENSORS_MANIFEST_CACHE") or os.path.join(
+        tempfile.gettempdir(), "nucuhub_sensors_manifest.json"
+    )
+    # If true readings that didn't change by more than their channel's deadband are held back.
+    SENSORS_DEADBAND_FILTER = os.getenv("SENSORS_DEADBAND_FILTER", "1") == "1"
+    # Deadbands by channel key as JSON, they override the ones declared by the sensors.
+    SENSORS_DEADBANDS = os.getenv("SENSORS_DEADBANDS")
+    # Maximum seconds between two published readings of a channel with a deadband.
+    SENSORS_DEADBAND_HEARTBEAT = float(os.getenv("SENSORS_DEADBAND_HEARTBEAT", 300))
+    # Number of threads used by the sensors worker to probe the sensor hardware at startup.
+    SENSORS_PROBE_WORKERS = int(os.getenv("SENSORS_PROBE_WORKERS", 8))
+    # Number of threads used by the sensors worker to read sensors concurrently.
+    SENSORS_READ_WORKERS = int(os.getenv("SENSORS_READ_WORKERS", 4))
+    # Seconds the sensors worker waits for the reads and probes in flight when it stops,
+    # the sensors that are still busy after it aren't closed.
+    SENSORS_SHUTDOWN_TIMEOUT = float(os.getenv("SENSORS_SHUTDOWN_TIMEOUT", 10))
+    # Consecutive failed reads after which a sensor isn't read until it recovers.
+    SENSORS_BREAKER_FAILURES = int(os.getenv("SENSORS_BREAKER_FAILURES", 3))
+    # Seconds until a failed sensor is probed again, the delay doubles after every
+    # failed probe up to SENSORS_BREAKER_MAX_DELAY.
+    SENSORS_BREAKER_BASE_DELAY = float(os.getenv("SENSORS_BREAKER_BASE_DELAY", 5))
+    SENSORS_BREAKER_MAX_DELAY = float(os.getenv("SENSORS_BREAKER_MAX_DELAY", 600))
+    # Synthetic sensor farm loaded by the sensors worker as JSON, see sensors.synthetic.
+    SENSORS_SYNTHETIC = os.getenv("SENSORS_SYNTHETIC")
+    # Root of the sysfs tree read by the sysfs sensors, e.g. the CPU temperature.
+    SENSORS_SYSFS_ROOT = os.getenv("SENSORS_SYSFS_ROOT", "/sys")
     # Firebase related config.
     FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY")
     FIREBASE_AUTH_DOMAIN = os.getenv("FIREBASE_AUTH_DOMAIN")
@@ -15,3 +114,15 @@ class ApplicationConfig:
     FIREBASE_STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET")
     FIREBASE_USER_EMAIL = os.getenv("FIREBASE_USER_EMAIL")
     FIREBASE_USER_PASSWORD = os.getenv("FIREBASE_USER_PASSWORD")
+    # The Firebase authentication endpoints, e.g. of the emulator.
+    FIREBASE_AUTH_URL = (
+        os.getenv("FIREBASE_AUTH_URL") or "https://identitytoolkit.googleapis.com"
+    )
+    FIREBASE_TOKEN_URL = (
+        os.getenv("FIREBASE_TOKEN_URL") or "https://securetoken.googleapis.com"
+    )
+    # Maximum number of concurrent Firebase requests and seconds a request can take.
+    FIREBASE_MAX_IN_FLIGHT = int(os.getenv("FIREBASE_MAX_IN_FLIGHT", 4))
+    FIREBASE_TIMEOUT = float(os.getenv("FIREBASE_TIMEOUT", 10))
+    # The Firebase token is refreshed in the background this many seconds before it expires.
+    FIREBASE_TOKEN_REFRESH_MARGIN = int(os.getenv("FIREBASE_TOKEN_REFRESH_MARGIN", 600))
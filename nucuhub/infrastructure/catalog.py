@@ -0,0 +1,98 @@
+import json
+import time
+import typing
+
+from nucuhub.infrastructure.redis import RedisService
+from nucuhub.logging import get_logger
+
+logger = get_logger("SensorCatalog")
+
+
+def channel_key(sensor_id: str, name: str) -> str:
+    """
+        Builds the key of a sensor channel, e.g. bme680:temperature.
+    """
+    return f"{sensor_id}:{name}"
+
+
+class SensorCatalog:
+    """
+        Metadata catalog of the sensor channels. It is stored in a redis hash with one
+        JSON entry per channel so the published readings only need to carry the channel key.
+    """
+
+    KEY = "sensors_catalog"
+
+    def __init__(self):
+        self.client = RedisService.instance()
+
+    def register(self, entries: typing.Dict[str, dict]):
+        """
+            Writes channel metadata to the catalog.
+        :param entries: A dict mapping channel keys to their metadata.
+        """
+        if not entries:
+            return
+        redis = self.client.get_redis()
+        redis.hset(
+            self.KEY,
+            mapping={channel: json.dumps(meta) for channel, meta in entries.items()},
+        )
+
+    def load(self) -> typing.Dict[str, dict]:
+        """
+            Loads the whole catalog.
+        :return: A dict mapping channel keys to their metadata.
+        """
+        redis = self.client.get_redis()
+        return {
+            channel.decode(): json.loads(meta)
+            for channel, meta in redis.hgetall(self.KEY).items()
+        }
+
+
+class CatalogCache:
+    """
+        Local cache of the SensorCatalog. An unknown channel reloads the catalog, at most
+        once every refresh_interval seconds.
+    """
+
+    def __init__(
+        self,
+        catalog: SensorCatalog = None,
+        refresh_interval: float = 60,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self._catalog = catalog or SensorCatalog()
+        self._refresh_interval = refresh_interval
+        self._clock = clock
+        self._entries = {}
+        self._loaded_at = None
+
+    def _refresh(self):
+        now = self._clock()
+        if (
+            self._loaded_at is not None
+            and now - self._loaded_at < self._refresh_interval
+        ):
+            return
+        self._entries = self._catalog.load()
+        self._loaded_at = now
+        logger.debug(f"loaded {len(self._entries)} catalog entries")
+
+    def resolve(self, channel: str) -> typing.Optional[dict]:
+        """
+            Resolves the metadata of a channel.
+        :param channel: The channel key.
+        :return: The metadata or None if the channel isn't in the catalog.
+        """
+        if channel not in self._entries:
+            self._refresh()
+        return self._entries.get(channel)
+
+    def all(self) -> typing.Dict[str, dict]:
+        """
+            Returns all the cached entries, reloading them if they are stale.
+        """
+        self._refresh()
+        return dict(self._entries)
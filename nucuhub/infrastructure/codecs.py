@@ -0,0 +1,251 @@
+import json
+import struct
+import typing
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure.catalog import channel_key
+from nucuhub.infrastructure.measurements import Aggregates, MeasurementBatch
+from nucuhub.logging import get_logger
+
+
+class CodecException(Exception):
+    pass
+
+
+class Codec:
+    """
+        Encodes the measurement batches published on the sensors topic and decodes them
+        into a list of readings.
+
+        Binary codecs start their payload with a version byte. JSON payloads don't have
+        one, they are what consumers that don't know about codecs expect, and payloads
+        without a known version byte are decoded as JSON.
+    """
+
+    name: str = NotImplemented
+    version: typing.Optional[int] = None
+
+    def encode(self, batch: MeasurementBatch) -> typing.Union[str, bytes]:
+        raise NotImplementedError()
+
+    def decode(self, payload: bytes) -> list:
+        raise NotImplementedError()
+
+
+class JsonCodec(Codec):
+    name = "json"
+
+    def encode(self, batch: MeasurementBatch) -> str:
+        return batch.to_json(compact=ApplicationConfig.SENSORS_COMPACT_READINGS)
+
+    def decode(self, payload: bytes) -> list:
+        return json.loads(payload)
+
+
+class ColumnsCodec(Codec):
+    """
+        Struct packed columns, every number is little-endian:
+
+            B       version
+            I       number of readings, n
+            H       number of channels, c
+            c * (H length, utf-8 channel key)
+            n * H   channel index of every reading
+            n * d   timestamps
+            n * B   value types, see the TYPE_ constants
+            the float values as d, the int values as q, then the str values as
+            (I length, utf-8 bytes), in reading order.
+            optionally the aggregates of high-rate readings:
+            I       number of aggregated readings, a
+            a * (I reading index, I count, 7 * d min max mean stddev p50 p90 p99)
+
+        Readings are always compact, their metadata is in the SensorCatalog. A batch
+        can have at most MAX_CHANNELS channels.
+    """
+
+    name = "columns"
+    version = 0x01
+    MAX_CHANNELS = 0xFFFF
+
+    TYPE_FLOAT = 0
+    TYPE_INT = 1
+    TYPE_FALSE = 2
+    TYPE_TRUE = 3
+    TYPE_NONE = 4
+    TYPE_STR = 5
+
+    AGGREGATES_FORMAT = "<II7d"
+
+    def _value_type(self, value) -> int:
+        if value is True:
+            return self.TYPE_TRUE
+        if value is False:
+            return self.TYPE_FALSE
+        if value is None:
+            return self.TYPE_NONE
+        if isinstance(value, int) and -(2 ** 63) <= value < 2 ** 63:
+            return self.TYPE_INT
+        if isinstance(value, (int, float)):
+            return self.TYPE_FLOAT
+        return self.TYPE_STR
+
+    def encode(self, batch: MeasurementBatch) -> bytes:
+        count = len(batch)
+        channels = {}
+        indexes = []
+        for sensor_id, name in zip(batch.sensor_ids, batch.names):
+            indexes.append(channels.setdefault((sensor_id, name), len(channels)))
+        if len(channels) > self.MAX_CHANNELS:
+            raise CodecException(
+                f"{len(channels)} channels, the columns codec indexes at most "
+                f"{self.MAX_CHANNELS}"
+            )
+        types = [self._value_type(value) for value in batch.values]
+        floats = [v for v, t in zip(batch.values, types) if t == self.TYPE_FLOAT]
+        ints = [v for v, t in zip(batch.values, types) if t == self.TYPE_INT]
+        strings = [
+            str(v).encode() for v, t in zip(batch.values, types) if t == self.TYPE_STR
+        ]
+
+        parts = [struct.pack("<BIH", self.version, count, len(channels))]
+        for sensor_id, name in channels:
+            key = channel_key(sensor_id, name).encode()
+            parts.append(struct.pack("<H", len(key)))
+            parts.append(key)
+        parts.append(
+            struct.pack(
+                f"<{count}H{count}d{count}B", *indexes, *batch.timestamps, *types
+            )
+        )
+        parts.append(struct.pack(f"<{len(floats)}d{len(ints)}q", *floats, *ints))
+        for string in strings:
+            parts.append(struct.pack("<I", len(string)))
+            parts.append(string)
+        if batch.aggregates:
+            parts.append(struct.pack("<I", len(batch.aggregates)))
+            for index, aggregates in batch.aggregates.items():
+                parts.append(
+                    struct.pack(
+                        self.AGGREGATES_FORMAT,
+                        index,
+                        *(getattr(aggregates, name) for name in Aggregates.__slots__),
+                    )
+                )
+        return b"".join(parts)
+
+    def decode(self, payload: bytes) -> list:
+        try:
+            version, count, channel_count = struct.unpack_from("<BIH", payload)
+            if version != self.version:
+                raise CodecException(f"unsupported columns version {version}")
+            offset = struct.calcsize("<BIH")
+            channels = []
+            for _ in range(channel_count):
+                (length,) = struct.unpack_from("<H", payload, offset)
+                offset += 2
+                channels.append(payload[offset : offset + length].decode())
+                offset += length
+            columns_format = f"<{count}H{count}d{count}B"
+            columns = struct.unpack_from(columns_format, payload, offset)
+            offset += struct.calcsize(columns_format)
+            indexes = columns[:count]
+            timestamps = columns[count : 2 * count]
+            types = columns[2 * count :]
+
+            numbers_format = (
+                f"<{types.count(self.TYPE_FLOAT)}d{types.count(self.TYPE_INT)}q"
+            )
+            numbers = struct.unpack_from(numbers_format, payload, offset)
+            offset += struct.calcsize(numbers_format)
+            floats = iter(numbers[: types.count(self.TYPE_FLOAT)])
+            ints = iter(numbers[types.count(self.TYPE_FLOAT) :])
+
+            readings = []
+            for index, timestamp, value_type in zip(indexes, timestamps, types):
+                if value_type == self.TYPE_FLOAT:
+                    value = next(floats)
+                elif value_type == self.TYPE_INT:
+                    value = next(ints)
+                elif value_type == self.TYPE_STR:
+                    (length,) = struct.unpack_from("<I", payload, offset)
+                    offset += 4
+                    value = payload[offset : offset + length].decode()
+                    offset += length
+                else:
+                    value = {
+                        self.TYPE_FALSE: False,
+                        self.TYPE_TRUE: True,
+                        self.TYPE_NONE: None,
+                    }[value_type]
+                readings.append(
+                    {"channel": channels[index], "timestamp": timestamp, "value": value}
+                )
+            if offset < len(payload):
+                (aggregated,) = struct.unpack_from("<I", payload, offset)
+                offset += 4
+                for _ in range(aggregated):
+                    index, *fields = struct.unpack_from(
+                        self.AGGREGATES_FORMAT, payload, offset
+                    )
+                    offset += struct.calcsize(self.AGGREGATES_FORMAT)
+                    readings[index]["aggregates"] = dict(
+                        zip(Aggregates.__slots__, fields)
+                    )
+            return readings
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError) as e:
+            raise CodecException(f"malformed columns payload: {e}")
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), ColumnsCodec())}
+CODECS_BY_VERSION = {
+    codec.version: codec for codec in CODECS.values() if codec.version is not None
+}
+
+
+def get_codec(name: str) -> Codec:
+    """
+        Gets a codec by name.
+    :raises: CodecException if there's no such codec.
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise CodecException(f"unknown codec {name}, valid codecs: {list(CODECS)}")
+
+
+def encode(batch: MeasurementBatch) -> typing.Union[str, bytes]:
+    """
+        Encodes the batch with the codec set in ApplicationConfig.SENSORS_ENCODER. Batches
+        the codec can't encode, e.g. with too many channels for the columns codec, are
+        encoded as JSON.
+    """
+    try:
+        return get_codec(ApplicationConfig.SENSORS_ENCODER).encode(batch)
+    except CodecException as e:
+        get_logger("Codecs").warning(f"encoding the batch as JSON: {e}")
+        return CODECS[JsonCodec.name].encode(batch)
+
+
+def decode(payload):
+    """
+        Decodes a payload published on the sensors topic. Binary payloads are decoded by
+        the codec matching their version byte, if it's enabled in
+        ApplicationConfig.SENSORS_DECODERS; everything else is decoded as JSON.
+    :return: The decoded data, or the payload itself if it isn't valid JSON.
+    :raises: CodecException if the payload is malformed.
+    """
+    if isinstance(payload, (bytes, bytearray)) and payload:
+        codec = CODECS_BY_VERSION.get(payload[0])
+        if codec is not None:
+            if codec.name not in ApplicationConfig.SENSORS_DECODERS:
+                raise CodecException(f"codec {codec.name} is not enabled")
+            return codec.decode(payload)
+        try:
+            payload = payload.decode()
+        except UnicodeDecodeError as e:
+            raise CodecException(f"payload isn't valid UTF-8: {e}")
+
+    try:
+        return json.loads(payload)
+    except (TypeError, AttributeError, json.decoder.JSONDecodeError):
+        return payload
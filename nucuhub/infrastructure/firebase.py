@@ -1,3 +1,8 @@
+import random
+import threading
+import time
+import typing
+
 import pyrebase
 
 from nucuhub.config import ApplicationConfig
@@ -5,6 +10,50 @@ from nucuhub.logging import get_logger
 
 logger = get_logger("FirebaseService")
 
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+class PushKeyGenerator:
+    """
+        Generates keys like the Realtime Database push: 8 characters of the millisecond
+        timestamp followed by 12 random characters. Keys generated in the same
+        millisecond increment the random part, so the keys sort in the order they were
+        generated. pyrebase's generate_key doesn't carry the increment and keeps every
+        random part it ever generated.
+    """
+
+    def __init__(
+        self, clock: typing.Callable[[], float] = time.time, rand: random.Random = None,
+    ):
+        self._clock = clock
+        self._rand = rand or random.SystemRandom()
+        self._lock = threading.Lock()
+        self._last_time = -1
+        self._last_random = []
+
+    def generate(self) -> str:
+        with self._lock:
+            # A clock that went back keeps the last time, so the keys stay ordered.
+            now = max(int(self._clock() * 1000), self._last_time)
+            if now == self._last_time:
+                index = len(self._last_random) - 1
+                while self._last_random[index] == len(PUSH_CHARS) - 1:
+                    self._last_random[index] = 0
+                    index -= 1
+                self._last_random[index] += 1
+            else:
+                self._last_random = [
+                    self._rand.randrange(len(PUSH_CHARS)) for _ in range(12)
+                ]
+            self._last_time = now
+            timestamp = []
+            for _ in range(8):
+                timestamp.append(PUSH_CHARS[now % 64])
+                now //= 64
+            return "".join(reversed(timestamp)) + "".join(
+                PUSH_CHARS[index] for index in self._last_random
+            )
+
 
 class FirebaseConfiguration:
     api_key = None
@@ -13,6 +62,8 @@ class FirebaseConfiguration:
     storage_bucket = None
     user_email = None
     user_password = None
+    auth_url = None
+    token_url = None
 
     def __init__(
         self,
@@ -22,6 +73,8 @@ class FirebaseConfiguration:
         storage_bucket=None,
         user_email=None,
         user_password=None,
+        auth_url=None,
+        token_url=None,
     ):
         self.api_key = api_key or ApplicationConfig.FIREBASE_API_KEY
         self.auth_domain = auth_domain or ApplicationConfig.FIREBASE_AUTH_DOMAIN
@@ -31,6 +84,8 @@ class FirebaseConfiguration:
         )
         self.user_email = user_email or ApplicationConfig.FIREBASE_USER_EMAIL
         self.user_password = user_password or ApplicationConfig.FIREBASE_USER_PASSWORD
+        self.auth_url = auth_url or ApplicationConfig.FIREBASE_AUTH_URL
+        self.token_url = token_url or ApplicationConfig.FIREBASE_TOKEN_URL
 
     def __str__(self):
         return f"FirebaseConfig: {self.auth_domain};{self.database_url};{self.storage_bucket}"
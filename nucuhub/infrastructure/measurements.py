@@ -0,0 +1,230 @@
+import array
+import json
+import typing
+from dataclasses import dataclass
+
+from nucuhub.infrastructure.catalog import channel_key
+
+MeasurementValue = typing.Union[int, float, str]
+
+
+@dataclass
+class Aggregates:
+    """
+        Statistics of the samples taken during a publish window by a high-rate sensor.
+    """
+
+    __slots__ = ("count", "min", "max", "mean", "stddev", "p50", "p90", "p99")
+
+    count: int
+    min: float
+    max: float
+    mean: float
+    stddev: float
+    p50: float
+    p90: float
+    p99: float
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(init=False)
+class SensorMeasurement:
+    __slots__ = ("sensor_id", "name", "description", "timestamp", "value", "aggregates")
+
+    sensor_id: str
+    name: str
+    description: str
+    timestamp: int
+    value: MeasurementValue
+    # Only set for the readings of high-rate sensors, the value is then the mean.
+    aggregates: typing.Optional[Aggregates]
+
+    def __init__(
+        self,
+        sensor_id: str,
+        name: str,
+        description: str,
+        timestamp: int,
+        value: MeasurementValue,
+        aggregates: typing.Optional[Aggregates] = None,
+    ):
+        self.sensor_id = sensor_id
+        self.name = name
+        self.description = description
+        self.timestamp = timestamp
+        self.value = value
+        self.aggregates = aggregates
+
+    def to_dict(self) -> dict:
+        """
+            Returns the measurement as a dict, in the format published on the sensors topic.
+        """
+        data = {
+            "sensor_id": self.sensor_id,
+            "name": self.name,
+            "description": self.description,
+            "timestamp": self.timestamp,
+            "value": self.value,
+        }
+        if self.aggregates is not None:
+            data["aggregates"] = self.aggregates.to_dict()
+        return data
+
+
+def _dump_timestamp(timestamp: float) -> str:
+    # Timestamps are stored as doubles, whole numbers are written like integers.
+    if timestamp.is_integer():
+        return str(int(timestamp))
+    return repr(timestamp)
+
+
+class MeasurementBatch:
+    """
+        Columnar collection of measurements.
+
+        Sensor ids, names, timestamps and values are kept in parallel arrays and the
+        description is stored once per channel, a channel being a (sensor_id, name) pair,
+        instead of once per measurement. The aggregates of high-rate readings are kept
+        by measurement index.
+    """
+
+    __slots__ = (
+        "sensor_ids",
+        "names",
+        "timestamps",
+        "values",
+        "descriptions",
+        "aggregates",
+    )
+
+    def __init__(self):
+        self.sensor_ids: typing.List[str] = []
+        self.names: typing.List[str] = []
+        self.timestamps = array.array("d")
+        self.values: typing.List[MeasurementValue] = []
+        self.descriptions: typing.Dict[typing.Tuple[str, str], str] = {}
+        self.aggregates: typing.Dict[int, Aggregates] = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f"MeasurementBatch({len(self)} measurements)"
+
+    def __iter__(self) -> typing.Iterator[SensorMeasurement]:
+        descriptions = self.descriptions
+        aggregates = self.aggregates
+        for index, (sensor_id, name, timestamp, value) in enumerate(
+            zip(self.sensor_ids, self.names, self.timestamps, self.values)
+        ):
+            yield SensorMeasurement(
+                sensor_id=sensor_id,
+                name=name,
+                description=descriptions.get((sensor_id, name)),
+                timestamp=timestamp,
+                value=value,
+                aggregates=aggregates.get(index),
+            )
+
+    def append(
+        self,
+        sensor_id: str,
+        name: str,
+        timestamp: float,
+        value: MeasurementValue,
+        description: str = None,
+        aggregates: Aggregates = None,
+    ):
+        """
+            Appends a measurement to the batch.
+        :param description: The channel description, it only needs to be given once per channel.
+        :param aggregates: The window statistics of a high-rate reading.
+        """
+        if aggregates is not None:
+            self.aggregates[len(self.values)] = aggregates
+        self.sensor_ids.append(sensor_id)
+        self.names.append(name)
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        if description is not None:
+            self.descriptions.setdefault((sensor_id, name), description)
+
+    def extend(self, measurements: typing.Iterable[SensorMeasurement]):
+        """
+            Appends SensorMeasurement objects to the batch.
+        """
+        for measurement in measurements:
+            self.append(
+                measurement.sensor_id,
+                measurement.name,
+                measurement.timestamp,
+                measurement.value,
+                measurement.description,
+                measurement.aggregates,
+            )
+
+    def merge(self, other: "MeasurementBatch"):
+        """
+            Appends all the measurements of another batch.
+        """
+        offset = len(self)
+        for index, aggregates in other.aggregates.items():
+            self.aggregates[offset + index] = aggregates
+        self.sensor_ids.extend(other.sensor_ids)
+        self.names.extend(other.names)
+        self.timestamps.extend(other.timestamps)
+        self.values.extend(other.values)
+        for key, description in other.descriptions.items():
+            self.descriptions.setdefault(key, description)
+
+    def catalog_entries(self) -> typing.Dict[str, dict]:
+        """
+            Returns the metadata of the channels that have a description, keyed by channel key.
+        """
+        return {
+            channel_key(sensor_id, name): {
+                "sensor_id": sensor_id,
+                "name": name,
+                "description": description,
+            }
+            for (sensor_id, name), description in self.descriptions.items()
+        }
+
+    def _json_prefix(self, sensor_id: str, name: str, compact: bool) -> str:
+        dumps = json.dumps
+        if compact:
+            return f'{{"channel": {dumps(channel_key(sensor_id, name))}, "timestamp": '
+        return (
+            f'{{"sensor_id": {dumps(sensor_id)}, "name": {dumps(name)}, '
+            f'"description": {dumps(self.descriptions.get((sensor_id, name)))}, '
+            f'"timestamp": '
+        )
+
+    def to_json(self, compact: bool = False) -> str:
+        """
+            Serializes the batch as a JSON array of measurement objects without building a
+            dict for each measurement.
+        :param compact: If true the measurements only carry the channel key, the timestamp
+                        and the value, the other fields are in the SensorCatalog. Otherwise
+                        the format is the same as the to_dict() of every measurement.
+        """
+        dumps = json.dumps
+        prefixes = {}
+        parts = []
+        aggregates = self.aggregates
+        for index, (sensor_id, name, timestamp, value) in enumerate(
+            zip(self.sensor_ids, self.names, self.timestamps, self.values)
+        ):
+            key = (sensor_id, name)
+            prefix = prefixes.get(key)
+            if prefix is None:
+                prefix = prefixes[key] = self._json_prefix(sensor_id, name, compact)
+            suffix = "}"
+            if index in aggregates:
+                suffix = f', "aggregates": {dumps(aggregates[index].to_dict())}}}'
+            parts.append(
+                f'{prefix}{_dump_timestamp(timestamp)}, "value": {dumps(value)}{suffix}'
+            )
+        return f"[{', '.join(parts)}]"
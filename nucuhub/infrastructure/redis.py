@@ -1,6 +1,7 @@
 import redis
 from nucuhub.config import ApplicationConfig
 from nucuhub.logging import get_logger
+from redis import asyncio as async_redis
 
 logger = get_logger("RedisService")
 
@@ -8,6 +9,7 @@ logger = get_logger("RedisService")
 class RedisService:
     __singleton = None
     __client = None
+    __async_client = None
 
     def __init__(self):
         """
@@ -22,6 +24,7 @@ class RedisService:
             logger.info(f"RedisSingleton: Setting Connection String={cls.redis_url}")
             cls.__singleton = cls()
             cls.__client = redis.Redis(cls.redis_url)
+            cls.__async_client = None
         return cls.__singleton
 
     @classmethod
@@ -30,3 +33,12 @@ class RedisService:
 
     def get_redis(self):
         return self.__client
+
+    def get_async_redis(self):
+        """
+            Gets the asyncio redis client. The client is created lazily and must only be
+            used from the event loop that created it.
+        """
+        if RedisService.__async_client is None:
+            RedisService.__async_client = async_redis.Redis(host=self.redis_url)
+        return RedisService.__async_client
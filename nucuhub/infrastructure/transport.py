@@ -0,0 +1,28 @@
+from nucuhub.config import ApplicationConfig
+
+PUBSUB = "pubsub"
+STREAMS = "streams"
+
+# The stream entry field holding the encoded message.
+DATA_FIELD = "data"
+
+
+def use_streams() -> bool:
+    """
+        Checks if messages between the workers are sent through redis streams.
+    :return: True if the streams transport is configured, False for pub/sub.
+    """
+    return ApplicationConfig.MESSAGING_TRANSPORT == STREAMS
+
+
+def stream_add_arguments(payload) -> dict:
+    """
+        Builds the XADD arguments for a message, the streams are trimmed to about
+        ApplicationConfig.STREAMS_MAXLEN entries.
+    :param payload: The encoded message.
+    """
+    return {
+        "fields": {DATA_FIELD: payload},
+        "maxlen": ApplicationConfig.STREAMS_MAXLEN,
+        "approximate": True,
+    }
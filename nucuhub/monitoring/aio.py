@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+
+from nucuhub import runtime
+from nucuhub.monitoring import infrastructure, segmentlog
+from nucuhub.monitoring.buffer import OverflowBuffer
+from nucuhub.monitoring.main import MonitoringMain
+
+
+class AsyncMonitoringMain(MonitoringMain):
+    """
+        Monitoring process running on an asyncio event loop.
+
+        The producer task waits on the async redis messaging and moves the messages to
+        the shared queue through an OverflowBuffer, like the threaded Producer. The
+        consumer, a Consumer or a ConsumerPool like in the threaded runtime, runs on a
+        thread because the stages, e.g. the Firebase upload, are blocking. The shared
+        queue is a LogQueue if MONITORING_LOG_DIR is set.
+        The process is shut down by cancelling its tasks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.message_broker = infrastructure.create_async_messaging()
+        # Messages that didn't fit in the shared queue, see OverflowBuffer.
+        self.overflow = OverflowBuffer()
+        # Seconds between the moves of the buffered messages while none arrive.
+        self.drain_interval = 1
+        self._consumer_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="MonitoringConsumer"
+        )
+        self._overflow_lock = None
+        self._consumer_loop = None
+
+    def _enqueue(self, message=None, timeout: float = 0):
+        """
+            Buffers the message and moves the buffered messages to the shared queue while
+            it has room. Runs on a thread: a LogQueue and the spill file write to the disk.
+        :param timeout: Seconds to wait for room for the first message.
+        """
+        if message is not None:
+            self.overflow.append(message)
+        return self.overflow.drain_into(self._shared_queue, timeout)
+
+    async def _enqueue_async(self, message=None, timeout: float = 0):
+        async with self._overflow_lock:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._enqueue, message, timeout
+            )
+
+    async def _producer_work_loop(self):
+        self.logger.debug(f"Monitoring topics: {self.monitoring_topics}")
+        while True:
+            message = await self.message_broker.get_message()
+            if message is None:
+                self.logger.warning("Not subscribed to any topic.")
+                return
+            await self._enqueue_async(message)
+            while self.overflow.blocks():
+                # Stops reading until the consumer makes room, see OverflowPolicy.BLOCK.
+                await self._enqueue_async(timeout=self.drain_interval)
+
+    async def _overflow_loop(self):
+        """
+            Moves the buffered messages once the consumer made room, also while no new
+            messages arrive.
+        """
+        while True:
+            await asyncio.sleep(self.drain_interval)
+            if self.overflow:
+                await self._enqueue_async()
+
+    async def _consumer_work_loop(self):
+        self._consumer_loop = self._consumer_executor.submit(
+            super()._consumer_work_loop
+        )
+        await asyncio.wrap_future(self._consumer_loop)
+
+    def _stop_consumer(self):
+        """
+            Shuts the consumer down and waits for it, it flushes its stages once it
+            stopped. The consumer thread may still be starting.
+        """
+        while self._consumer_loop is not None and not self._consumer_loop.done():
+            if self._consumer:
+                self._consumer.shutdown()
+            concurrent.futures.wait([self._consumer_loop], timeout=0.1)
+        self._consumer_executor.shutdown()
+
+    async def run(self):
+        """
+            Runs the monitoring process until it is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        self._overflow_lock = asyncio.Lock()
+        if self.monitoring_topics:
+            self.message_broker.TOPICS_OF_INTEREST = self.monitoring_topics
+        await self.message_broker.subscribe_to_all()
+        try:
+            await asyncio.gather(
+                runtime.supervise(
+                    "producer_loop", self._producer_work_loop, self.logger
+                ),
+                runtime.supervise("overflow_loop", self._overflow_loop, self.logger),
+                runtime.supervise(
+                    "consumer_loop", self._consumer_work_loop, self.logger
+                ),
+            )
+        finally:
+            self.logger.info("Shutting down...")
+            await self.message_broker.close()
+            await loop.run_in_executor(None, self._stop_consumer)
+            self.overflow.close()
+            if isinstance(self._shared_queue, segmentlog.LogQueue):
+                self._shared_queue.close()
+
+    def loop_forever(self):
+        """
+            Starts the monitoring process on the asyncio runtime.
+        """
+        self.logger.info("Looping forever on asyncio!")
+        runtime.run_until_cancelled(self.run, self.logger)
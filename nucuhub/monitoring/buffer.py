@@ -0,0 +1,248 @@
+import collections
+import enum
+import glob
+import os
+import pickle
+import queue
+import threading
+import typing
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.logging import get_logger
+
+__all__ = ["OverflowPolicy", "OverflowBuffer"]
+
+
+class OverflowPolicy(enum.Enum):
+    # The buffer is full: the oldest message is dropped to make room for the new one.
+    DROP_OLDEST = "drop-oldest"
+    # The buffer is full: the new message is dropped.
+    DROP_NEWEST = "drop-newest"
+    # The producer stops reading messages until the buffer has room, the messages wait
+    # in redis, which with pub/sub may disconnect a slow subscriber.
+    BLOCK = "block"
+    # The buffer is full: the new message is written to the spill file, which is read
+    # back once the buffer drained. Messages are dropped once the file is full. The file
+    # isn't durable, the messages left in it when the process stops are lost.
+    SPILL = "spill"
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class OverflowBuffer:
+    """
+        Bounded FIFO buffer of the messages the producer couldn't put on the full queue.
+
+        Messages are taken out in the order they were added, spilled messages after the
+        ones in memory. Dropped messages aren't acknowledged, with the streams transport
+        they are delivered again.
+    """
+
+    def __init__(
+        self,
+        capacity: int = None,
+        policy: typing.Union[OverflowPolicy, str] = None,
+        spill_path: str = None,
+        spill_max_bytes: int = None,
+    ):
+        """
+        :param capacity: The maximum number of messages kept in memory.
+        :param policy: What happens to the messages once the buffer is full.
+        :param spill_path: The spill file of the SPILL policy, the pid is appended to it.
+        :param spill_max_bytes: The maximum size of the spill file.
+        """
+        self._logger = get_logger("MonitoringOverflowBuffer")
+        self.capacity = capacity or ApplicationConfig.MONITORING_BUFFER_SIZE
+        self.policy = OverflowPolicy(
+            policy or ApplicationConfig.MONITORING_BUFFER_POLICY
+        )
+        self._spill_prefix = spill_path or ApplicationConfig.MONITORING_SPILL_PATH
+        # Every process has its own spill file, workers don't truncate each other's.
+        self.spill_path = f"{self._spill_prefix}.{os.getpid()}"
+        self.spill_max_bytes = (
+            spill_max_bytes or ApplicationConfig.MONITORING_SPILL_MAX_BYTES
+        )
+        self._messages = collections.deque()
+        self._lock = threading.Lock()
+        self._spill_writer = None
+        self._spill_reader = None
+        self._spill_size = 0
+        # Number of messages in the spill file that weren't read back.
+        self.spilled = 0
+        # Total number of messages that were buffered and dropped.
+        self.buffered_total = 0
+        self.dropped = 0
+        if self.policy is OverflowPolicy.SPILL:
+            self._remove_stale_spills()
+
+    def _remove_stale_spills(self):
+        """
+            Removes the spill files left by the processes that stopped, e.g. before a
+            restart. Their messages are lost, see OverflowPolicy.SPILL.
+        """
+        for path in glob.glob(f"{glob.escape(self._spill_prefix)}.*"):
+            pid = path[len(self._spill_prefix) + 1 :]
+            if not pid.isdigit():
+                continue
+            if int(pid) != os.getpid() and _is_running(int(pid)):
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError as e:
+                self._logger.error(f"can't remove the stale spill file {path}: {e}")
+                continue
+            self._logger.warning(
+                f"removed the spill file {path} of a previous run, "
+                f"{size} bytes of spilled messages are lost."
+            )
+
+    def __len__(self):
+        return len(self._messages) + self.spilled
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def full(self) -> bool:
+        """
+            Checks if the in-memory buffer is full.
+        """
+        return len(self._messages) >= self.capacity
+
+    def blocks(self) -> bool:
+        """
+            Checks if the producer should stop reading messages, see OverflowPolicy.BLOCK.
+        """
+        return self.policy is OverflowPolicy.BLOCK and self.full()
+
+    def stats(self) -> dict:
+        """
+            Returns the counters of the buffer.
+        """
+        return {
+            "buffered": len(self._messages),
+            "spilled": self.spilled,
+            "buffered_total": self.buffered_total,
+            "dropped": self.dropped,
+        }
+
+    def _drop(self, count: int = 1):
+        if not self.dropped:
+            self._logger.warning(
+                f"the overflow buffer is full, dropping messages ({self.policy.value})"
+            )
+        self.dropped += count
+
+    def append(self, message) -> bool:
+        """
+            Adds the message, if the buffer is full the message is handled by the policy.
+        :return: False if the message was dropped.
+        """
+        with self._lock:
+            if not self.full() and not self.spilled:
+                self._messages.append(message)
+            elif self.policy is OverflowPolicy.DROP_OLDEST:
+                self._messages.popleft()
+                self._messages.append(message)
+                self._drop()
+            elif self.policy is OverflowPolicy.SPILL:
+                if not self._spill(message):
+                    self._drop()
+                    return False
+            elif self.policy is OverflowPolicy.DROP_NEWEST:
+                self._drop()
+                return False
+            else:
+                # BLOCK, the producer checks blocks() before reading more messages.
+                self._messages.append(message)
+            self.buffered_total += 1
+            return True
+
+    def _spill(self, message) -> bool:
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._spill_size + len(data) > self.spill_max_bytes:
+            return False
+        if self._spill_writer is None:
+            self._spill_writer = open(self.spill_path, "wb")
+            self._spill_reader = open(self.spill_path, "rb")
+        self._spill_writer.write(data)
+        self._spill_size += len(data)
+        self.spilled += 1
+        return True
+
+    def _unspill(self, count: int):
+        """
+            Reads back up to count spilled messages into the in-memory buffer.
+        """
+        if not self.spilled:
+            return
+        self._spill_writer.flush()
+        while count > 0 and self.spilled:
+            self._messages.append(pickle.load(self._spill_reader))
+            self.spilled -= 1
+            count -= 1
+        if not self.spilled:
+            # Everything was read back, the file starts over.
+            self._close_spill()
+
+    def _close_spill(self):
+        if self._spill_writer is None:
+            return
+        self._spill_writer.close()
+        self._spill_reader.close()
+        self._spill_writer = self._spill_reader = None
+        self._spill_size = 0
+        os.remove(self.spill_path)
+
+    def popleft(self):
+        """
+            Takes out the oldest message.
+        :raises: IndexError if the buffer is empty.
+        """
+        with self._lock:
+            if not self._messages:
+                self._unspill(self.capacity)
+            return self._messages.popleft()
+
+    def appendleft(self, message):
+        """
+            Puts back a message taken out with popleft, e.g. when the queue is full.
+        """
+        with self._lock:
+            self._messages.appendleft(message)
+
+    def drain_into(self, queue_: queue.Queue, timeout: float = 0) -> int:
+        """
+            Moves the buffered messages to the queue while it has room.
+        :param timeout: Seconds to wait for room for the first message.
+        :return: The number of messages moved.
+        """
+        moved = 0
+        while self:
+            message = self.popleft()
+            try:
+                if moved == 0 and timeout:
+                    queue_.put(message, block=True, timeout=timeout)
+                else:
+                    queue_.put_nowait(message)
+            except queue.Full:
+                self.appendleft(message)
+                break
+            moved += 1
+        return moved
+
+    def close(self):
+        """
+            Removes the spill file, the spilled messages are lost.
+        """
+        with self._lock:
+            self._close_spill()
+            self.spilled = 0
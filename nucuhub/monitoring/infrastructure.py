@@ -1,9 +1,15 @@
-import datetime
-import json
+import collections
+import concurrent.futures
+import threading
+import time
 
-from nucuhub.infrastructure.firebase import FirebaseService
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import codecs, transport
+from nucuhub.infrastructure.firebase import FirebaseService, PushKeyGenerator
 from nucuhub.infrastructure.redis import RedisService
 from nucuhub.logging import get_logger
+from nucuhub.monitoring.uploader import FirebaseUploader
+from redis.exceptions import ResponseError
 
 
 class RedisBackend:
@@ -46,50 +52,416 @@ class Messaging(RedisBackend):
         )
         return message
 
+    def acknowledge(self, message):
+        """
+            Pub/sub messages are fire and forget, there's nothing to acknowledge.
+        """
+
+    def acknowledge_many(self, messages: list):
+        """
+            Acknowledges the processed messages, see acknowledge.
+        """
+        for message in messages:
+            self.acknowledge(message)
+
     @staticmethod
     def decode_message_data(message):
+        """
+            Decodes the message data with the codec it was encoded with, see codecs.decode.
+        :return: The decoded data or None if the message can't be decoded.
+        """
         if not message:
             return None
 
-        return_value = message.get("data")
+        try:
+            return codecs.decode(message.get("data"))
+        except codecs.CodecException as e:
+            get_logger("MonitoringMessaging").error(f"can't decode message: {e}")
+            return None
 
-        if isinstance(return_value, bytes):
-            return_value = return_value.decode()
 
-        try:
-            return_value = json.loads(return_value)
-        except (TypeError, AttributeError, json.decoder.JSONDecodeError):
-            pass
-        return return_value
+class AsyncMessaging(RedisBackend):
+    """
+        Messaging for the asyncio runtime, it uses the asyncio redis client.
+    """
 
+    TOPICS_OF_INTEREST = ["sensors"]
 
-class Firebase(FirebaseService):
-    user = None
-    _token_expire = 0
+    def __init__(self):
+        super().__init__()
+        self._pubsub = self.client.get_async_redis().pubsub()
+        self._messages = self._pubsub.listen()
+        self.logger = get_logger("MonitoringAsyncMessaging")
 
-    @classmethod
-    def ensure_authentication(cls):
+    async def subscribe_to_all(self):
         """
-            Ensure that the firebase request is always authenticated and the token is
-            refreshed before it expires.
+            Subscribe to the topics of interest
         """
-        auth = cls.client().auth()
+        for topic in self.TOPICS_OF_INTEREST:
+            self.logger.info(f"Subscribe to: {topic}.")
+            await self._pubsub.subscribe(topic)
 
-        if cls.user is None:
-            cls.user = auth.sign_in_with_email_and_password(
-                cls.config().user_email, cls.config().user_password
-            )
-            cls._token_expire = (
-                int(cls.user["expiresIn"]) + datetime.datetime.now().timestamp()
+    async def get_message(self):
+        """
+            Waits for a message on the topics of interest.
+        :return: The message or None if there are no subscriptions.
+        """
+        async for message in self._messages:
+            if message.get("type") in ("message", "pmessage"):
+                return message
+        return None
+
+    async def close(self):
+        """
+            Closes the pub/sub connection.
+        """
+        await self._pubsub.close()
+
+
+class StreamBackend(RedisBackend):
+    """
+        Base of the messaging over redis streams.
+
+        Every topic is a stream read through a consumer group: the monitoring processes
+        in the group share the entries and the entries added while monitoring is down
+        are read when it starts. Entries stay pending until they are acknowledged. The
+        entries left pending by this consumer, e.g. before a restart, are read back page
+        by page when it subscribes; the ones pending on the other consumers, e.g. a
+        crashed one, are claimed one page at a time once they are idle for
+        ApplicationConfig.STREAMS_CLAIM_IDLE_MS. This consumer's own pending entries
+        aren't claimed, they may still be waiting in its queue or sink.
+
+        The entries are returned as pub/sub like messages with an additional id.
+    """
+
+    TOPICS_OF_INTEREST = ["sensors"]
+    decode_message_data = staticmethod(Messaging.decode_message_data)
+
+    def __init__(self, group: str = None, consumer: str = None):
+        super().__init__()
+        self.group = group or ApplicationConfig.STREAMS_CONSUMER_GROUP
+        self.consumer = consumer or ApplicationConfig.STREAMS_CONSUMER_NAME
+        self.read_count = ApplicationConfig.STREAMS_READ_COUNT
+        self.claim_idle_ms = ApplicationConfig.STREAMS_CLAIM_IDLE_MS
+        self._streams = {}
+        self._buffer = collections.deque()
+        self._last_claim = None
+        # Maps the topics to the XPENDING range start of their next claim.
+        self._claim_cursors = {}
+
+    def _group_create_arguments(self, topic) -> dict:
+        # Start from the beginning of the stream, entries added before the group
+        # existed weren't read by anyone.
+        return {"name": topic, "groupname": self.group, "id": "0", "mkstream": True}
+
+    def _read_arguments(self, streams, block_ms=None) -> dict:
+        return {
+            "groupname": self.group,
+            "consumername": self.consumer,
+            "streams": streams,
+            "count": self.read_count,
+            "block": block_ms,
+        }
+
+    def _subscribed(self):
+        # The pending entries of this consumer are read first, from the start.
+        self._streams = {topic: "0" for topic in self.TOPICS_OF_INTEREST}
+        self._claim_cursors = {}
+        self._last_claim = None
+
+    def _pending_streams(self) -> dict:
+        """
+            Returns the streams whose pending entries weren't all read back yet, mapped
+            to the id of the last entry read.
+        """
+        return {
+            topic: last_id for topic, last_id in self._streams.items() if last_id != ">"
+        }
+
+    def _advance_pending(self, streams, response):
+        """
+            Moves the cursors of the pending reads past the returned entries, the
+            streams whose pending page came back empty read new entries from now on.
+        """
+        pages = {
+            stream.decode() if isinstance(stream, bytes) else stream: entries
+            for stream, entries in response or []
+        }
+        for topic, last_id in streams.items():
+            if last_id != ">" and topic in self._streams:
+                entries = pages.get(topic)
+                self._streams[topic] = entries[-1][0] if entries else ">"
+
+    def _pending_arguments(self, topic) -> dict:
+        return {
+            "name": topic,
+            "groupname": self.group,
+            "min": self._claim_cursors.get(topic, "-"),
+            "max": "+",
+            "count": self.read_count,
+            "idle": self.claim_idle_ms,
+        }
+
+    def _claim_candidates(self, topic, pending) -> list:
+        """
+            Picks the entries of the other consumers from a page of idle pending entries
+            and moves the claim cursor of the topic past the page.
+        :param pending: The page, as returned by XPENDING.
+        :return: The ids of the entries to claim.
+        """
+        if len(pending) < self.read_count:
+            self._claim_cursors.pop(topic, None)
+        else:
+            last_id = pending[-1]["message_id"]
+            if isinstance(last_id, bytes):
+                last_id = last_id.decode()
+            self._claim_cursors[topic] = f"({last_id}"
+        return [
+            entry["message_id"]
+            for entry in pending
+            if entry["consumer"] not in (self.consumer, self.consumer.encode())
+        ]
+
+    def _claim_arguments(self, topic, entry_ids) -> dict:
+        return {
+            "name": topic,
+            "groupname": self.group,
+            "consumername": self.consumer,
+            "min_idle_time": self.claim_idle_ms,
+            "message_ids": entry_ids,
+        }
+
+    def _should_claim(self) -> bool:
+        now = time.monotonic()
+        if (
+            self._last_claim is not None
+            and now - self._last_claim < self.claim_idle_ms / 1000
+        ):
+            return False
+        self._last_claim = now
+        return True
+
+    def _buffer_entries(self, stream, entries) -> list:
+        """
+            Buffers the entries as messages.
+        :return: The ids of the entries that were deleted, e.g. trimmed, while pending.
+        """
+        if isinstance(stream, str):
+            stream = stream.encode()
+        deleted = []
+        for entry_id, fields in entries:
+            if entry_id is None:
+                continue
+            if not fields:
+                deleted.append(entry_id)
+                continue
+            self._buffer.append(
+                {
+                    "type": "message",
+                    "pattern": None,
+                    "channel": stream,
+                    "data": fields.get(transport.DATA_FIELD.encode()),
+                    "id": entry_id,
+                }
             )
+        return deleted
+
+
+class StreamMessaging(StreamBackend):
+    def __init__(self, group: str = None, consumer: str = None):
+        super().__init__(group, consumer)
+        self.logger = get_logger("MonitoringStreamMessaging")
+
+    def subscribe_to_all(self):
+        """
+            Joins the consumer group of every topic of interest, the entries that were
+            delivered to this consumer but never acknowledged are read first.
+        """
+        redis = self.client.get_redis()
+        for topic in self.TOPICS_OF_INTEREST:
+            self.logger.info(f"Join group {self.group} of stream: {topic}.")
+            try:
+                redis.xgroup_create(**self._group_create_arguments(topic))
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._subscribed()
+
+    def unsubscribe_from_all(self):
+        """
+            Stops reading the streams. The buffered entries aren't acknowledged, they
+            will be delivered again.
+        """
+        self._streams = {}
+        self._buffer.clear()
+
+    def _read(self, streams, block_ms=None):
+        redis = self.client.get_redis()
+        response = redis.xreadgroup(**self._read_arguments(streams, block_ms))
+        for stream, entries in response or []:
+            self._ack_deleted(stream, self._buffer_entries(stream, entries))
+        self._advance_pending(streams, response)
+
+    def _claim(self):
+        redis = self.client.get_redis()
+        for topic in list(self._streams):
+            pending = redis.xpending_range(**self._pending_arguments(topic))
+            entry_ids = self._claim_candidates(topic, pending)
+            if entry_ids:
+                entries = redis.xclaim(**self._claim_arguments(topic, entry_ids))
+                self._ack_deleted(topic, self._buffer_entries(topic, entries))
+
+    def _ack_deleted(self, stream, entry_ids):
+        if entry_ids:
+            self.client.get_redis().xack(stream, self.group, *entry_ids)
+
+    def get_message(self, timeout=1):
+        """
+            Retrieves a message, the entries are read in batches of
+            ApplicationConfig.STREAMS_READ_COUNT.
+        :param timeout: Seconds to block waiting for new entries.
+        :return: The message or None.
+        """
+        if not self._streams:
+            time.sleep(timeout)
+            return None
+        if not self._buffer and self._should_claim():
+            self._claim()
+        if not self._buffer and self._pending_streams():
+            self._read(self._pending_streams())
+        if not self._buffer and not self._pending_streams():
+            self._read(self._streams, int(timeout * 1000) or None)
+        return self._buffer.popleft() if self._buffer else None
+
+    def acknowledge(self, message):
+        """
+            Acknowledges a message once it was processed so it isn't delivered again.
+        """
+        if message and message.get("id") is not None:
+            redis = self.client.get_redis()
+            redis.xack(message["channel"], self.group, message["id"])
+
+    def acknowledge_many(self, messages: list):
+        """
+            Acknowledges the processed messages with one XACK per stream.
+        """
+        ids = collections.defaultdict(list)
+        for message in messages:
+            if message and message.get("id") is not None:
+                ids[message["channel"]].append(message["id"])
+        redis = self.client.get_redis()
+        for stream, stream_ids in ids.items():
+            redis.xack(stream, self.group, *stream_ids)
+
 
-        # Check if token is about to expire in the next 10 minutes and refresh the token.
-        if cls._token_expire - datetime.datetime.now().timestamp() < 600:
-            cls.user = auth.refresh(cls.user["refreshToken"])
+class AsyncStreamMessaging(StreamBackend):
+    """
+        Streams messaging for the asyncio runtime, see StreamMessaging.
+    """
+
+    def __init__(self, group: str = None, consumer: str = None):
+        super().__init__(group, consumer)
+        self._redis = self.client.get_async_redis()
+        self.block_ms = 1000
+        self.logger = get_logger("MonitoringAsyncStreamMessaging")
+
+    async def subscribe_to_all(self):
+        """
+            Joins the consumer group of every topic of interest, see StreamMessaging.
+        """
+        for topic in self.TOPICS_OF_INTEREST:
+            self.logger.info(f"Join group {self.group} of stream: {topic}.")
+            try:
+                await self._redis.xgroup_create(**self._group_create_arguments(topic))
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._subscribed()
+
+    async def _read(self, streams, block_ms=None):
+        response = await self._redis.xreadgroup(
+            **self._read_arguments(streams, block_ms)
+        )
+        for stream, entries in response or []:
+            await self._ack_deleted(stream, self._buffer_entries(stream, entries))
+        self._advance_pending(streams, response)
+
+    async def _claim(self):
+        for topic in list(self._streams):
+            pending = await self._redis.xpending_range(**self._pending_arguments(topic))
+            entry_ids = self._claim_candidates(topic, pending)
+            if entry_ids:
+                entries = await self._redis.xclaim(
+                    **self._claim_arguments(topic, entry_ids)
+                )
+                await self._ack_deleted(topic, self._buffer_entries(topic, entries))
+
+    async def _ack_deleted(self, stream, entry_ids):
+        if entry_ids:
+            await self._redis.xack(stream, self.group, *entry_ids)
+
+    async def get_message(self):
+        """
+            Waits for a message on the topics of interest.
+        :return: The message or None if there are no subscriptions.
+        """
+        while self._streams:
+            if not self._buffer and self._should_claim():
+                await self._claim()
+            if not self._buffer and self._pending_streams():
+                await self._read(self._pending_streams())
+            if not self._buffer and not self._pending_streams():
+                await self._read(self._streams, self.block_ms)
+            if self._buffer:
+                return self._buffer.popleft()
+        return None
+
+    async def close(self):
+        """
+            Stops reading the streams, pending entries will be delivered again.
+        """
+        self._streams = {}
+        self._buffer.clear()
+
+
+def create_messaging():
+    """
+        Creates the messaging for the configured transport, see ApplicationConfig.MESSAGING_TRANSPORT.
+    """
+    if transport.use_streams():
+        return StreamMessaging()
+    return Messaging()
+
+
+def create_async_messaging():
+    """
+        Creates the asyncio messaging for the configured transport.
+    """
+    if transport.use_streams():
+        return AsyncStreamMessaging()
+    return AsyncMessaging()
+
+
+class Firebase(FirebaseService):
+    """
+        Writes to Firebase's realtime database through the FirebaseUploader, which
+        keeps the connections alive and refreshes the token in the background.
+    """
+
+    _push_keys = PushKeyGenerator()
+    _uploader = None
+    _uploader_lock = threading.Lock()
 
     @classmethod
-    def _get_id_token(cls):
-        return cls.user["idToken"]
+    def uploader(cls) -> FirebaseUploader:
+        """
+            Gets the uploader, it is created on first use.
+        """
+        with cls._uploader_lock:
+            if cls._uploader is None:
+                cls.instance()
+                cls._uploader = FirebaseUploader(cls.config())
+            return cls._uploader
 
     @classmethod
     def save(cls, collection_name, data):
@@ -97,6 +469,49 @@ class Firebase(FirebaseService):
             Saves the data in Firebase's realtime database.
         :return: Firebase's push response.
         """
-        cls.ensure_authentication()
-        db = cls.client().database()
-        return db.child(collection_name).push(data, cls._get_id_token())
+        return cls.uploader().push(collection_name, data).result()
+
+    @classmethod
+    def save_many(cls, collection_name, entries: list):
+        """
+            Saves the entries in Firebase's realtime database with a single multi-path
+            update, every entry gets a push key like the ones generated by save.
+        :return: The push keys of the entries.
+        """
+        if not entries:
+            return []
+        updates = {cls.generate_key(): entry for entry in entries}
+        cls.update(collection_name, updates)
+        return list(updates)
+
+    @classmethod
+    def generate_key(cls) -> str:
+        """
+            Generates a push key, keys generated later sort after the earlier ones.
+        """
+        return cls._push_keys.generate()
+
+    @classmethod
+    def update(cls, path, updates: dict):
+        """
+            Updates the children of the path with a single multi-path update, it either
+            writes all of them or none.
+        :return: Firebase's update response.
+        """
+        return cls.update_async(path, updates).result()
+
+    @classmethod
+    def update_async(cls, path, updates: dict) -> concurrent.futures.Future:
+        """
+            Submits the update, see update.
+        :return: The future of Firebase's update response.
+        """
+        return cls.uploader().update(path, updates)
+
+    @classmethod
+    def set(cls, path, data):
+        """
+            Sets the data at the given path in Firebase's realtime database.
+        :return: Firebase's set response.
+        """
+        return cls.uploader().set(path, data).result()
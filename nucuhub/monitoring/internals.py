@@ -1,10 +1,18 @@
 import abc
+import collections
+import itertools
+import multiprocessing
 import queue
+import threading
 import time
 import typing
+import zlib
 
+from nucuhub.config import ApplicationConfig
 from nucuhub.logging import get_logger, get_null_logger
 from nucuhub.monitoring import infrastructure
+from nucuhub.monitoring.buffer import OverflowBuffer
+from nucuhub.monitoring.segmentlog import LogQueue
 from nucuhub.utils import is_string
 
 __all__ = [
@@ -13,6 +21,7 @@ __all__ = [
     "ConsumerStage",
     "Consumer",
     "ConsumerException",
+    "ConsumerPool",
 ]
 
 
@@ -22,6 +31,9 @@ class WorkerBase(abc.ABC):
         self._queue = queue_
         self._loop_should_run = None
         self.sleep_time = 1
+        # In event driven mode the worker blocks on its source for at most sleep_time
+        # seconds and never sleeps, otherwise it also sleeps when there was no work.
+        self.event_driven = ApplicationConfig.MONITORING_EVENT_DRIVEN
 
     def init_logger(self, name):
         """
@@ -51,13 +63,14 @@ class WorkerBase(abc.ABC):
 
     def _loop_forever(self):
         while self._loop_should_run:
-            self._process_message()
-            self._sleep()
+            # A backlog is processed without sleeping between the messages.
+            if not self._process_message() and not self.event_driven:
+                self._sleep()
 
-    def _process_message(self):
+    def _process_message(self) -> bool:
         """
             Processes the message from the queue.
-        :return: Nothing.
+        :return: True if a message was processed, False if there was no work.
         """
         raise NotImplementedError()
 
@@ -74,23 +87,36 @@ class Producer(WorkerBase):
     def __init__(self, queue_: queue.Queue):
         super().__init__(queue_)
         self.init_logger("MonitoringProducer")
-        self.message_broker = infrastructure.Messaging()
-        self.pending_messages = []
+        self.message_broker = infrastructure.create_messaging()
+        # Messages that didn't fit in the queue, see OverflowBuffer.
+        self.overflow = OverflowBuffer()
+
+    def _drain_overflow(self, timeout: float = 0):
+        """
+            Moves the buffered messages to the queue, see OverflowBuffer.drain_into.
+        """
+        return self.overflow.drain_into(self._queue, timeout)
 
     def _process_message(self):
-        message = self.message_broker.get_message()
-        self._logger.debug(f"Polling messages. Got: {message}")
+        self._drain_overflow()
+        if self.overflow.blocks():
+            # Stops reading until the consumer makes room, see OverflowPolicy.BLOCK.
+            return self._drain_overflow(timeout=self.sleep_time) > 0
 
+        message = self.message_broker.get_message(timeout=self.sleep_time)
+        self._logger.debug(f"Polling messages. Got: {message}")
+        if not message:
+            return False
+        if self.overflow:
+            # Queued behind the buffered messages, to keep them in order.
+            self.overflow.append(message)
+            return True
         try:
-            if self.pending_messages:
-                self._queue.put(
-                    self.pending_messages.pop(0), block=True, timeout=self.sleep_time
-                )
-            if message:
-                self._queue.put(message, block=True, timeout=self.sleep_time)
+            self._queue.put(message, block=True, timeout=self.sleep_time)
         except queue.Full:
             self._logger.debug("Queue is full!")
-            self.pending_messages.append(message)
+            self.overflow.append(message)
+        return True
 
     def loop_forever(self):
         """
@@ -101,6 +127,7 @@ class Producer(WorkerBase):
         self.message_broker.subscribe_to_all()
         self._loop_forever()
         self.message_broker.unsubscribe_from_all()
+        self.overflow.close()
 
     def set_topics(self, topics):
         """
@@ -149,6 +176,28 @@ class ConsumerStage:
         """
         raise NotImplementedError()
 
+    def process_batch(self, messages: list) -> list:
+        """
+            Processes a batch of messages, stages can implement it to handle many
+            messages at once. By default every message is passed to process.
+        :param messages: The messages, in the order they were received.
+        :return: The messages that should continue to the next stage.
+        """
+        return [message for message in messages if self.process(message)]
+
+    def flush(self, force: bool = False) -> bool:
+        """
+            Writes the data the stage holds back from the processed messages, e.g.
+            buffered uploads, once it's due. The consumer acknowledges the processed
+            messages once no stage holds back data.
+        :param force: Writes the data even if it isn't due, e.g. on shutdown.
+        :return: True if the stage doesn't hold back data.
+        :raises: If the data can't be written, the messages aren't acknowledged. The
+                 streams transport and a LogQueue deliver them again, with the pub/sub
+                 transport and the in-memory queue the data the stage drops is lost.
+        """
+        return True
+
     def __str__(self):
         return self.name
 
@@ -157,6 +206,26 @@ class ConsumerException(Exception):
     pass
 
 
+def run_pipeline(stages: typing.List[ConsumerStage], message):
+    """
+        Takes the message through the stages until one returns False.
+    """
+    for stage in stages:
+        to_continue = stage.process(message)
+        if not to_continue:
+            break
+
+
+def run_batch_pipeline(stages: typing.List[ConsumerStage], messages: list):
+    """
+        Takes the messages through the stages until none of them continues.
+    """
+    for stage in stages:
+        messages = stage.process_batch(messages)
+        if not messages:
+            break
+
+
 class Consumer(WorkerBase):
     """
         Consumes messages from the queue and takes each message through a number of
@@ -166,24 +235,177 @@ class Consumer(WorkerBase):
 
         Example stages:
             filter -> log -> upload to cloud -> execute code
+
+        With a batch_size larger than 1 the consumer takes up to batch_size messages
+        off the queue, waiting at most batch_timeout seconds after the first one, and
+        passes them to the stages at once, see ConsumerStage.process_batch.
+
+        The messages are acknowledged once the stages flushed the data they hold back,
+        see ConsumerStage.flush, the stages are flushed after every message and while
+        the queue is empty.
     """
 
     def __init__(self, queue_: queue.Queue):
         super().__init__(queue_)
         self.init_logger("MonitoringConsumer")
         self._pipeline_stages = []
+        # Acknowledges the processed messages, e.g. to the streams consumer group.
+        self.message_broker = infrastructure.create_messaging()
+        self.batch_size = ApplicationConfig.MONITORING_BATCH_SIZE
+        self.batch_timeout = ApplicationConfig.MONITORING_BATCH_TIMEOUT_MS / 1000
+        # The messages taken off the queue and whether they failed, in order, until the
+        # stages flushed.
+        self._taken = []
 
     def _process_message(self):
+        if self.batch_size > 1:
+            return self._process_batch()
         try:
             message = self._queue.get(block=True, timeout=self.sleep_time)
-            self._logger.debug(f"Polling messages. Got: {message}")
-            if message:
-                for stage in self._pipeline_stages:
-                    to_continue = stage.process(message)
-                    if not to_continue:
-                        break
         except queue.Empty:
             self._logger.debug("Queue empty!")
+            # Writes what the stages hold back once it's due, e.g. a partial batch.
+            self.flush_stages()
+            return False
+        self._logger.debug(f"Polling messages. Got: {message}")
+        if message:
+            self.consume(message)
+        else:
+            self._taken.append((message, False))
+            self.flush_stages()
+        return True
+
+    def flush_stages(self, force: bool = False):
+        """
+            Flushes the stages, see ConsumerStage.flush. Once none of them holds back
+            data the taken messages are marked done on the queue and acknowledged.
+        :param force: Flushes the stages even if it isn't due, e.g. on shutdown.
+        :raises: The error of a stage that couldn't flush, the taken messages are
+                 marked failed.
+        """
+        try:
+            flushed = [stage.flush(force) for stage in self._pipeline_stages]
+        except Exception:
+            self._mark_taken(failed=True)
+            raise
+        if all(flushed):
+            self._mark_taken()
+
+    def _mark_taken(self, failed: bool = False):
+        taken, self._taken = self._taken, []
+        messages = [
+            message
+            for message, message_failed in taken
+            if message and not (failed or message_failed)
+        ]
+        try:
+            if messages:
+                self.message_broker.acknowledge_many(messages)
+        finally:
+            # The queue is kept in step even if the acknowledge failed, the streams
+            # transport delivers the unacknowledged messages again.
+            for _, message_failed in taken:
+                if failed or message_failed:
+                    self._task_failed()
+                else:
+                    # Commits the message when the queue is a LogQueue.
+                    self._queue.task_done()
+
+    def _task_failed(self):
+        """
+            Marks the oldest message taken off the queue failed, a LogQueue keeps it
+            uncommitted and delivers it again.
+        """
+        if isinstance(self._queue, LogQueue):
+            self._queue.task_failed()
+        else:
+            self._queue.task_done()
+
+    def _get_batch(self) -> list:
+        """
+            Waits for a message, then takes more until the batch is full or the batch
+            timeout passed.
+        :return: The messages, empty if none arrived.
+        """
+        try:
+            messages = [self._queue.get(block=True, timeout=self.sleep_time)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_timeout
+        while len(messages) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    messages.append(self._queue.get(block=True, timeout=remaining))
+                else:
+                    # Past the deadline, only the messages that are already queued.
+                    messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    def _process_batch(self):
+        taken = self._get_batch()
+        self._logger.debug(f"Polling messages. Got {len(taken)} messages.")
+        if not taken:
+            self._logger.debug("Queue empty!")
+            self.flush_stages()
+            return False
+        messages = [message for message in taken if message]
+
+        def run():
+            if messages:
+                self.run_batch_pipeline(messages)
+
+        self._consume(taken, run)
+        return True
+
+    def _consume(self, messages: list, run: typing.Callable[[], None]):
+        """
+            Runs the pipeline for the taken messages, then flushes the stages.
+        """
+        try:
+            run()
+        except Exception:
+            self._taken.extend((message, True) for message in messages)
+            try:
+                # The messages before the failed ones are acknowledged once written.
+                self.flush_stages(force=True)
+            except Exception as e:
+                self._logger.error(f"flushing the stages failed: {e!r}")
+            raise
+        self._taken.extend((message, False) for message in messages)
+        self.flush_stages()
+
+    def consume_batch(self, messages: list):
+        """
+            Takes the messages through the pipeline and acknowledges them, see consume.
+        :param messages: The messages, in the order they were received.
+        """
+        self._consume(messages, lambda: self.run_batch_pipeline(messages))
+
+    def run_batch_pipeline(self, messages: list):
+        """
+            Takes the messages through the pipeline stages, see ConsumerStage.process_batch.
+        :param messages: The messages.
+        """
+        run_batch_pipeline(self._pipeline_stages, messages)
+
+    def consume(self, message):
+        """
+            Takes the message through the pipeline and acknowledges it once the stages
+            flushed, see flush_stages. If a stage raises the message isn't acknowledged
+            and the streams transport or a LogQueue delivers it again.
+        :param message: The message.
+        """
+        self._consume([message], lambda: self.run_pipeline(message))
+
+    def run_pipeline(self, message):
+        """
+            Takes the message through the pipeline stages.
+        :param message: The message.
+        """
+        run_pipeline(self._pipeline_stages, message)
 
     def add_stage(self, new_stage: typing.ClassVar[ConsumerStage]):
         """
@@ -216,6 +438,13 @@ class Consumer(WorkerBase):
         """
         super(Consumer, self).loop_forever()
         self._loop_forever()
+        self._flush_on_shutdown()
+
+    def _flush_on_shutdown(self):
+        try:
+            self.flush_stages(force=True)
+        except Exception as e:
+            self._logger.error(f"flushing the stages on shutdown failed: {e!r}")
 
     def shutdown(self):
         """
@@ -223,3 +452,262 @@ class Consumer(WorkerBase):
         """
         self._logger.info("Shutting down producer.")
         super(Consumer, self).shutdown()
+
+
+# Stops the partition workers and the acknowledging thread of the ConsumerPool.
+_STOP = None
+
+
+def partition_key(entry) -> typing.Optional[str]:
+    """
+        Returns the sensor id of a reading, from its sensor_id or from its channel key.
+    """
+    if not isinstance(entry, dict):
+        return None
+    sensor_id = entry.get("sensor_id")
+    if sensor_id is None and isinstance(entry.get("channel"), str):
+        sensor_id = entry["channel"].partition(":")[0]
+    return sensor_id
+
+
+def run_partition(
+    partition,
+    done,
+    stages: typing.List[ConsumerStage],
+    batch_size: int,
+    flush: bool = False,
+):
+    """
+        Takes the messages of a partition through the stages, in order, until it gets
+        _STOP. The (sequence, succeeded) of every message is put on the done queue.
+    :param flush: Flushes the stages after every batch, e.g. in a process that has its
+                  own copy of the stages.
+    """
+    logger = get_logger("MonitoringConsumerPartition")
+    stop = False
+    while not stop:
+        items = [partition.get()]
+        while items[-1] is not _STOP and len(items) < batch_size:
+            try:
+                items.append(partition.get_nowait())
+            except queue.Empty:
+                break
+        if items[-1] is _STOP:
+            items.pop()
+            stop = True
+        if not items:
+            continue
+        messages = [message for _, message in items]
+        succeeded = True
+        try:
+            if batch_size > 1:
+                run_batch_pipeline(stages, messages)
+            else:
+                run_pipeline(stages, messages[0])
+            if flush:
+                for stage in stages:
+                    stage.flush(force=True)
+        except Exception as e:
+            logger.error(f"processing {len(messages)} messages failed: {e!r}")
+            succeeded = False
+        for sequence, _ in items:
+            done.put((sequence, succeeded))
+
+
+class ConsumerPool(Consumer):
+    """
+        Consumer running the stages on several workers: threads for I/O bound stages,
+        e.g. uploads, or processes for CPU bound ones.
+
+        The readings of every message are split by sensor id and every sensor is mapped
+        to one worker, so the readings of a sensor are processed in order while different
+        sensors are processed in parallel. Messages that aren't lists of readings are
+        mapped by their channel. A message is acknowledged once all its parts were
+        processed and the stages flushed; if a part fails the message isn't acknowledged
+        and a LogQueue delivers it again. Worker threads share the stages, which are
+        flushed by the acknowledging thread, worker processes flush their copies after
+        every batch.
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __init__(
+        self,
+        queue_: queue.Queue,
+        workers: int = None,
+        mode: str = None,
+        partition_size: int = 100,
+    ):
+        """
+        :param workers: The number of workers, by default MONITORING_CONSUMER_WORKERS.
+        :param mode: THREAD or PROCESS, by default MONITORING_CONSUMER_POOL.
+        :param partition_size: The maximum number of messages queued for a worker.
+        """
+        super().__init__(queue_)
+        self.init_logger("MonitoringConsumerPool")
+        self.workers = workers or ApplicationConfig.MONITORING_CONSUMER_WORKERS
+        self.mode = mode or ApplicationConfig.MONITORING_CONSUMER_POOL
+        if self.mode not in (self.THREAD, self.PROCESS):
+            raise ConsumerException(f"Unknown consumer pool mode: {self.mode}")
+        self._partition_size = partition_size
+        self._partitions = []
+        self._done = None
+        self._runners = []
+        self._acknowledging = None
+        self._sequence = itertools.count()
+        # Maps the sequence of every dispatched message to [parts left, failed, message].
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # The messages are taken in the order they were taken off the queue, maps the
+        # sequences of the processed messages to the message and whether it failed.
+        self._next_done = 0
+        self._finished = {}
+
+    def _index(self, key) -> int:
+        if isinstance(key, str):
+            key = key.encode()
+        return zlib.crc32(key) % self.workers
+
+    def partition(self, message) -> typing.Dict[int, dict]:
+        """
+            Splits a message by sensor id.
+        :return: A dict mapping worker indexes to their part of the message, the parts
+                 carry the decoded readings.
+        """
+        data = None
+        if message.get("type") == "message":
+            data = infrastructure.Messaging.decode_message_data(message)
+        if isinstance(data, list) and data:
+            parts = collections.defaultdict(list)
+            for entry in data:
+                key = partition_key(entry)
+                if key is None:
+                    break
+                parts[self._index(key)].append(entry)
+            else:
+                return {
+                    index: dict(message, data=entries)
+                    for index, entries in parts.items()
+                }
+        return {self._index(message.get("channel") or b""): message}
+
+    def _process_message(self):
+        try:
+            message = self._queue.get(block=True, timeout=self.sleep_time)
+        except queue.Empty:
+            self._logger.debug("Queue empty!")
+            return False
+        sequence = next(self._sequence)
+        if not message:
+            with self._pending_lock:
+                self._pending[sequence] = [1, False, message]
+            self._done.put((sequence, True))
+            return True
+        parts = self.partition(message)
+        with self._pending_lock:
+            self._pending[sequence] = [len(parts), False, message]
+        for index, part in parts.items():
+            # Blocks while the worker is behind, the shared queue applies backpressure.
+            self._partitions[index].put((sequence, part))
+        return True
+
+    def _finish(self, sequence: int, message, failed: bool):
+        """
+            Takes the messages up to the oldest one still processed, they are marked
+            done on the queue once the stages flushed, e.g. a LogQueue commits them.
+        """
+        self._finished[sequence] = (message, failed)
+        while self._next_done in self._finished:
+            self._taken.append(self._finished.pop(self._next_done))
+            self._next_done += 1
+
+    def _flush(self, force: bool = False):
+        try:
+            self.flush_stages(force)
+        except Exception as e:
+            self._logger.error(f"flushing the stages failed: {e!r}")
+
+    def _acknowledge_loop(self):
+        """
+            Acknowledges the messages whose parts were all processed once the stages
+            flushed, the stages are flushed while no message is done too.
+        """
+        while True:
+            try:
+                item = self._done.get(timeout=self.sleep_time)
+            except queue.Empty:
+                self._flush()
+                continue
+            if item is _STOP:
+                self._flush(force=True)
+                break
+            sequence, succeeded = item
+            with self._pending_lock:
+                pending = self._pending[sequence]
+                pending[0] -= 1
+                pending[1] = pending[1] or not succeeded
+                if pending[0]:
+                    continue
+                del self._pending[sequence]
+            _, failed, message = pending
+            self._finish(sequence, message, failed)
+            self._flush()
+
+    def start(self):
+        """
+            Starts the workers.
+        """
+        if self.mode == self.PROCESS:
+            context = multiprocessing.get_context()
+            create_queue, create_runner = context.Queue, context.Process
+        else:
+            create_queue, create_runner = queue.Queue, threading.Thread
+        self._partitions = [
+            create_queue(self._partition_size) for _ in range(self.workers)
+        ]
+        self._done = create_queue()
+        self._runners = [
+            create_runner(
+                target=run_partition,
+                args=(
+                    partition,
+                    self._done,
+                    self._pipeline_stages,
+                    self.batch_size,
+                    self.mode == self.PROCESS,
+                ),
+                name=f"MonitoringConsumerPartition-{index}",
+                daemon=True,
+            )
+            for index, partition in enumerate(self._partitions)
+        ]
+        for runner in self._runners:
+            runner.start()
+        self._acknowledging = threading.Thread(
+            target=self._acknowledge_loop, name="MonitoringConsumerAcks", daemon=True
+        )
+        self._acknowledging.start()
+
+    def stop(self):
+        """
+            Stops the workers once they processed the dispatched messages.
+        """
+        for partition in self._partitions:
+            partition.put(_STOP)
+        for runner in self._runners:
+            runner.join()
+        self._done.put(_STOP)
+        self._acknowledging.join()
+        self._runners = []
+
+    def loop_forever(self):
+        """
+            Blocking operation that dispatches the messages to the workers.
+        """
+        WorkerBase.loop_forever(self)
+        self.start()
+        try:
+            self._loop_forever()
+        finally:
+            self.stop()
@@ -5,23 +5,29 @@ import time
 import traceback
 import typing
 
-from nucuhub import logging
+from nucuhub import logging, runtime
+from nucuhub.config import ApplicationConfig
 
 from nucuhub.monitoring import (  # isort:skip
     ConsumerStage,
     infrastructure,
     internals,
+    segmentlog,
     workflows,
 )
 
 
 class MonitoringMain:
     def __init__(self):
-        self.message_broker = infrastructure.Messaging()
+        self.message_broker = infrastructure.create_messaging()
         self.logger = logging.get_logger("MonitoringLogger")
         self.sleep_time = 10
 
-        self._shared_queue = queue.Queue(maxsize=100)
+        if ApplicationConfig.MONITORING_LOG_DIR:
+            # Survives restarts and absorbs long outages of the sink, on the disk.
+            self._shared_queue = segmentlog.LogQueue(segmentlog.SegmentLog())
+        else:
+            self._shared_queue = queue.Queue(maxsize=100)
         self.monitoring_topics = None
         self.monitoring_stages = None
         self._consumer_loop_is_running = True
@@ -51,7 +57,10 @@ class MonitoringMain:
         self.producer.loop_forever()
 
     def _consumer_work_loop(self):
-        self._consumer = internals.Consumer(self._shared_queue)
+        if ApplicationConfig.MONITORING_CONSUMER_WORKERS > 1:
+            self._consumer = internals.ConsumerPool(self._shared_queue)
+        else:
+            self._consumer = internals.Consumer(self._shared_queue)
         for stage in self.monitoring_stages:
             self.logger.debug(f"Loading consumer workflow stage: {stage}")
             self._consumer.add_stage(stage)
@@ -100,6 +109,9 @@ class MonitoringMain:
                     # We get a canceled error when we cancel tasks.
                     self.logger.warning(e)
                 time.sleep(self.sleep_time)
+        if isinstance(self._shared_queue, segmentlog.LogQueue):
+            # The consumer committed the messages it flushed on shutdown.
+            self._shared_queue.close()
 
     def shutdown(self, signum, frame):
         """
@@ -113,10 +125,18 @@ class MonitoringMain:
             self.producer.shutdown()
         if self._consumer:
             self._consumer.shutdown()
+        if isinstance(self._shared_queue, segmentlog.LogQueue):
+            self._shared_queue.log.sync()
 
 
 def main():
-    monitoring = MonitoringMain()
+    if runtime.use_asyncio():
+        # Imported here, the asyncio runtime builds on top of this module.
+        from nucuhub.monitoring.aio import AsyncMonitoringMain
+
+        monitoring = AsyncMonitoringMain()
+    else:
+        monitoring = MonitoringMain()
     monitoring.add_topics(["sensors"])
     monitoring.add_stages_workflow([workflows.SensorsWorkflow()])
     monitoring.loop_forever()
@@ -0,0 +1,481 @@
+"""
+    Disk-backed store-and-forward log between the monitoring Producer and Consumer.
+
+    The log is a directory of append-only segment files named after the offset of
+    their first byte. Every record is framed by its length and its CRC32, so a record
+    torn by a crash or a power loss is detected and cut off when the log is opened.
+    The segments are read through mmap, the offset of the first record that wasn't
+    processed is checkpointed, the log is replayed from it after a restart and the
+    segments before it are deleted.
+"""
+import collections
+import json
+import mmap
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+import typing
+import zlib
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.logging import get_logger
+
+__all__ = ["SegmentLogException", "SegmentLog", "LogQueue"]
+
+# The length and the CRC32 of the record payload.
+HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT = "checkpoint.json"
+
+
+class SegmentLogException(Exception):
+    pass
+
+
+class SegmentLog:
+    """
+        Append-only log of pickled messages.
+
+        Appends are written right away, so they survive a crash of the process, and
+        they are fsynced every fsync_records records or fsync_interval seconds, so a
+        power loss loses at most that many. The read offset is committed by the reader
+        once the records were processed, records after the checkpoint are read again
+        after a restart.
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        segment_bytes: int = None,
+        max_bytes: int = None,
+        fsync_records: int = None,
+        fsync_interval: float = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param directory: The directory of the segments and the checkpoint.
+        :param segment_bytes: A new segment is started once the active one is larger.
+        :param max_bytes: The log is full once its backlog is this many bytes.
+        :param fsync_records: Appended records after which the log is fsynced.
+        :param fsync_interval: Seconds after which the appended records are fsynced.
+        """
+        self._logger = get_logger("MonitoringSegmentLog")
+        self.directory = directory or ApplicationConfig.MONITORING_LOG_DIR
+        if not self.directory:
+            raise SegmentLogException("The segment log needs a directory!")
+        self.segment_bytes = (
+            segment_bytes or ApplicationConfig.MONITORING_LOG_SEGMENT_BYTES
+        )
+        self.max_bytes = max_bytes or ApplicationConfig.MONITORING_LOG_MAX_BYTES
+        self.fsync_records = (
+            fsync_records or ApplicationConfig.MONITORING_LOG_FSYNC_RECORDS
+        )
+        if fsync_interval is None:
+            fsync_interval = ApplicationConfig.MONITORING_LOG_FSYNC_MS / 1000
+        self.fsync_interval = fsync_interval
+        self._clock = clock
+        self._lock = threading.RLock()
+        # The base offsets of the segments, the last one is written to.
+        self._segments = []
+        self._fd = None
+        self._end = 0
+        self._unsynced = 0
+        self._synced_at = clock()
+        # The mmap of the segment that is read: its base offset, the map and its size.
+        self._mapped = None
+        self.read_offset = 0
+        self.committed = 0
+        self._checkpointed = 0
+        self._open()
+
+    def _path(self, base: int) -> str:
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        if not self._segments:
+            self._segments = [self._read_checkpoint()]
+        base = self._segments[-1]
+        self._fd = os.open(
+            self._path(base), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        self._end = base + self._recover(base)
+        self.committed = self._checkpointed = min(
+            max(self._read_checkpoint(), self._segments[0]), self._end
+        )
+        self.read_offset = self.committed
+        self._delete_committed()
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT)) as f:
+                return json.load(f)["offset"]
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError) as e:
+            self._logger.error(f"invalid checkpoint, replaying the log: {e!r}")
+            return 0
+
+    def _write_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"offset": self.committed}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._checkpointed = self.committed
+
+    def _recover(self, base: int) -> int:
+        """
+            Cuts off the torn record at the end of the active segment, if any.
+        :return: The size of the valid records.
+        """
+        size = os.fstat(self._fd).st_size
+        if not size:
+            return 0
+        with open(self._path(base), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                position = 0
+                record = self._record_at(view, position)
+                while record is not None:
+                    position = record[0]
+                    record = self._record_at(view, position)
+        if position < size:
+            self._logger.warning(
+                f"cutting off {size - position} bytes of a torn record in {base}"
+            )
+            os.ftruncate(self._fd, position)
+        return position
+
+    @staticmethod
+    def _record_at(view, position: int) -> typing.Optional[typing.Tuple[int, bytes]]:
+        """
+            Reads the record at the position.
+        :return: The position after the record and its payload, None if the record is
+                 incomplete or corrupted.
+        """
+        start = position + HEADER.size
+        if start > len(view):
+            return None
+        length, crc = HEADER.unpack_from(view, position)
+        payload = view[start : start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return None
+        return start + length, payload
+
+    @property
+    def end(self) -> int:
+        """
+            The offset after the last appended record.
+        """
+        return self._end
+
+    @property
+    def size(self) -> int:
+        """
+            The number of bytes in the segments.
+        """
+        return self._end - self._segments[0]
+
+    @property
+    def backlog(self) -> int:
+        """
+            The number of bytes that weren't committed.
+        """
+        return self._end - self.committed
+
+    def full(self) -> bool:
+        """
+            Checks if the backlog reached max_bytes, the segments on the disk can hold
+            up to one more segment of committed records.
+        """
+        return self.backlog >= self.max_bytes
+
+    def append(self, message):
+        """
+            Appends the message, a new segment is started if the active one is full.
+        :raises: SegmentLogException if the log is full.
+        """
+        payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self.full():
+                raise SegmentLogException("The segment log is full!")
+            os.write(self._fd, HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._end += HEADER.size + len(payload)
+            self._unsynced += 1
+            if self._end - self._segments[-1] >= self.segment_bytes:
+                self._rotate()
+            elif self._unsynced >= self.fsync_records:
+                self.sync()
+
+    def _rotate(self):
+        self.sync()
+        os.close(self._fd)
+        self._segments.append(self._end)
+        self._fd = os.open(
+            self._path(self._end), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+
+    def sync(self):
+        """
+            Flushes the appended records and the checkpoint to the disk.
+        """
+        with self._lock:
+            if self._unsynced:
+                os.fsync(self._fd)
+                self._unsynced = 0
+            if self._checkpointed != self.committed:
+                self._write_checkpoint()
+            self._synced_at = self._clock()
+
+    def sync_if_due(self):
+        """
+            Syncs if fsync_interval passed since the last sync.
+        """
+        if self._clock() - self._synced_at >= self.fsync_interval:
+            self.sync()
+
+    def _segment_of(self, offset: int) -> int:
+        for base in reversed(self._segments):
+            if base <= offset:
+                return base
+        return self._segments[0]
+
+    def _map(self, base: int, refresh: bool = False):
+        """
+            Maps the segment.
+        :param refresh: Maps the segment again, e.g. the active segment that grew.
+        :return: The map, None if the segment is empty.
+        """
+        if self._mapped is not None:
+            mapped_base, view, _ = self._mapped
+            if mapped_base == base and not refresh:
+                return view
+            view.close()
+            self._mapped = None
+        with open(self._path(base), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return None
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = (base, view, size)
+        return view
+
+    def _read_record(self, base: int):
+        view = self._map(base)
+        if view is not None:
+            record = self._record_at(view, self.read_offset - base)
+            if record is not None:
+                return record, view
+        mapped_size = self._mapped[2] if self._mapped is not None else 0
+        if base == self._segments[-1] and mapped_size < self._end - base:
+            # The record was appended after the active segment was mapped.
+            view = self._map(base, refresh=True)
+            return self._record_at(view, self.read_offset - base), view
+        return None, view
+
+    def read(self, max_records: int) -> typing.List[typing.Tuple[int, typing.Any]]:
+        """
+            Reads the records after the read offset and moves it past them.
+        :return: The offset after every record and its message.
+        """
+        records = []
+        with self._lock:
+            while len(records) < max_records and self.read_offset < self._end:
+                base = self._segment_of(self.read_offset)
+                record, view = self._read_record(base)
+                if record is None:
+                    index = self._segments.index(base)
+                    if index + 1 == len(self._segments):
+                        break
+                    if self.read_offset - base < len(view or b""):
+                        self._logger.error(
+                            f"skipping the corrupted end of segment {base}"
+                        )
+                    self.read_offset = self._segments[index + 1]
+                    continue
+                position, payload = record
+                self.read_offset = base + position
+                records.append((self.read_offset, pickle.loads(payload)))
+        return records
+
+    def commit(self, offset: int):
+        """
+            Marks the records before the offset as processed, the segments that only
+            hold processed records are deleted.
+        """
+        with self._lock:
+            if offset <= self.committed:
+                return
+            self.committed = offset
+            self._delete_committed()
+            self.sync_if_due()
+
+    def _delete_committed(self):
+        while len(self._segments) > 1 and self._segments[1] <= self.committed:
+            base = self._segments.pop(0)
+            if self._mapped is not None and self._mapped[0] == base:
+                self._mapped[1].close()
+                self._mapped = None
+            os.remove(self._path(base))
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            self.sync()
+            os.close(self._fd)
+            self._fd = None
+            if self._mapped is not None:
+                self._mapped[1].close()
+                self._mapped = None
+
+
+class LogQueue:
+    """
+        queue.Queue over a SegmentLog, it replaces the shared queue of the monitoring
+        Producer and Consumer. A message is committed once task_done was called for it
+        and for every message that was taken out before it. The queue is full while the
+        log is full, then the Producer buffers the messages, see OverflowBuffer.
+
+        A message marked with task_failed is delivered again after retry_delay seconds
+        and holds back the commit until it was processed, so it is also replayed after
+        a restart.
+    """
+
+    def __init__(
+        self, log: SegmentLog, read_ahead: int = 256, retry_delay: float = None
+    ):
+        """
+        :param read_ahead: The maximum number of records read from the log at once.
+        :param retry_delay: Seconds after which a failed message is delivered again.
+        """
+        self.log = log
+        self.maxsize = read_ahead
+        self._read_ahead = read_ahead
+        if retry_delay is None:
+            retry_delay = ApplicationConfig.MONITORING_LOG_RETRY_MS / 1000
+        self.retry_delay = retry_delay
+        # The (start offset, end offset, message) of the records read ahead.
+        self._ready = collections.deque()
+        self._read_end = log.read_offset
+        # The messages that were taken out, in order, and if they are retries.
+        self._delivered = collections.deque()
+        # The (due time, start offset, end offset, message) of the failed messages.
+        self._retries = collections.deque()
+        # The start offsets of the failed messages that weren't processed yet.
+        self._failed = set()
+        # The end offset of the last new message that was marked done or failed.
+        self._done = log.committed
+        self._changed = threading.Condition()
+
+    def _fill(self) -> bool:
+        if not self._ready:
+            for end, message in self.log.read(self._read_ahead):
+                self._ready.append((self._read_end, end, message))
+                self._read_end = end
+        return bool(self._ready)
+
+    def _next(self):
+        """
+            Takes out the next failed message that is due, or the next new message.
+        :return: The start offset, the end offset, the message and if it's a retry, None
+                 if there is no message.
+        """
+        if self._retries and self._retries[0][0] <= time.monotonic():
+            _, start, end, message = self._retries.popleft()
+            return start, end, message, True
+        if self._fill():
+            return self._ready.popleft() + (False,)
+        return None
+
+    def put(self, message, block: bool = True, timeout: float = None):
+        with self._changed:
+            if not self._changed.wait_for(
+                lambda: not self.log.full(), timeout if block else 0
+            ):
+                raise queue.Full
+            self.log.append(message)
+            self._changed.notify_all()
+
+    def put_nowait(self, message):
+        self.put(message, block=False)
+
+    def get(self, block: bool = True, timeout: float = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                item = self._next()
+                if item is not None:
+                    break
+                now = time.monotonic()
+                if not block or (deadline is not None and now >= deadline):
+                    self.log.sync_if_due()
+                    raise queue.Empty
+                waits = [] if deadline is None else [deadline - now]
+                if self._retries:
+                    waits.append(self._retries[0][0] - now)
+                self._changed.wait(min(waits) if waits else None)
+            self._delivered.append(item)
+            return item[2]
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _take_delivered(self):
+        if not self._delivered:
+            raise ValueError("task_done() called too many times")
+        start, end, message, retried = self._delivered.popleft()
+        if not retried:
+            self._done = end
+        return start, end, message
+
+    def _commit(self):
+        self.log.commit(min(self._failed, default=self._done))
+        self._changed.notify_all()
+
+    def task_done(self):
+        """
+            Marks the oldest message that was taken out processed and commits it.
+        :raises: ValueError if called more times than messages were taken out.
+        """
+        with self._changed:
+            start, _, _ = self._take_delivered()
+            self._failed.discard(start)
+            self._commit()
+
+    def task_failed(self):
+        """
+            Marks the oldest message that was taken out failed, it is delivered again
+            after retry_delay and isn't committed until then.
+        :raises: ValueError if called more times than messages were taken out.
+        """
+        with self._changed:
+            start, end, message = self._take_delivered()
+            self._failed.add(start)
+            self._retries.append(
+                (time.monotonic() + self.retry_delay, start, end, message)
+            )
+            self._commit()
+
+    def empty(self) -> bool:
+        with self._changed:
+            return (
+                not self._ready
+                and not self._retries
+                and self.log.read_offset >= self.log.end
+            )
+
+    def full(self) -> bool:
+        return self.log.full()
+
+    def close(self):
+        self.log.close()
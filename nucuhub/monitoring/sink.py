@@ -0,0 +1,225 @@
+import collections
+import concurrent.futures
+import threading
+import time
+import typing
+
+import requests
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.logging import get_logger
+from nucuhub.monitoring import infrastructure
+
+__all__ = ["FirebaseSinkException", "FirebaseBatchSink"]
+
+# Client errors that aren't caused by the written data, the update is retried.
+RETRIED_STATUS_CODES = {401, 403, 408, 429}
+
+
+def _status_code(error: requests.HTTPError) -> typing.Optional[int]:
+    """
+        Returns the status code of the failed request, pyrebase wraps the error of
+        requests in a new HTTPError without the response.
+    """
+    response = error.response
+    if response is None and error.args and isinstance(error.args[0], Exception):
+        response = getattr(error.args[0], "response", None)
+    return response.status_code if response is not None else None
+
+
+def _rejected(error: Exception) -> bool:
+    """
+        Checks if Firebase rejected the written data, e.g. 400 for invalid data or 413
+        for a too large update.
+    """
+    if not isinstance(error, requests.HTTPError):
+        return False
+    status_code = _status_code(error)
+    return (
+        status_code is not None
+        and 400 <= status_code < 500
+        and status_code not in RETRIED_STATUS_CODES
+    )
+
+
+class FirebaseSinkException(Exception):
+    pass
+
+
+class FirebaseBatchSink:
+    """
+        Writes entries to a Firebase collection with multi-path updates of up to
+        flush_size entries, instead of one push request per entry.
+
+        Every entry gets its push key when it is added. Updates that Firebase rejects
+        are split in halves until the rejected entries are found, those are dropped.
+        Updates that fail otherwise, e.g. while the network is down, fail the flush.
+        Their entries are kept for up to retries more flushes, then they are dropped
+        and logged. Their messages aren't acknowledged: the streams transport and a
+        LogQueue deliver them again, so retries should be 0 with those, but with the
+        pub/sub transport and the in-memory queue the dropped entries are lost, see
+        ConsumerStage.flush.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        flush_size: int = None,
+        flush_interval: float = None,
+        retries: int = 0,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param collection: The Firebase collection the entries are written to.
+        :param flush_size: The maximum number of entries written by an update.
+        :param flush_interval: Seconds the entries can wait for a flush, 0 flushes
+                               after every add.
+        :param retries: The flushes that retry the entries of a failed update.
+        """
+        self._logger = get_logger("MonitoringFirebaseSink")
+        self.collection = collection
+        self.flush_size = flush_size or ApplicationConfig.MONITORING_FIREBASE_FLUSH_SIZE
+        if flush_interval is None:
+            flush_interval = (
+                ApplicationConfig.MONITORING_FIREBASE_FLUSH_INTERVAL_MS / 1000
+            )
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._clock = clock
+        self._lock = threading.RLock()
+        # Maps the push keys to the entries, in the order they were added.
+        self._pending = collections.OrderedDict()
+        self._pending_since = None
+        # Maps the push keys of the entries whose update failed to the failed attempts.
+        self._attempts = {}
+        self.written = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, entries: typing.Iterable):
+        """
+            Adds the entries, they are written by the next flush.
+        """
+        with self._lock:
+            for entry in entries:
+                self._pending[infrastructure.Firebase.generate_key()] = entry
+            if self._pending and self._pending_since is None:
+                self._pending_since = self._clock()
+
+    def due(self) -> bool:
+        """
+            Checks if flush_size entries are pending or the oldest one waited for
+            flush_interval.
+        """
+        with self._lock:
+            return bool(self._pending) and (
+                len(self._pending) >= self.flush_size
+                or self._clock() - self._pending_since >= self.flush_interval
+            )
+
+    def flush_if_due(self) -> int:
+        """
+            Flushes if due, see flush.
+        """
+        if self.due():
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """
+            Writes the pending entries, the updates are submitted at once and run up to
+            the uploader's in-flight limit. Entries added meanwhile wait for the next
+            flush.
+        :return: The number of written entries.
+        :raises: FirebaseSinkException if an update failed, its entries are retried by
+                 the next flushes or dropped, see retries.
+        """
+        with self._lock:
+            items = list(self._pending.items())
+            self._pending = collections.OrderedDict()
+            self._pending_since = None
+        chunks = [
+            dict(items[start : start + self.flush_size])
+            for start in range(0, len(items), self.flush_size)
+        ]
+        submitted = [(chunk, self._submit(chunk)) for chunk in chunks]
+        written = 0
+        failed = collections.OrderedDict()
+        error = None
+        for chunk, future in submitted:
+            try:
+                written += self._write(chunk, future)
+            except Exception as e:
+                failed.update(chunk)
+                error = e
+            else:
+                for key in chunk:
+                    self._attempts.pop(key, None)
+        with self._lock:
+            dropped = self._retry(failed)
+            self.written += written
+            self.dropped += dropped
+        if error is not None:
+            self._logger.error(
+                f"Can't write {len(failed)} entries, dropped {dropped} of them: {error!r}"
+            )
+            raise FirebaseSinkException(
+                f"Can't write {len(failed)} entries, dropped {dropped} of them!"
+            ) from error
+        return written
+
+    def _retry(self, failed: dict) -> int:
+        """
+            Puts the failed entries back in front of the pending ones, the entries that
+            failed more than retries times are dropped. Called with the lock held.
+        :return: The number of dropped entries.
+        """
+        retried = collections.OrderedDict()
+        for key, entry in failed.items():
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts > self.retries:
+                self._attempts.pop(key, None)
+                continue
+            self._attempts[key] = attempts
+            retried[key] = entry
+        if retried:
+            retried.update(self._pending)
+            self._pending = retried
+            if self._pending_since is None:
+                self._pending_since = self._clock()
+        return len(failed) - len(retried)
+
+    def _submit(self, chunk: dict) -> concurrent.futures.Future:
+        try:
+            return infrastructure.Firebase.instance().update_async(
+                self.collection, chunk
+            )
+        except Exception as e:
+            future = concurrent.futures.Future()
+            future.set_exception(e)
+            return future
+
+    def _write(self, chunk: dict, future: concurrent.futures.Future = None) -> int:
+        """
+            Writes the chunk, a rejected chunk is split to drop the rejected entries.
+        :param future: The submitted update of the chunk, if any.
+        :return: The number of written entries.
+        :raises: The error of a failed update that wasn't rejected.
+        """
+        try:
+            (future or self._submit(chunk)).result()
+            return len(chunk)
+        except Exception as e:
+            if not _rejected(e):
+                raise
+            if len(chunk) == 1:
+                self._logger.error(f"Firebase rejected {chunk}: {e!r}")
+                with self._lock:
+                    self.rejected += 1
+                return 0
+        items = list(chunk.items())
+        half = len(items) // 2
+        return self._write(dict(items[:half])) + self._write(dict(items[half:]))
@@ -1,3 +1,11 @@
+import http.server
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+
+from nucuhub.infrastructure.firebase import FirebaseConfiguration
 from nucuhub.monitoring import internals
 
 
@@ -18,3 +26,195 @@ class MockConsumerStageException(internals.ConsumerStage):
 
     def process(self, message):
         raise ValueError("This is an intentional exception.")
+
+
+class MockBatchConsumerStage(internals.ConsumerStage):
+    name = "mock batch consumer stage"
+
+    def __init__(self):
+        self.batches = []
+
+    def process_batch(self, messages):
+        self.batches.append(messages)
+        return messages[1:]
+
+
+class MockRecordingConsumerStage(internals.ConsumerStage):
+    name = "mock recording consumer stage"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.readings = []
+
+    def process(self, message):
+        # Simulates uploading every reading, the pool runs it on several threads.
+        time.sleep(self.delay * len(message["data"]))
+        self.readings.extend(message["data"])
+        return True
+
+
+class MockBufferingConsumerStage(internals.ConsumerStage):
+    name = "mock buffering consumer stage"
+
+    def __init__(self, flush_size=2):
+        self.flush_size = flush_size
+        self.buffered = []
+        self.written = []
+        self.fail = False
+
+    def process(self, message):
+        self.buffered.append(message)
+        return True
+
+    def flush(self, force=False):
+        if self.buffered and (force or len(self.buffered) >= self.flush_size):
+            buffered, self.buffered = self.buffered, []
+            if self.fail:
+                raise ValueError("This is an intentional exception.")
+            self.written.extend(buffered)
+        return not self.buffered
+
+
+class FakeFirebaseHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are sent separately, Nagle would delay the body.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/v1/accounts:signInWithPassword":
+            self._body()
+            token, refresh_token, expires_in = self.server.issue_token()
+            self._send(
+                200,
+                {
+                    "idToken": token,
+                    "refreshToken": refresh_token,
+                    "expiresIn": expires_in,
+                },
+            )
+        elif url.path == "/v1/token":
+            self._body()
+            time.sleep(self.server.token_delay)
+            token, refresh_token, expires_in = self.server.issue_token()
+            self._send(
+                200,
+                {
+                    "id_token": token,
+                    "refresh_token": refresh_token,
+                    "expires_in": expires_in,
+                },
+            )
+        else:
+            self._write(url)
+
+    def do_PUT(self):
+        self._write(urllib.parse.urlparse(self.path))
+
+    def do_PATCH(self):
+        self._write(urllib.parse.urlparse(self.path))
+
+    def _write(self, url):
+        data = self._body()
+        token = urllib.parse.parse_qs(url.query).get("auth", [None])[0]
+        if token not in self.server.tokens:
+            self._send(401, {"error": "Permission denied"})
+            return
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(
+                self.server.max_in_flight, self.server.in_flight
+            )
+        time.sleep(self.server.latency)
+        path = url.path[1 : -len(".json")]
+        response = data
+        with self.server.lock:
+            self.server.in_flight -= 1
+            self.server.requests += 1
+            if self.command == "POST":
+                key = f"key{next(self.server.keys)}"
+                self.server.store[f"{path}/{key}"] = data
+                response = {"name": key}
+            elif self.command == "PATCH":
+                for child, value in data.items():
+                    self.server.store[f"{path}/{child}"] = value
+            else:
+                self.server.store[path] = data
+        self._send(200, response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeFirebaseServer(http.server.ThreadingHTTPServer):
+    """
+        Local stand-in for the Firebase authentication and Realtime Database REST APIs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, expires_in=3600, token_delay=0.0):
+        super().__init__(("127.0.0.1", 0), FakeFirebaseHandler)
+        self.latency = latency
+        self.expires_in = expires_in
+        self.token_delay = token_delay
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.keys = itertools.count()
+        self.store = {}
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def config(self) -> FirebaseConfiguration:
+        return FirebaseConfiguration(
+            api_key="fake",
+            auth_domain="localhost",
+            database_url=self.url,
+            storage_bucket="fake",
+            user_email="user@localhost",
+            user_password="password",
+            auth_url=self.url,
+            token_url=self.url,
+        )
+
+    def issue_token(self):
+        with self.lock:
+            token = f"token{next(self.keys)}"
+            self.tokens.add(token)
+        return token, f"refresh-{token}", str(self.expires_in)
+
+    def revoke_tokens(self):
+        with self.lock:
+            self.tokens.clear()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
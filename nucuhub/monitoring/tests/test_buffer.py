@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from nucuhub.monitoring.buffer import OverflowBuffer, OverflowPolicy
+
+
+def drain(buffer):
+    messages = []
+    while buffer:
+        messages.append(buffer.popleft())
+    return messages
+
+
+@pytest.mark.parametrize(
+    "policy, expected, dropped",
+    [
+        pytest.param("drop-oldest", [3, 4, 5], 2, id="drop-oldest"),
+        pytest.param("drop-newest", [1, 2, 3], 2, id="drop-newest"),
+        pytest.param("block", [1, 2, 3, 4, 5], 0, id="block"),
+    ],
+)
+def test_overflow_buffer_policies(policy, expected, dropped):
+    buffer = OverflowBuffer(capacity=3, policy=policy)
+    for message in range(1, 6):
+        buffer.append(message)
+    assert buffer.dropped == dropped
+    assert buffer.blocks() is (policy == "block")
+    assert drain(buffer) == expected
+
+
+def test_overflow_buffer_spills_to_disk(tmp_path):
+    spill_path = tmp_path / "spill"
+    buffer = OverflowBuffer(
+        capacity=2, policy=OverflowPolicy.SPILL, spill_path=str(spill_path)
+    )
+    for message in range(5):
+        buffer.append({"data": message})
+    assert buffer.stats() == {
+        "buffered": 2,
+        "spilled": 3,
+        "buffered_total": 5,
+        "dropped": 0,
+    }
+    assert os.path.exists(buffer.spill_path)
+
+    assert buffer.popleft() == {"data": 0}
+    # Spilled messages stay behind the ones in memory.
+    buffer.append({"data": 5})
+    assert [message["data"] for message in drain(buffer)] == [1, 2, 3, 4, 5]
+    assert not os.path.exists(buffer.spill_path)
+
+
+def test_overflow_buffer_spill_limit(tmp_path):
+    buffer = OverflowBuffer(
+        capacity=1,
+        policy=OverflowPolicy.SPILL,
+        spill_path=str(tmp_path / "spill"),
+        spill_max_bytes=100,
+    )
+    assert all(buffer.append(b"x" * 20) for _ in range(3))
+    assert buffer.append(b"x" * 20) is False
+    assert buffer.dropped == 1
+    buffer.close()
+    assert not os.path.exists(buffer.spill_path)
+
+
+def test_overflow_buffer_removes_stale_spills(tmp_path):
+    # A process that stopped, a running one and this process before a restart.
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    running = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        for pid in (stopped.pid, running.pid, os.getpid()):
+            (tmp_path / f"spill.{pid}").write_bytes(b"spilled")
+
+        buffer = OverflowBuffer(
+            capacity=1, policy=OverflowPolicy.SPILL, spill_path=str(tmp_path / "spill")
+        )
+        assert sorted(os.listdir(tmp_path)) == [f"spill.{running.pid}"]
+
+        # Other workers' spill files aren't truncated.
+        for message in range(3):
+            buffer.append(message)
+        assert (tmp_path / f"spill.{running.pid}").read_bytes() == b"spilled"
+        assert drain(buffer) == [0, 1, 2]
+    finally:
+        running.kill()
+        running.wait()
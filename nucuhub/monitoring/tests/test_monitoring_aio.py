@@ -0,0 +1,90 @@
+import asyncio
+import queue
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.monitoring import internals
+from nucuhub.monitoring.aio import AsyncMonitoringMain
+from nucuhub.monitoring.infrastructure import AsyncStreamMessaging
+from nucuhub.monitoring.segmentlog import SegmentLog
+from nucuhub.monitoring.tests import mocks
+
+
+def test_async_monitoring_runs_pipeline(redis_fixture):
+    redis = redis_fixture.get_redis()
+    stage = mocks.MockConsumerStage()
+
+    async def run_monitoring():
+        monitoring = AsyncMonitoringMain()
+        monitoring.add_topics(["test_topic"])
+        monitoring.add_stages_workflow([stage])
+        task = asyncio.ensure_future(monitoring.run())
+        await asyncio.sleep(0.2)
+        redis.publish("test_topic", "tm1")
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    task = asyncio.run(run_monitoring())
+    assert task.cancelled() is True
+    assert stage.processed is True
+
+
+def test_async_monitoring_uses_log_queue_and_pool(redis_fixture, tmp_path, monkeypatch):
+    monkeypatch.setattr(ApplicationConfig, "MONITORING_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(ApplicationConfig, "MONITORING_CONSUMER_WORKERS", 2)
+    redis = redis_fixture.get_redis()
+    stage = mocks.MockBufferingConsumerStage(flush_size=100)
+
+    async def run_monitoring():
+        monitoring = AsyncMonitoringMain()
+        monitoring.add_topics(["test_topic"])
+        monitoring.add_stages_workflow([stage])
+        task = asyncio.ensure_future(monitoring.run())
+        await asyncio.sleep(0.2)
+        redis.publish("test_topic", "tm1")
+        redis.publish("test_topic", "tm2")
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return monitoring
+
+    monitoring = asyncio.run(run_monitoring())
+    assert isinstance(monitoring._consumer, internals.ConsumerPool)
+    # The stage was flushed on shutdown and the messages were committed.
+    assert [message["data"] for message in stage.written] == [b"tm1", b"tm2"]
+    assert SegmentLog(str(tmp_path)).read(100) == []
+
+
+def test_async_monitoring_drains_overflow(redis_fixture):
+    async def enqueue():
+        monitoring = AsyncMonitoringMain()
+        monitoring._shared_queue = queue.Queue(maxsize=1)
+        monitoring._overflow_lock = asyncio.Lock()
+        await monitoring._enqueue_async("m1")
+        await monitoring._enqueue_async("m2")
+        assert len(monitoring.overflow) == 1
+        monitoring._shared_queue.get_nowait()
+        await monitoring._enqueue_async()
+        return monitoring
+
+    monitoring = asyncio.run(enqueue())
+    assert monitoring._shared_queue.get_nowait() == "m2"
+    assert not monitoring.overflow
+
+
+def test_async_stream_messaging_get_message(redis_fixture):
+    redis = redis_fixture.get_redis()
+
+    async def read_message():
+        messaging = AsyncStreamMessaging(group="test_group", consumer="c1")
+        messaging.TOPICS_OF_INTEREST = ["test_stream"]
+        await messaging.subscribe_to_all()
+        redis.xadd("test_stream", {"data": "tm1"})
+        message = await asyncio.wait_for(messaging.get_message(), timeout=2)
+        await messaging.close()
+        return message
+
+    message = asyncio.run(read_message())
+    assert message["data"] == b"tm1"
+    assert redis.xpending("test_stream", "test_group")["pending"] == 1
@@ -1,5 +1,14 @@
+import random
+from unittest.mock import MagicMock
+
 import pytest
 
+from nucuhub.infrastructure import codecs
+from nucuhub.infrastructure.catalog import CatalogCache, SensorCatalog
+from nucuhub.infrastructure.firebase import PushKeyGenerator
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.monitoring.infrastructure import Firebase, StreamMessaging
+
 
 def test_messaging_subscribe_to_all(messaging):
     messaging.TOPICS_OF_INTEREST = ["test_topic1", "test_topic2"]
@@ -40,3 +49,167 @@ def test_messaging_get_data(messaging):
 )
 def test_messaging_decode_data(messaging, message_data, expected):
     assert messaging.decode_message_data({"data": message_data}) == expected
+
+
+def test_messaging_decode_columns(messaging):
+    batch = MeasurementBatch()
+    batch.append("bme680", "temperature", 1.5, 21.3)
+    payload = codecs.get_codec("columns").encode(batch)
+    assert messaging.decode_message_data({"data": payload}) == [
+        {"channel": "bme680:temperature", "timestamp": 1.5, "value": 21.3}
+    ]
+    # Payloads that can't be decoded are dropped.
+    assert messaging.decode_message_data({"data": payload[:-1]}) is None
+    assert messaging.decode_message_data({"data": b"\xff\xfe"}) is None
+
+
+def test_catalog_cache_resolve(redis_fixture):
+    now = [0]
+    catalog = SensorCatalog()
+    cache = CatalogCache(catalog, refresh_interval=10, clock=lambda: now[0])
+    catalog.register({"s:a": {"description": "a"}})
+    assert cache.resolve("s:a") == {"description": "a"}
+
+    # Unknown channels reload the catalog at most once per refresh interval.
+    catalog.register({"s:b": {"description": "b"}})
+    assert cache.resolve("s:b") is None
+    now[0] = 10
+    assert cache.resolve("s:b") == {"description": "b"}
+    assert cache.all() == {"s:a": {"description": "a"}, "s:b": {"description": "b"}}
+
+
+def test_stream_messaging_reads_and_acknowledges(redis_fixture):
+    redis = redis_fixture.get_redis()
+    redis.xadd("test_stream", {"data": "published before the group existed"})
+    messaging = StreamMessaging(group="test_group", consumer="c1")
+    messaging.TOPICS_OF_INTEREST = ["test_stream"]
+    messaging.subscribe_to_all()
+    redis.xadd("test_stream", {"data": b'{"ok":true}'})
+
+    first = messaging.get_message(timeout=0.1)
+    second = messaging.get_message(timeout=0.1)
+    assert messaging.decode_message_data(first) == "published before the group existed"
+    assert messaging.decode_message_data(second) == {"ok": True}
+    assert second["channel"] == b"test_stream"
+    assert messaging.get_message(timeout=0.1) is None
+
+    messaging.acknowledge(first)
+    messaging.acknowledge(second)
+    assert redis.xpending("test_stream", "test_group")["pending"] == 0
+
+
+def test_stream_messaging_redelivers_pending(redis_fixture):
+    redis = redis_fixture.get_redis()
+    crashed = StreamMessaging(group="test_group", consumer="c1")
+    crashed.TOPICS_OF_INTEREST = ["test_stream"]
+    crashed.subscribe_to_all()
+    redis.xadd("test_stream", {"data": "m1"})
+    redis.xadd("test_stream", {"data": "m2"})
+    assert crashed.get_message(timeout=0.1)["data"] == b"m1"
+
+    # The same consumer gets its unacknowledged entries back after a restart.
+    restarted = StreamMessaging(group="test_group", consumer="c1")
+    restarted.TOPICS_OF_INTEREST = ["test_stream"]
+    restarted.subscribe_to_all()
+    assert restarted.get_message(timeout=0.1)["data"] == b"m1"
+    assert restarted.get_message(timeout=0.1)["data"] == b"m2"
+
+    # Another consumer claims them once they are idle.
+    other = StreamMessaging(group="test_group", consumer="c2")
+    other.claim_idle_ms = 0
+    other.TOPICS_OF_INTEREST = ["test_stream"]
+    other.subscribe_to_all()
+    claimed = [other.get_message(timeout=0.1), other.get_message(timeout=0.1)]
+    assert [message["data"] for message in claimed] == [b"m1", b"m2"]
+    assert redis.xpending("test_stream", "test_group")["consumers"] == [
+        {"name": b"c2", "pending": 2}
+    ]
+
+
+def test_stream_messaging_doesnt_claim_its_own_entries(redis_fixture):
+    redis = redis_fixture.get_redis()
+    messaging = StreamMessaging(group="test_group", consumer="c1")
+    messaging.claim_idle_ms = 0
+    messaging.TOPICS_OF_INTEREST = ["test_stream"]
+    messaging.subscribe_to_all()
+    redis.xadd("test_stream", {"data": "m1"})
+    assert messaging.get_message(timeout=0.1)["data"] == b"m1"
+
+    # The entry is still in flight, e.g. in the sink, it isn't delivered again.
+    messaging._last_claim = None
+    assert messaging.get_message(timeout=0.1) is None
+
+
+def test_stream_messaging_pages_pending_and_claims(redis_fixture):
+    redis = redis_fixture.get_redis()
+    crashed = StreamMessaging(group="test_group", consumer="c1")
+    crashed.TOPICS_OF_INTEREST = ["test_stream"]
+    crashed.subscribe_to_all()
+    for data in ("m1", "m2", "m3"):
+        redis.xadd("test_stream", {"data": data})
+    assert crashed.get_message(timeout=0.1)["data"] == b"m1"
+
+    # The pending entries are read back one page at a time.
+    restarted = StreamMessaging(group="test_group", consumer="c1")
+    restarted.read_count = 1
+    restarted.TOPICS_OF_INTEREST = ["test_stream"]
+    restarted.subscribe_to_all()
+    redis.xadd("test_stream", {"data": "m4"})
+    received = [restarted.get_message(timeout=0.1)["data"] for _ in range(4)]
+    assert received == [b"m1", b"m2", b"m3", b"m4"]
+
+    # A claim takes one page of the other consumers' idle entries.
+    other = StreamMessaging(group="test_group", consumer="c2")
+    other.claim_idle_ms = 0
+    other.read_count = 2
+    other.TOPICS_OF_INTEREST = ["test_stream"]
+    other.subscribe_to_all()
+    assert other.get_message(timeout=0.1)["data"] == b"m1"
+    assert [message["data"] for message in other._buffer] == [b"m2"]
+    other._last_claim = None
+    other._buffer.clear()
+    assert other.get_message(timeout=0.1)["data"] == b"m3"
+
+
+def test_stream_messaging_acknowledges_many(redis_fixture):
+    redis = redis_fixture.get_redis()
+    messaging = StreamMessaging(group="test_group", consumer="c1")
+    messaging.TOPICS_OF_INTEREST = ["test_stream"]
+    messaging.subscribe_to_all()
+    for data in ("m1", "m2", "m3"):
+        redis.xadd("test_stream", {"data": data})
+    messages = [messaging.get_message(timeout=0.1) for _ in range(3)]
+
+    messaging.acknowledge_many(messages + [None])
+    assert redis.xpending("test_stream", "test_group")["pending"] == 0
+
+
+def test_firebase_save_many(monkeypatch):
+    uploader = MagicMock()
+    monkeypatch.setattr(Firebase, "generate_key", MagicMock(side_effect=["k1", "k2"]))
+    monkeypatch.setattr(Firebase, "uploader", MagicMock(return_value=uploader))
+
+    assert Firebase.save_many("sensors", [{"v": 1}, {"v": 2}]) == ["k1", "k2"]
+    uploader.update.assert_called_once_with("sensors", {"k1": {"v": 1}, "k2": {"v": 2}})
+    uploader.update.return_value.result.assert_called_once_with()
+    assert Firebase.save_many("sensors", []) == []
+
+
+def test_push_key_generator_orders_keys():
+    now = [1.0]
+    generator = PushKeyGenerator(clock=lambda: now[0], rand=random.Random(1))
+    keys = [generator.generate() for _ in range(200)]
+    # The clock going back doesn't break the order.
+    now[0] = 0.5
+    keys.append(generator.generate())
+    now[0] = 2.0
+    keys.append(generator.generate())
+
+    assert all(len(key) == 20 for key in keys)
+    assert len(set(keys)) == len(keys)
+    assert sorted(keys) == keys
+    assert keys[-1][:8] > keys[0][:8]
+
+    # The increment carries into the previous characters.
+    generator._last_random = [0] * 10 + [63, 63]
+    assert generator.generate()[-3:] == "0--"
@@ -1,4 +1,9 @@
+import itertools
+import json
+import threading
+import time
 from queue import Queue
+from unittest.mock import MagicMock
 
 import pytest
 
@@ -95,6 +100,41 @@ def test_consumer_shutdown(messaging):
     assert consumer._loop_should_run is False
 
 
+@pytest.mark.parametrize(
+    "event_driven, expected_sleeps",
+    [
+        pytest.param(False, 1, id="sleep-when-idle"),
+        pytest.param(True, 0, id="event-driven"),
+    ],
+)
+def test_worker_loop_event_driven(event_driven, expected_sleeps):
+    _, consumer = create_consumer(1)
+    consumer.event_driven = event_driven
+    consumer._sleep = MagicMock()
+    processed = []
+
+    def process_message():
+        processed.append(True)
+        if len(processed) == 3:
+            consumer.shutdown()
+        # Only the second poll found no work.
+        return len(processed) != 2
+
+    consumer._process_message = process_message
+    consumer._loop_should_run = True
+    consumer._loop_forever()
+    assert len(processed) == 3
+    assert consumer._sleep.call_count == expected_sleeps
+
+
+def test_consumer_process_message_returns_work_done():
+    q, consumer = create_consumer(1)
+    consumer.sleep_time = 0.01
+    q.put({"test": True})
+    assert consumer._process_message() is True
+    assert consumer._process_message() is False
+
+
 def test_consumer_add_stage():
     _, consumer = create_consumer(1)
     test_stage = internals.ConsumerStage()
@@ -130,3 +170,227 @@ def test_consumer_process():
     assert test_stage.processed is True
     # The queue is empty, the exception should be handled.
     consumer._process_message()
+
+
+def test_consumer_acknowledges_processed_messages():
+    q, consumer = create_consumer(2)
+    consumer.message_broker = MagicMock()
+    consumer.add_stage(mocks.MockConsumerStage())
+    q.put({"id": b"1-0"})
+    consumer._process_message()
+    consumer.message_broker.acknowledge_many.assert_called_once_with([{"id": b"1-0"}])
+
+    # Messages that fail in a stage aren't acknowledged, they will be delivered again.
+    consumer.message_broker.reset_mock()
+    consumer.add_stage(mocks.MockConsumerStageException())
+    q.put({"id": b"2-0"})
+    with pytest.raises(ValueError):
+        consumer._process_message()
+    consumer.message_broker.acknowledge_many.assert_not_called()
+
+
+def test_consumer_acknowledges_once_stages_flushed():
+    q, consumer = create_consumer(10)
+    consumer.message_broker = MagicMock()
+    consumer.sleep_time = 0.01
+    stage = mocks.MockBufferingConsumerStage(flush_size=2)
+    consumer.add_stage(stage)
+    q.put("m1")
+    consumer._process_message()
+    # The stage holds back the data of m1, it isn't acknowledged yet.
+    consumer.message_broker.acknowledge_many.assert_not_called()
+    assert q.unfinished_tasks == 1
+
+    q.put("m2")
+    consumer._process_message()
+    assert stage.written == ["m1", "m2"]
+    consumer.message_broker.acknowledge_many.assert_called_once_with(["m1", "m2"])
+    assert q.unfinished_tasks == 0
+
+    # A partial batch is flushed on shutdown.
+    q.put("m3")
+    loop = threading.Thread(target=consumer.loop_forever)
+    loop.start()
+    time.sleep(0.05)
+    consumer.shutdown()
+    loop.join()
+    assert stage.written == ["m1", "m2", "m3"]
+    consumer.message_broker.acknowledge_many.assert_called_with(["m3"])
+
+
+def test_consumer_doesnt_acknowledge_when_flush_fails():
+    q, consumer = create_consumer(10)
+    consumer.message_broker = MagicMock()
+    stage = mocks.MockBufferingConsumerStage(flush_size=2)
+    stage.fail = True
+    consumer.add_stage(stage)
+    q.put("m1")
+    q.put("m2")
+    consumer._process_message()
+    with pytest.raises(ValueError):
+        consumer._process_message()
+    consumer.message_broker.acknowledge_many.assert_not_called()
+    assert q.unfinished_tasks == 0
+
+
+def test_consumer_batch_mode(messaging):
+    queue, consumer = create_consumer(10)
+    consumer.batch_size = 3
+    consumer.batch_timeout = 0.01
+    batch_stage = mocks.MockBatchConsumerStage()
+    stage = mocks.MockConsumerStage()
+    consumer.add_stage(batch_stage)
+    consumer.add_stage(stage)
+    consumer.message_broker = MagicMock()
+    for message in ("m1", "m2", "m3", "m4"):
+        queue.put(message)
+
+    assert consumer._process_message() is True
+    assert consumer._process_message() is True
+    assert batch_stage.batches == [["m1", "m2", "m3"], ["m4"]]
+    # The second stage falls back to process for the messages that continued.
+    assert stage.processed is True
+    consumer.message_broker.acknowledge_many.assert_called_with(["m4"])
+
+    consumer.sleep_time = 0.01
+    assert consumer._process_message() is False
+
+
+def test_consumer_batch_waits_for_timeout(messaging):
+    queue, consumer = create_consumer(10)
+    consumer.batch_size = 10
+    consumer.batch_timeout = 0.05
+    queue.put("m1")
+    start = time.monotonic()
+    assert consumer._get_batch() == ["m1"]
+    assert 0.05 <= time.monotonic() - start < 0.5
+
+
+def create_pool(workers, q=None):
+    pool = internals.ConsumerPool(q or Queue(), workers=workers, mode="thread")
+    pool.message_broker = MagicMock()
+    pool.sleep_time = 0.01
+    return pool
+
+
+def sensors_message(sensor_ids, index):
+    data = json.dumps(
+        [{"channel": f"{sensor_id}:value", "value": index} for sensor_id in sensor_ids]
+    )
+    return {"type": "message", "channel": b"sensors", "data": data.encode()}
+
+
+def run_pool(pool, messages):
+    for message in messages:
+        pool._queue.put(message)
+    pool.start()
+    while not pool._queue.empty():
+        pool._process_message()
+    pool.stop()
+
+
+def test_consumer_pool_partition():
+    pool = create_pool(4)
+    message = sensors_message(["s1", "s2", "s3"], 0)
+    parts = pool.partition(message)
+    readings = [entry for part in parts.values() for entry in part["data"]]
+    assert sorted(entry["channel"] for entry in readings) == [
+        "s1:value",
+        "s2:value",
+        "s3:value",
+    ]
+    for index, part in parts.items():
+        assert all(pool._index(entry["channel"][:2]) == index for entry in part["data"])
+
+    # Messages without readings go to the partition of their channel.
+    assert pool.partition({"type": "pmessage", "channel": b"cmd"}) == {
+        pool._index(b"cmd"): {"type": "pmessage", "channel": b"cmd"}
+    }
+
+
+def test_consumer_pool_invalid_mode():
+    with pytest.raises(internals.ConsumerException):
+        internals.ConsumerPool(Queue(), workers=2, mode="fiber")
+
+
+def test_consumer_pool_keeps_sensor_order():
+    pool = create_pool(4)
+    stage = mocks.MockRecordingConsumerStage()
+    pool.add_stage(stage)
+    sensor_ids = [f"sensor{index}" for index in range(8)]
+    messages = [sensors_message(sensor_ids, index) for index in range(20)]
+    run_pool(pool, messages)
+
+    for sensor_id in sensor_ids:
+        values = [
+            entry["value"]
+            for entry in stage.readings
+            if entry["channel"].startswith(f"{sensor_id}:")
+        ]
+        assert values == list(range(20))
+    acknowledged = [
+        message
+        for c in pool.message_broker.acknowledge_many.call_args_list
+        for message in c[0][0]
+    ]
+    assert acknowledged == messages
+
+
+def test_consumer_pool_does_not_acknowledge_failed_messages():
+    pool = create_pool(2)
+    pool.add_stage(mocks.MockConsumerStageException())
+    run_pool(pool, [sensors_message(["s1", "s2"], 0)])
+    pool.message_broker.acknowledge_many.assert_not_called()
+    assert pool._pending == {}
+
+
+def test_consumer_pool_flushes_stages():
+    pool = create_pool(2)
+    stage = mocks.MockBufferingConsumerStage(flush_size=100)
+    pool.add_stage(stage)
+    messages = [sensors_message(["s1", "s2"], index) for index in range(3)]
+    run_pool(pool, messages)
+    # The partial batch is flushed when the pool stops.
+    assert sum(len(part["data"]) for part in stage.written) == 6
+    assert pool.message_broker.acknowledge_many.call_count == 1
+
+
+def test_consumer_pool_scales_with_workers():
+    # Four sensors in four different partitions.
+    pool = create_pool(4)
+    sensor_ids, used = [], set()
+    for index in itertools.count():
+        if pool._index(f"sensor{index}") not in used:
+            used.add(pool._index(f"sensor{index}"))
+            sensor_ids.append(f"sensor{index}")
+        if len(sensor_ids) == 4:
+            break
+    messages = [sensors_message(sensor_ids, index) for index in range(10)]
+
+    elapsed = {}
+    for workers in (1, 4):
+        pool = create_pool(workers)
+        pool.add_stage(mocks.MockRecordingConsumerStage(delay=0.01))
+        start = time.monotonic()
+        run_pool(pool, messages)
+        elapsed[workers] = time.monotonic() - start
+    assert elapsed[4] < elapsed[1] / 2
+
+
+def test_producer_drains_overflow_in_bulk(messaging):
+    queue, producer = create_producer(3, "test_topic")
+    producer.sleep_time = 0.01
+    producer.message_broker = MagicMock()
+    producer.message_broker.get_message.side_effect = [f"m{i}" for i in range(5)] + [
+        None
+    ] * 2
+    for _ in range(5):
+        producer._process_message()
+    assert producer.overflow.stats()["buffered"] == 2
+
+    # Once the consumer makes room every buffered message fits in one call.
+    for _ in range(3):
+        queue.get_nowait()
+    assert producer._process_message() is False
+    assert [queue.get_nowait() for _ in range(2)] == ["m3", "m4"]
+    assert not producer.overflow
@@ -0,0 +1,94 @@
+import concurrent.futures
+from unittest.mock import MagicMock
+
+from nucuhub.infrastructure.catalog import SensorCatalog
+from nucuhub.monitoring import infrastructure
+from nucuhub.monitoring.sink import FirebaseBatchSink
+from nucuhub.monitoring.workflows import SensorsWorkflow
+
+
+def test_sensors_workflow_syncs_catalog_once(redis_fixture, monkeypatch):
+    metadata = {"sensor_id": "s", "name": "a", "description": "a"}
+    SensorCatalog().register({"s:a": metadata})
+    db = MagicMock()
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    workflow = SensorsWorkflow()
+
+    for _ in range(3):
+        workflow._sync_catalog([{"channel": "s:a", "timestamp": 0, "value": 1}])
+    workflow._sync_catalog([{"channel": "s:unknown", "timestamp": 0, "value": 1}])
+
+    # The entry is submitted without waiting for Firebase.
+    db.update_async.assert_called_once_with("sensors_catalog", {"s:a": metadata})
+    db.set.assert_not_called()
+    assert workflow._synced_channels == {"s:a"}
+
+
+def test_sensors_workflow_syncs_catalog_again_on_errors(redis_fixture, monkeypatch):
+    metadata = {"sensor_id": "s", "name": "a", "description": "a"}
+    SensorCatalog().register({"s:a": metadata})
+    db = MagicMock()
+    failed = concurrent.futures.Future()
+    failed.set_exception(ConnectionError("offline"))
+    db.update_async.side_effect = [failed, concurrent.futures.Future()]
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    workflow = SensorsWorkflow()
+
+    for _ in range(3):
+        workflow._sync_catalog([{"channel": "s:a", "timestamp": 0, "value": 1}])
+
+    assert db.update_async.call_count == 2
+
+
+def test_sensors_workflow_process_batch(redis_fixture, monkeypatch):
+    db = MagicMock()
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    workflow = SensorsWorkflow()
+    messages = [
+        {"type": "message", "channel": b"sensors", "data": b'[{"v": 1}, {"v": 2}]'},
+        {"type": "message", "channel": b"other", "data": b"[]"},
+        {"type": "message", "channel": b"sensors", "data": b'[{"v": 3}]'},
+    ]
+
+    assert workflow.process_batch(messages) == [messages[0], messages[2]]
+    db.update_async.assert_not_called()
+    assert workflow.flush() is True
+    db.update_async.assert_called_once()
+    collection, updates = db.update_async.call_args[0]
+    assert collection == "sensors"
+    assert list(updates.values()) == [{"v": 1}, {"v": 2}, {"v": 3}]
+    db.save.assert_not_called()
+
+
+def test_sensors_workflow_process_writes_one_update(redis_fixture, monkeypatch):
+    db = MagicMock()
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    workflow = SensorsWorkflow()
+    message = {
+        "type": "message",
+        "channel": b"sensors",
+        "data": b'[{"v": 1}, {"v": 2}, {"v": 3}, {"v": 4}, {"v": 5}]',
+    }
+
+    assert workflow.process(message) is True
+    assert workflow.flush() is True
+    assert db.update_async.call_count == 1
+    db.save.assert_not_called()
+
+
+def test_sensors_workflow_flushes_when_due(redis_fixture, monkeypatch):
+    db = MagicMock()
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    workflow = SensorsWorkflow()
+    now = [0.0]
+    workflow.sink = FirebaseBatchSink(
+        "sensors", flush_size=10, flush_interval=1, clock=lambda: now[0]
+    )
+    workflow.process({"type": "message", "channel": b"sensors", "data": b'[{"v": 1}]'})
+
+    # The reading is held back until it waited for the flush interval.
+    assert workflow.flush() is False
+    db.update_async.assert_not_called()
+    now[0] = 1
+    assert workflow.flush() is True
+    db.update_async.assert_called_once()
@@ -0,0 +1,216 @@
+import os
+import queue
+from unittest.mock import MagicMock
+
+import pytest
+
+from nucuhub.monitoring import internals
+from redis.exceptions import RedisError
+
+from nucuhub.monitoring.segmentlog import (  # isort:skip
+    LogQueue,
+    SegmentLog,
+    SegmentLogException,
+)
+
+
+def messages(log, max_records=100):
+    return [message for _, message in log.read(max_records)]
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+
+
+def test_segment_log_replays_uncommitted_records(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    for index in range(5):
+        log.append({"id": index, "data": b"payload"})
+    records = log.read(2)
+    assert [message["id"] for _, message in records] == [0, 1]
+    log.commit(records[-1][0])
+    log.close()
+
+    # The records after the checkpoint are read again.
+    log = SegmentLog(str(tmp_path))
+    assert [message["id"] for message in messages(log)] == [2, 3, 4]
+    log.append({"id": 5})
+    assert [message["id"] for message in messages(log)] == [5]
+
+
+def test_segment_log_rotates_and_deletes_segments(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=100)
+    for index in range(10):
+        log.append(b"x" * 40)
+    assert len(segment_files(tmp_path)) == 6
+
+    records = log.read(100)
+    assert len(records) == 10
+    # Two records per segment, the segment of the 7th record is still needed.
+    log.commit(records[6][0])
+    assert len(segment_files(tmp_path)) == 3
+    log.commit(records[-1][0])
+    assert len(segment_files(tmp_path)) == 1
+
+
+def test_segment_log_cuts_off_torn_records(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    log.append("m1")
+    log.append("m2")
+    log.close()
+    path = tmp_path / segment_files(tmp_path)[0]
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+
+    log = SegmentLog(str(tmp_path))
+    assert messages(log) == ["m1"]
+    log.append("m3")
+    assert messages(log) == ["m3"]
+
+
+def test_segment_log_full(tmp_path):
+    log = SegmentLog(str(tmp_path), max_bytes=60)
+    log.append(b"x" * 40)
+    with pytest.raises(SegmentLogException):
+        log.append(b"x" * 40)
+
+    log_queue = LogQueue(log)
+    with pytest.raises(queue.Full):
+        log_queue.put("m", timeout=0.01)
+    # Processing the message frees the log.
+    log_queue.get_nowait()
+    log_queue.task_done()
+    log_queue.put_nowait("m")
+
+
+def test_segment_log_fsync_batching(tmp_path, monkeypatch):
+    now = [0.0]
+    log = SegmentLog(
+        str(tmp_path), fsync_records=3, fsync_interval=1, clock=lambda: now[0]
+    )
+    fsync = MagicMock()
+    monkeypatch.setattr(os, "fsync", fsync)
+    log.append("m1")
+    log.append("m2")
+    assert fsync.call_count == 0
+    log.append("m3")
+    assert fsync.call_count == 1
+
+    log.append("m4")
+    log.sync_if_due()
+    assert fsync.call_count == 1
+    now[0] = 1
+    log.sync_if_due()
+    assert fsync.call_count == 2
+
+
+def test_consumer_commits_log_queue(tmp_path):
+    log_queue = LogQueue(SegmentLog(str(tmp_path)))
+    consumer = internals.Consumer(log_queue)
+    consumer.message_broker = MagicMock()
+    consumer.sleep_time = 0.01
+    stage = MagicMock()
+    stage.name = "stage"
+    stage.process.return_value = True
+    consumer.add_stage(stage)
+    for index in range(3):
+        log_queue.put({"id": index})
+
+    assert consumer._process_message() is True
+    assert 0 < log_queue.log.committed < log_queue.log.end
+    assert consumer._process_message() is True
+    assert consumer._process_message() is True
+    assert consumer._process_message() is False
+    assert log_queue.log.committed == log_queue.log.end
+    assert log_queue.empty()
+    log_queue.close()
+
+    # Everything was processed, nothing is replayed.
+    assert messages(SegmentLog(str(tmp_path))) == []
+
+
+def test_consumer_commits_log_queue_when_acknowledge_fails(tmp_path):
+    log_queue = LogQueue(SegmentLog(str(tmp_path)))
+    consumer = internals.Consumer(log_queue)
+    consumer.message_broker = MagicMock()
+    consumer.message_broker.acknowledge_many.side_effect = [
+        RedisError("connection lost"),
+        None,
+    ]
+    consumer.sleep_time = 0.01
+    stage = MagicMock()
+    stage.name = "stage"
+    stage.process.return_value = True
+    consumer.add_stage(stage)
+    for index in range(2):
+        log_queue.put({"id": index})
+
+    with pytest.raises(RedisError):
+        consumer._process_message()
+    assert consumer._process_message() is True
+    assert log_queue.log.committed == log_queue.log.end
+    log_queue.close()
+
+    assert messages(SegmentLog(str(tmp_path))) == []
+
+
+def test_consumer_doesnt_commit_failed_messages(tmp_path):
+    log_queue = LogQueue(SegmentLog(str(tmp_path)))
+    consumer = internals.Consumer(log_queue)
+    consumer.message_broker = MagicMock()
+    consumer.sleep_time = 0.01
+    stage = MagicMock()
+    stage.name = "stage"
+    stage.process.side_effect = ValueError("upload failed")
+    consumer.add_stage(stage)
+    log_queue.put({"id": 0})
+
+    with pytest.raises(ValueError):
+        consumer._process_message()
+    assert log_queue.log.committed == 0
+    log_queue.close()
+
+    # The failed message is replayed after a restart.
+    assert messages(SegmentLog(str(tmp_path))) == [{"id": 0}]
+
+
+def test_log_queue_retries_failed_messages(tmp_path):
+    log_queue = LogQueue(SegmentLog(str(tmp_path)), retry_delay=0.05)
+    for index in range(2):
+        log_queue.put({"id": index})
+
+    assert log_queue.get_nowait() == {"id": 0}
+    log_queue.task_failed()
+    assert log_queue.get_nowait() == {"id": 1}
+    log_queue.task_done()
+    # The failed message holds back the commit of the ones after it.
+    assert log_queue.log.committed == 0
+    assert not log_queue.empty()
+
+    assert log_queue.get(timeout=1) == {"id": 0}
+    log_queue.task_done()
+    assert log_queue.log.committed == log_queue.log.end
+    assert log_queue.empty()
+
+
+def test_consumer_pool_doesnt_commit_failed_messages(tmp_path):
+    log_queue = LogQueue(SegmentLog(str(tmp_path)), retry_delay=60)
+    pool = internals.ConsumerPool(log_queue, workers=2, mode="thread")
+    pool.message_broker = MagicMock()
+    pool.sleep_time = 0.01
+    stage = MagicMock()
+    stage.name = "stage"
+    stage.process.side_effect = [ValueError("upload failed"), True]
+    pool.add_stage(stage)
+    log_queue.put({"type": "pmessage", "channel": b"c1"})
+    log_queue.put({"type": "pmessage", "channel": b"c1"})
+
+    pool.start()
+    assert pool._process_message() is True
+    assert pool._process_message() is True
+    pool.stop()
+    assert log_queue.log.committed == 0
+    assert pool._finished == {}
+    log_queue.close()
+
+    assert len(messages(SegmentLog(str(tmp_path)))) == 2
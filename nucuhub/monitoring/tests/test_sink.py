@@ -0,0 +1,126 @@
+import concurrent.futures
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from nucuhub.monitoring import infrastructure
+from nucuhub.monitoring.sink import FirebaseBatchSink, FirebaseSinkException
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    # pyrebase wraps the error of requests without the response.
+    return requests.HTTPError(requests.HTTPError(response=response), "error")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = MagicMock()
+    db.written = {}
+    db.update.side_effect = lambda collection, updates: db.written.update(updates)
+
+    def update_async(collection, updates):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(db.update(collection, updates))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    db.update_async.side_effect = update_async
+    monkeypatch.setattr(infrastructure.Firebase, "instance", lambda: db)
+    return db
+
+
+def test_sink_flushes_by_size_and_interval(db):
+    now = [0.0]
+    sink = FirebaseBatchSink(
+        "sensors", flush_size=3, flush_interval=1, clock=lambda: now[0]
+    )
+    sink.add([{"v": 1}, {"v": 2}])
+    assert sink.flush_if_due() == 0
+
+    now[0] = 1
+    assert sink.flush_if_due() == 2
+    sink.add([{"v": index} for index in range(7)])
+    assert sink.flush_if_due() == 7
+    # Updates of at most flush_size entries.
+    assert [len(c[0][1]) for c in db.update.call_args_list] == [2, 3, 3, 1]
+    assert sorted(db.written) == list(db.written)
+    assert sink.written == 9
+
+
+def test_sink_flush_fails_on_update_errors(db):
+    sink = FirebaseBatchSink("sensors", flush_size=2, flush_interval=0)
+    sink.add([{"v": index} for index in range(4)])
+    db.update.side_effect = [None, requests.ConnectionError("offline")]
+
+    # The messages of the entries aren't acknowledged, they are delivered again.
+    with pytest.raises(FirebaseSinkException):
+        sink.flush()
+    assert len(sink) == 0
+    assert sink.written == 2
+    assert sink.dropped == 2
+
+
+def test_sink_retries_failed_entries(db):
+    sink = FirebaseBatchSink("sensors", flush_size=2, flush_interval=0, retries=1)
+    sink.add([{"v": index} for index in range(4)])
+    db.update.side_effect = [None, requests.ConnectionError("offline")]
+
+    with pytest.raises(FirebaseSinkException):
+        sink.flush()
+    # The failed entries are kept for the next flush, before the new ones.
+    sink.add([{"v": 4}])
+    assert [entry["v"] for entry in sink._pending.values()] == [2, 3, 4]
+    assert sink.dropped == 0
+
+    db.update.side_effect = requests.ConnectionError("offline")
+    with pytest.raises(FirebaseSinkException):
+        sink.flush()
+    # The entries that failed twice are dropped, the new one is retried.
+    assert [entry["v"] for entry in sink._pending.values()] == [4]
+    assert sink.dropped == 2
+
+    db.update.side_effect = lambda collection, updates: db.written.update(updates)
+    assert sink.flush() == 1
+    assert sink.written == 3
+    assert sink._attempts == {}
+
+
+def test_sink_drops_rejected_entries(db):
+    def update(collection, updates):
+        if any(entry.get("bad") for entry in updates.values()):
+            raise http_error(400)
+        db.written.update(updates)
+
+    db.update.side_effect = update
+    sink = FirebaseBatchSink("sensors", flush_size=8, flush_interval=0)
+    sink.add([{"v": index, "bad": index == 5} for index in range(8)])
+
+    assert sink.flush() == 7
+    assert sink.rejected == 1
+    assert len(sink) == 0
+    assert sorted(entry["v"] for entry in db.written.values()) == [0, 1, 2, 3, 4, 6, 7]
+
+
+def test_sink_doesnt_block_adds_while_flushing(db):
+    update = concurrent.futures.Future()
+    db.update_async.side_effect = lambda collection, updates: update
+    sink = FirebaseBatchSink("sensors", flush_interval=0)
+    sink.add([{"v": 1}])
+    flushing = threading.Thread(target=sink.flush)
+    flushing.start()
+    time.sleep(0.05)
+
+    # The flush waits for the update without holding the lock.
+    sink.add([{"v": 2}])
+    assert list(sink._pending.values()) == [{"v": 2}]
+    update.set_result(None)
+    flushing.join()
+    assert sink.written == 1
+    assert len(sink) == 1
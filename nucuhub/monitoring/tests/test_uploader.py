@@ -0,0 +1,84 @@
+import time
+
+import pytest
+import requests
+
+from nucuhub.monitoring.tests.mocks import FakeFirebaseServer
+from nucuhub.monitoring.uploader import FirebaseUploader
+
+
+@pytest.fixture
+def server():
+    server = FakeFirebaseServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def uploader(server):
+    uploader = FirebaseUploader(server.config(), max_in_flight=3, timeout=5)
+    yield uploader
+    uploader.close()
+
+
+def test_uploader_writes_on_kept_alive_connections(server, uploader):
+    assert uploader.push("sensors", {"v": 1}).result() == {"name": "key1"}
+    uploader.update("sensors", {"k1": {"v": 2}, "k2": {"v": 3}}).result()
+    uploader.set("sensors_catalog/s:a", {"name": "a"}).result()
+    for index in range(20):
+        uploader.update("sensors", {f"n{index}": index}).result()
+
+    assert server.store["sensors/key1"] == {"v": 1}
+    assert server.store["sensors/k2"] == {"v": 3}
+    assert server.store["sensors_catalog/s:a"] == {"name": "a"}
+    # One connection for the sign in and the sequential writes.
+    assert server.connections == 1
+
+
+def test_uploader_limits_requests_in_flight(server, uploader):
+    server.latency = 0.05
+    futures = [uploader.push("sensors", {"v": index}) for index in range(12)]
+    for future in futures:
+        future.result()
+    assert server.max_in_flight == 3
+    assert server.requests == 12
+
+
+def test_uploads_do_not_wait_for_the_token_refresh(server, uploader):
+    uploader.push("sensors", {"v": 1}).result()
+    token = uploader.refresher.token()
+    server.token_delay = 0.5
+    uploader.refresher.invalidate()
+
+    start = time.monotonic()
+    uploader.push("sensors", {"v": 2}).result()
+    assert time.monotonic() - start < 0.4
+
+    deadline = time.monotonic() + 2
+    while uploader.refresher.token() == token and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert uploader.refresher.token() != token
+
+
+def test_uploader_refreshes_refused_tokens(server, uploader):
+    uploader.push("sensors", {"v": 1}).result()
+    server.revoke_tokens()
+
+    with pytest.raises(requests.HTTPError):
+        uploader.push("sensors", {"v": 2}).result()
+    deadline = time.monotonic() + 2
+    while uploader.refresher.refreshes < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert uploader.push("sensors", {"v": 3}).result() == {"name": "key3"}
+
+
+def test_token_is_refreshed_before_it_expires(server):
+    server.expires_in = 1
+    uploader = FirebaseUploader(server.config(), timeout=5)
+    try:
+        uploader.refresher.token(timeout=2)
+        # Refreshed halfway through the lifetime, the margin is longer.
+        time.sleep(1.2)
+        assert uploader.refresher.refreshes >= 2
+    finally:
+        uploader.close()
@@ -0,0 +1,254 @@
+"""
+    Firebase Realtime Database REST client for the monitoring uploads.
+
+    The requests share a session that keeps its connections alive, at most
+    max_in_flight of them run at once on a thread pool and the id token is refreshed
+    on a background thread before it expires, so a write never waits for the
+    authentication, except for the first sign in.
+"""
+import concurrent.futures
+import json
+import threading
+import time
+import typing
+
+import requests
+import requests.adapters
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure.firebase import FirebaseConfiguration
+from nucuhub.logging import get_logger
+
+__all__ = ["FirebaseAuthException", "TokenRefresher", "FirebaseUploader"]
+
+JSON_HEADERS = {"content-type": "application/json; charset=UTF-8"}
+
+
+class FirebaseAuthException(Exception):
+    pass
+
+
+class TokenRefresher:
+    """
+        Signs in with the Firebase user and keeps its id token fresh on a background
+        thread. The token is refreshed margin seconds before it expires, or halfway
+        through its lifetime if that is shorter, and right away after invalidate.
+        Failed refreshes are retried with a growing delay while the current token is
+        still used.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        config: FirebaseConfiguration,
+        margin: float = None,
+        timeout: float = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self._logger = get_logger("FirebaseTokenRefresher")
+        self._session = session
+        self._config = config
+        if margin is None:
+            margin = ApplicationConfig.FIREBASE_TOKEN_REFRESH_MARGIN
+        self.margin = margin
+        self.timeout = timeout or ApplicationConfig.FIREBASE_TIMEOUT
+        self._clock = clock
+        self._token = None
+        self._refresh_token = None
+        self._refresh_at = 0.0
+        self._signed_in = threading.Event()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        # Number of times a token was issued, by signing in or refreshing.
+        self.refreshes = 0
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._refresh_loop, name="FirebaseTokenRefresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def token(self, timeout: float = None) -> str:
+        """
+            Returns the current id token, only waits for the first sign in.
+        :raises: FirebaseAuthException if the user isn't signed in within the timeout.
+        """
+        if not self._signed_in.wait(timeout):
+            raise FirebaseAuthException("Not signed in to Firebase!")
+        return self._token
+
+    def invalidate(self):
+        """
+            Refreshes the token now, e.g. after Firebase refused it.
+        """
+        self._wakeup.set()
+
+    def _post(self, url: str, data: dict) -> dict:
+        response = self._session.post(
+            url,
+            params={"key": self._config.api_key},
+            data=json.dumps(data),
+            headers=JSON_HEADERS,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _issued(self, token: str, refresh_token: str, expires_in):
+        expires_in = int(expires_in)
+        self._token = token
+        self._refresh_token = refresh_token
+        self._refresh_at = self._clock() + max(expires_in - self.margin, expires_in / 2)
+        self.refreshes += 1
+        self._signed_in.set()
+
+    def _sign_in(self):
+        response = self._post(
+            f"{self._config.auth_url}/v1/accounts:signInWithPassword",
+            {
+                "email": self._config.user_email,
+                "password": self._config.user_password,
+                "returnSecureToken": True,
+            },
+        )
+        self._issued(
+            response["idToken"], response["refreshToken"], response["expiresIn"]
+        )
+
+    def refresh(self):
+        """
+            Refreshes the token, or signs in if there is none or it can't be refreshed.
+        """
+        if self._refresh_token is None:
+            self._sign_in()
+            return
+        try:
+            response = self._post(
+                f"{self._config.token_url}/v1/token",
+                {"grant_type": "refresh_token", "refresh_token": self._refresh_token},
+            )
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            # The refresh token was revoked or expired.
+            self._sign_in()
+            return
+        self._issued(
+            response["id_token"], response["refresh_token"], response["expires_in"]
+        )
+
+    def _refresh_loop(self):
+        delay = 0.0
+        failures = 0
+        while not self._stopped.is_set():
+            self._wakeup.wait(delay)
+            if self._stopped.is_set():
+                break
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                failures += 1
+                delay = min(60.0, 2.0 ** failures)
+                self._logger.warning(
+                    f"token refresh failed, retrying in {delay}s: {e!r}"
+                )
+                continue
+            failures = 0
+            delay = max(0.0, self._refresh_at - self._clock())
+
+
+class FirebaseUploader:
+    """
+        Writes to the Realtime Database REST API, the writes return futures.
+
+        At most max_in_flight requests run at once, each on a kept alive connection of
+        the session, a write waits for a free slot before it is submitted.
+    """
+
+    def __init__(
+        self,
+        config: FirebaseConfiguration,
+        max_in_flight: int = None,
+        timeout: float = None,
+        refresher: TokenRefresher = None,
+    ):
+        """
+        :param config: The Firebase configuration.
+        :param max_in_flight: The maximum number of concurrent requests.
+        :param timeout: Seconds a request can take.
+        :param refresher: The token refresher, by default one for the config user.
+        """
+        self.database_url = config.database_url.rstrip("/")
+        self.max_in_flight = max_in_flight or ApplicationConfig.FIREBASE_MAX_IN_FLIGHT
+        self.timeout = timeout or ApplicationConfig.FIREBASE_TIMEOUT
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_in_flight)
+        for scheme in ("http://", "https://"):
+            self.session.mount(scheme, adapter)
+        self.refresher = refresher or TokenRefresher(
+            self.session, config, timeout=self.timeout
+        )
+        self.refresher.start()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="FirebaseUploader"
+        )
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def _request(self, method: str, path: str, data):
+        response = self.session.request(
+            method,
+            f"{self.database_url}/{path}.json",
+            params={"auth": self.refresher.token(timeout=self.timeout)},
+            data=json.dumps(data),
+            headers=JSON_HEADERS,
+            timeout=self.timeout,
+        )
+        if response.status_code == 401:
+            self.refresher.invalidate()
+        response.raise_for_status()
+        return response.json()
+
+    def _submit(self, method: str, path: str, data) -> concurrent.futures.Future:
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._request, method, path, data)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def push(self, path: str, data) -> concurrent.futures.Future:
+        """
+            Adds the data as a new child of the path with a server generated key.
+        :return: The future of the response, {"name": key}.
+        """
+        return self._submit("POST", path, data)
+
+    def set(self, path: str, data) -> concurrent.futures.Future:
+        """
+            Replaces the data at the path.
+        """
+        return self._submit("PUT", path, data)
+
+    def update(self, path: str, updates: dict) -> concurrent.futures.Future:
+        """
+            Updates the children of the path with a single multi-path update.
+        """
+        return self._submit("PATCH", path, updates)
+
+    def close(self):
+        """
+            Waits for the submitted requests and stops the uploader.
+        """
+        self._executor.shutdown(wait=True)
+        self.refresher.stop()
+        self.session.close()
@@ -1,6 +1,12 @@
+import threading
+
 import nucuhub.monitoring.infrastructure as infrastructure
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import transport
+from nucuhub.infrastructure.catalog import CatalogCache
 from nucuhub.logging import get_logger
 from nucuhub.monitoring import ConsumerStage
+from nucuhub.monitoring.sink import FirebaseBatchSink
 
 logger = get_logger("MonitoringWorkflows")
 
@@ -16,6 +22,96 @@ class DebugWorkflow(ConsumerStage):
 class SensorsWorkflow(ConsumerStage):
     name = "SensorsWorkflow"
     firebase_collection = "sensors"
+    firebase_catalog_collection = "sensors_catalog"
+
+    def __init__(self):
+        self.catalog = CatalogCache()
+        # The consumer pool's workers share the stage.
+        self._synced_lock = threading.Lock()
+        self._synced_channels = set()
+        # Writes the readings with multi-path updates instead of a push per reading.
+        self.sink = FirebaseBatchSink(
+            self.firebase_collection, retries=self._sink_retries()
+        )
+
+    @staticmethod
+    def _sink_retries() -> int:
+        """
+            The sink retries failed updates only if their messages aren't delivered
+            again, by the streams transport or a LogQueue.
+        """
+        if transport.use_streams() or ApplicationConfig.MONITORING_LOG_DIR:
+            return 0
+        return ApplicationConfig.MONITORING_FIREBASE_RETRIES
+
+    def _sync_catalog(self, data: list):
+        """
+            Copies the catalog entries of the compact readings to Firebase, once per
+            channel, so the readings stored there can be resolved as well. The entries
+            are submitted as one update without waiting for it, the channels of a failed
+            update are synced again by the next readings.
+        """
+        channels = {
+            entry.get("channel") for entry in data if isinstance(entry, dict)
+        } - {None}
+        with self._synced_lock:
+            channels -= self._synced_channels
+            self._synced_channels |= channels
+        if not channels:
+            return
+        updates = {}
+        for channel in channels:
+            metadata = self.catalog.resolve(channel)
+            if metadata is None:
+                logger.warning(f"SensorsWorkflow unknown sensor channel: {channel}")
+                continue
+            updates[channel] = metadata
+        with self._synced_lock:
+            # Unknown channels are resolved again, they may be registered later.
+            self._synced_channels -= channels - set(updates)
+        if not updates:
+            return
+        try:
+            future = infrastructure.Firebase.instance().update_async(
+                self.firebase_catalog_collection, updates
+            )
+        except Exception as e:
+            self._catalog_synced(updates, error=e)
+            return
+        future.add_done_callback(
+            lambda f: self._catalog_synced(updates, error=f.exception())
+        )
+
+    def _catalog_synced(self, updates: dict, error: Exception = None):
+        if error is None:
+            return
+        logger.error(f"SensorsWorkflow can't sync the catalog: {error!r}")
+        with self._synced_lock:
+            self._synced_channels -= set(updates)
+
+    @staticmethod
+    def _is_sensors_message(message) -> bool:
+        return (
+            message.get("type") == "message"
+            and message.get("channel", "").decode() == "sensors"
+        )
+
+    def process_batch(self, messages: list) -> list:
+        """
+            Adds the readings of all the sensors messages to the sink at once.
+        :return: The sensors messages, like process.
+        """
+        sensors_messages = [m for m in messages if self._is_sensors_message(m)]
+        if not sensors_messages:
+            return []
+        for message in sensors_messages:
+            self._add_readings(message)
+        return sensors_messages
+
+    def _add_readings(self, message):
+        data = infrastructure.Messaging.decode_message_data(message) or []
+        self._sync_catalog(data)
+        self.sink.add(data)
 
     def process(self, message):
         """
@@ -27,9 +123,15 @@ class SensorsWorkflow(ConsumerStage):
         channel = message.get("channel", "").decode()
         stop = False
         if type == "message" and channel == "sensors":
-            data = infrastructure.Messaging.decode_message_data(message)
-            db = infrastructure.Firebase.instance()
-            for data_entry in data:
-                db.save(self.firebase_collection, data_entry)
+            self._add_readings(message)
             stop = True
         return stop
+
+    def flush(self, force: bool = False) -> bool:
+        """
+            Writes the readings in the sink once it's due, see FirebaseBatchSink.
+        """
+        if force or self.sink.due():
+            self.sink.flush()
+            return True
+        return not len(self.sink)
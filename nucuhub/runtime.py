@@ -0,0 +1,66 @@
+import asyncio
+import signal
+import traceback
+import typing
+
+from nucuhub.config import ApplicationConfig
+
+THREADED = "threaded"
+ASYNCIO = "asyncio"
+
+
+def use_asyncio() -> bool:
+    """
+        Checks if the workers should run on the asyncio runtime.
+    :return: True if the asyncio runtime is configured, False for the threaded one.
+    """
+    return ApplicationConfig.RUNTIME == ASYNCIO
+
+
+async def supervise(
+    name: str,
+    coroutine_function: typing.Callable[[], typing.Awaitable],
+    logger,
+    restart_delay: float = 2,
+):
+    """
+        Runs the coroutine and restarts it if it fails. Cancellation is propagated.
+    :param name: The name used when logging.
+    :param coroutine_function: A function returning the coroutine to supervise.
+    :param logger: The logger.
+    :param restart_delay: Seconds to wait before restarting.
+    """
+    while True:
+        try:
+            await coroutine_function()
+            logger.warning(f"{name} returned, restarting it.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            exception_tb = "".join(
+                traceback.TracebackException.from_exception(e).format()
+            )
+            logger.warning(f"restarting {name} because it failed! Err: {exception_tb}")
+        await asyncio.sleep(restart_delay)
+
+
+def run_until_cancelled(
+    coroutine_function: typing.Callable[[], typing.Awaitable], logger
+):
+    """
+        Runs the coroutine on a new event loop until it is cancelled by a signal.
+    :param coroutine_function: A function returning the main coroutine.
+    :param logger: The logger.
+    """
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGTSTP):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await coroutine_function()
+        except asyncio.CancelledError:
+            logger.info("Shut down, all tasks were cancelled.")
+
+    asyncio.run(main())
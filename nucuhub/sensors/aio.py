@@ -0,0 +1,96 @@
+import asyncio
+
+from nucuhub import runtime
+from nucuhub.config import ApplicationConfig
+from nucuhub.sensors import infrastructure
+from nucuhub.sensors.main import SensorsWorker
+from nucuhub.sensors.reader import AsyncConcurrentReader
+from nucuhub.sensors.types import SensorModule
+
+
+class AsyncSensorsWorker(SensorsWorker):
+    """
+        Sensors worker running on an asyncio event loop.
+
+        The command loop waits on the async redis pub/sub connection, the reading loop
+        sleeps until the next deadline and the blocking sensor drivers run on the
+        reader's thread pool. The worker is shut down by cancelling its tasks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reading_loop_wakeup = None
+        self._loop = None
+
+    def _create_message_broker(self):
+        return infrastructure.AsyncMessaging()
+
+    def _create_reader(self):
+        return AsyncConcurrentReader(ApplicationConfig.SENSORS_READ_WORKERS)
+
+    async def _command_loop(self):
+        """
+            Waits for sensor commands and runs them, see SensorsWorker._command_loop.
+            The commands run on a thread: they may import a sensor module, see
+            _load_sensor_lazily, and write the sensor config to redis.
+        """
+        while True:
+            message = await self.message_broker.get_command()
+            self.logger.debug(f"got cmd message: {message}")
+            if message:
+                await self._loop.run_in_executor(None, self._handle_command, message)
+
+    def _wake_reading_loop(self):
+        # Probes and commands finish on other threads, asyncio.Event isn't thread safe.
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._reading_loop_wakeup.set)
+
+    async def _wait_for_next_deadline(self):
+        timeout = self.scheduler.time_until_next()
+        if timeout is None:
+            timeout = self.sleep_time
+        try:
+            await asyncio.wait_for(self._reading_loop_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._reading_loop_wakeup.clear()
+
+    async def _reading_loop(self):
+        """
+            Reads the sensors that are due and publishes their data.
+        """
+        while True:
+            sensors = self._due_sensors()
+            result = await self.reader.read(sensors)
+            self._record_reads(sensors, result)
+            all_data = self._prepare_data(result)
+            if all_data:
+                await self.message_broker.publish(all_data)
+            await self._wait_for_next_deadline()
+
+    async def run(self):
+        """
+            Runs the worker until it is cancelled.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._reading_loop_wakeup = asyncio.Event()
+        await self._loop.run_in_executor(None, self._load_modules)
+        await self.message_broker.subscribe()
+        try:
+            await asyncio.gather(
+                runtime.supervise("reading_loop", self._reading_loop, self.logger),
+                runtime.supervise("command_loop", self._command_loop, self.logger),
+            )
+        finally:
+            self.logger.info("Shutting down...")
+            busy = await self._loop.run_in_executor(None, self._stop_executors)
+            self._close_sensors(busy)
+            SensorModule.config_store().close()
+            await self.message_broker.close()
+
+    def loop_forever(self) -> None:
+        """
+            Looping forever on the asyncio runtime.
+        """
+        self.logger.info("Looping forever on asyncio!")
+        runtime.run_until_cancelled(self.run, self.logger)
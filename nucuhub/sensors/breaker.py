@@ -0,0 +1,115 @@
+import enum
+import random
+import threading
+import time
+import typing
+
+from nucuhub.config import ApplicationConfig
+
+
+class BreakerState(enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+        Stops reading a sensor after consecutive failures.
+
+        The breaker is closed while the sensor works. It opens after failure_threshold
+        consecutive failures and the sensor isn't read until the retry delay passed, the
+        delay doubles every time the breaker opens again, up to max_delay, and it is
+        randomized by jitter so sensors on the same bus don't retry at the same time.
+        Once the delay passed the breaker is half-open: a single probe read decides if it
+        closes or opens again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = None,
+        base_delay: float = None,
+        max_delay: float = None,
+        jitter: float = 0.5,
+        clock: typing.Callable[[], float] = time.monotonic,
+        rand: typing.Callable[[], float] = random.random,
+    ):
+        """
+        :param failure_threshold: Consecutive failures that open the breaker.
+        :param base_delay: Seconds until the first retry.
+        :param max_delay: Maximum seconds between two retries.
+        :param jitter: Fraction of the delay that is randomized.
+        """
+        if failure_threshold is None:
+            failure_threshold = ApplicationConfig.SENSORS_BREAKER_FAILURES
+        if base_delay is None:
+            base_delay = ApplicationConfig.SENSORS_BREAKER_BASE_DELAY
+        if max_delay is None:
+            max_delay = ApplicationConfig.SENSORS_BREAKER_MAX_DELAY
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._clock = clock
+        self._rand = rand
+        self._lock = threading.Lock()
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        # Number of times the breaker opened since it was closed.
+        self.trips = 0
+        self._retry_at = 0.0
+
+    def backoff(self, trips: int) -> float:
+        """
+            Computes the retry delay after the breaker opened trips times.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (trips - 1))
+        return delay * (1 - self.jitter * self._rand())
+
+    def _open(self):
+        self.trips += 1
+        self.state = BreakerState.OPEN
+        self._retry_at = self._clock() + self.backoff(self.trips)
+
+    def allow(self) -> bool:
+        """
+            Checks if the sensor can be read, an open breaker whose retry delay passed
+            becomes half-open and allows the probe read.
+        """
+        with self._lock:
+            if self.state is BreakerState.CLOSED:
+                return True
+            if self.state is BreakerState.OPEN and self._clock() >= self._retry_at:
+                self.state = BreakerState.HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """
+            Returns the seconds until an open breaker allows the probe read.
+        """
+        with self._lock:
+            return max(0.0, self._retry_at - self._clock())
+
+    def record_success(self):
+        with self._lock:
+            self.state = BreakerState.CLOSED
+            self.failures = 0
+            self.trips = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (
+                self.state is BreakerState.HALF_OPEN
+                or self.failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def trip(self):
+        """
+            Opens the breaker right away, e.g. when the sensor can't be set up.
+        """
+        with self._lock:
+            self.failures += 1
+            self._open()
@@ -0,0 +1,137 @@
+import json
+import time
+import typing
+from dataclasses import dataclass
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure.catalog import channel_key
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.logging import get_logger
+
+logger = get_logger("SensorsFilters")
+
+
+@dataclass
+class Deadband:
+    # A reading is published if it changed by more than absolute units or by more than
+    # the relative fraction of the last published value, whichever is larger.
+    absolute: float = 0
+    relative: float = 0
+    # Maximum seconds between two published readings, None for the configured default.
+    heartbeat: typing.Optional[float] = None
+
+    def threshold(self, last_value: float) -> float:
+        return max(self.absolute, self.relative * abs(last_value))
+
+
+class DeadbandFilter:
+    """
+        Holds back the readings of a channel that didn't change by more than the channel's
+        deadband since the last published reading. A reading is published anyway once
+        heartbeat seconds passed since the last published one, so consumers can tell a
+        steady signal from a dead sensor.
+
+        Channels without a deadband aren't filtered. Non numeric values are published
+        when they change.
+    """
+
+    def __init__(
+        self,
+        overrides: typing.Dict[str, Deadband] = None,
+        default_heartbeat: float = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param overrides: Deadbands by channel key that take precedence over the ones
+                          configured by the sensors, by default read from
+                          ApplicationConfig.SENSORS_DEADBANDS.
+        :param default_heartbeat: The heartbeat of deadbands that don't have one.
+        """
+        if overrides is None:
+            overrides = self.parse_overrides(ApplicationConfig.SENSORS_DEADBANDS)
+        if default_heartbeat is None:
+            default_heartbeat = ApplicationConfig.SENSORS_DEADBAND_HEARTBEAT
+        self._overrides = overrides
+        self._deadbands = {}
+        self._default_heartbeat = default_heartbeat
+        self._clock = clock
+        # Maps channel keys to the (value, time) of their last published reading.
+        self._last_published = {}
+        self.published = 0
+        self.held = 0
+
+    @staticmethod
+    def parse_overrides(value: str) -> typing.Dict[str, Deadband]:
+        """
+            Parses deadbands from JSON, e.g. {"cpu_temperature_sensor:thermal_zone0": {"absolute": 0.5}}.
+        """
+        if not value:
+            return {}
+        try:
+            return {
+                channel: Deadband(**deadband)
+                for channel, deadband in json.loads(value).items()
+            }
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"invalid deadbands config, ignoring it: {e}")
+            return {}
+
+    def configure(self, channel: str, deadband: Deadband):
+        """
+            Sets the deadband of a channel, unless it is overridden by the config.
+        :param channel: The channel key.
+        """
+        self._deadbands[channel] = deadband
+
+    def deadband(self, channel: str) -> typing.Optional[Deadband]:
+        return self._overrides.get(channel) or self._deadbands.get(channel)
+
+    def _should_publish(self, channel: str, value, now: float) -> bool:
+        deadband = self.deadband(channel)
+        if deadband is None:
+            return True
+        last = self._last_published.get(channel)
+        if last is None:
+            return True
+        last_value, last_time = last
+        heartbeat = deadband.heartbeat
+        if heartbeat is None:
+            heartbeat = self._default_heartbeat
+        if now - last_time >= heartbeat:
+            return True
+        numbers = (int, float)
+        if (
+            isinstance(value, numbers)
+            and isinstance(last_value, numbers)
+            and not isinstance(value, bool)
+            and not isinstance(last_value, bool)
+        ):
+            return abs(value - last_value) > deadband.threshold(last_value)
+        return value != last_value
+
+    def filter(self, batch: MeasurementBatch) -> MeasurementBatch:
+        """
+            Filters a batch.
+        :return: A new batch with the readings that should be published.
+        """
+        now = self._clock()
+        filtered = MeasurementBatch()
+        for index, (sensor_id, name, timestamp, value) in enumerate(
+            zip(batch.sensor_ids, batch.names, batch.timestamps, batch.values)
+        ):
+            channel = channel_key(sensor_id, name)
+            if self._should_publish(channel, value, now):
+                self._last_published[channel] = (value, now)
+                filtered.append(
+                    sensor_id,
+                    name,
+                    timestamp,
+                    value,
+                    aggregates=batch.aggregates.get(index),
+                )
+                self.published += 1
+            else:
+                self.held += 1
+        for key, description in batch.descriptions.items():
+            filtered.descriptions.setdefault(key, description)
+        return filtered
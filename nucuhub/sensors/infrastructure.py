@@ -1,7 +1,14 @@
+import atexit
 import json
+import threading
+import time
 
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import codecs, transport
+from nucuhub.infrastructure.measurements import MeasurementBatch
 from nucuhub.infrastructure.redis import RedisService
 from nucuhub.logging import get_logger
+from redis.exceptions import RedisError
 
 logger = get_logger("sensors.infrastructure")
 
@@ -20,23 +27,40 @@ class Messaging(RedisBackend):
         self._pubsub.subscribe("sensors_cmd")
         self.logger = get_logger("SensorsMessaging")
 
+    @staticmethod
+    def encode(data):
+        """
+            Serializes the data published on the sensors topic.
+        :param data: A MeasurementBatch, encoded with the configured codec, or JSON
+                     serializable data.
+        """
+        if isinstance(data, MeasurementBatch):
+            return codecs.encode(data)
+        return json.dumps(data)
+
     def publish(self, data):
         """
-            Publishes data to the sensors topic on Redis.
+            Publishes data to the sensors topic on Redis, through pub/sub or as an entry
+            of the sensors stream, see ApplicationConfig.MESSAGING_TRANSPORT.
         """
         redis = self.client.get_redis()
         logger.debug(data)
-        redis.publish("sensors", json.dumps(data))
+        payload = self.encode(data)
+        if transport.use_streams():
+            redis.xadd("sensors", **transport.stream_add_arguments(payload))
+        else:
+            redis.publish("sensors", payload)
 
-    def get_command(self):
+    def get_command(self, timeout=1):
         """
             Retrieves a sensor command.
+        :param timeout: Seconds to wait for a command.
         :return:  The message data as a python dict.
         """
         return_value = None
         try:
             message = self._pubsub.get_message(
-                ignore_subscribe_messages=True, timeout=1
+                ignore_subscribe_messages=True, timeout=timeout
             )
             if message:
                 return_value = json.loads(message.get("data"))
@@ -45,6 +69,73 @@ class Messaging(RedisBackend):
             return_value = None
         return return_value
 
+    def get_commands(self, timeout=1):
+        """
+            Waits for a sensor command and drains the commands that are already queued.
+        :param timeout: Seconds to wait for the first command.
+        :return: A list of commands, empty if none arrived.
+        """
+        commands = []
+        deadline = time.monotonic() + timeout
+        while True:
+            # Subscribe and malformed messages are returned as None, keep waiting.
+            remaining = 0 if commands else max(0.0, deadline - time.monotonic())
+            command = self.get_command(timeout=remaining)
+            if command:
+                commands.append(command)
+            elif commands or remaining == 0:
+                return commands
+
+
+class AsyncMessaging(RedisBackend):
+    """
+        Messaging for the asyncio runtime, it uses the asyncio redis client.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._redis = self.client.get_async_redis()
+        self._pubsub = self._redis.pubsub()
+        self._messages = self._pubsub.listen()
+        self.logger = get_logger("SensorsAsyncMessaging")
+
+    async def subscribe(self):
+        """
+            Subscribes to the sensors commands topic.
+        """
+        await self._pubsub.subscribe("sensors_cmd")
+
+    async def publish(self, data):
+        """
+            Publishes data to the sensors topic on Redis, see Messaging.publish.
+        """
+        logger.debug(data)
+        payload = Messaging.encode(data)
+        if transport.use_streams():
+            await self._redis.xadd("sensors", **transport.stream_add_arguments(payload))
+        else:
+            await self._redis.publish("sensors", payload)
+
+    async def get_command(self):
+        """
+            Waits for a sensor command.
+        :return:  The message data as a python dict.
+        """
+        async for message in self._messages:
+            if message.get("type") != "message":
+                continue
+            try:
+                return json.loads(message.get("data"))
+            except (TypeError, ValueError) as e:
+                self.logger.debug(f"error in get_command: {e}")
+        return None
+
+    async def close(self):
+        """
+            Closes the pub/sub connection.
+        """
+        await self._pubsub.close()
+
 
 class Database(RedisBackend):
     def save_config(self, name, data):
@@ -68,3 +159,138 @@ class Database(RedisBackend):
         if data:
             return_val = json.loads(data.decode())
         return return_val
+
+
+class ConfigStore(Database):
+    """
+        Write-behind store for the sensor configs.
+
+        The configs are kept in one redis hash and cached in memory. preload() loads all
+        of them with a single HGETALL, save_config() only updates the cache and the
+        changed configs are written together with one HSET by a background thread every
+        flush_interval seconds, so a sensor flapping between states costs one write per
+        interval. close() writes the configs that are left.
+
+        Configs saved by Database, one key per sensor, are still loaded and moved to the hash.
+    """
+
+    KEY = "sensors_config"
+
+    def __init__(self, flush_interval: float = None):
+        super().__init__()
+        if flush_interval is None:
+            flush_interval = ApplicationConfig.SENSORS_CONFIG_FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self._configs = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_wakeup = threading.Event()
+        self._closed = False
+        self.logger = get_logger("SensorsConfigStore")
+
+    def preload(self):
+        """
+            Loads all the configs in the cache with a single round trip.
+        """
+        redis = self.client.get_redis()
+        configs = redis.hgetall(self.KEY)
+        with self._lock:
+            for name, data in configs.items():
+                name = name.decode()
+                # Configs saved before the preload are newer.
+                if name not in self._dirty:
+                    self._configs[name] = json.loads(data)
+        self.logger.debug(f"preloaded {len(configs)} sensor configs")
+
+    def load_config(self, name):
+        """
+            Loads the config from the cache, or from the database if it isn't cached.
+        :param name: The key name, usually sensor id.
+        :return: Returns the configuration data as a python dict if it exists, otherwise none.
+        """
+        with self._lock:
+            if name in self._configs:
+                config = self._configs[name]
+                return dict(config) if config is not None else None
+
+        redis = self.client.get_redis()
+        data = redis.hget(self.KEY, name)
+        config = json.loads(data) if data else super().load_config(name)
+        with self._lock:
+            self._configs.setdefault(name, config)
+            if config is not None and not data:
+                # Move the config saved with Database to the hash.
+                self._dirty.add(name)
+            config = self._configs[name]
+        return dict(config) if config is not None else None
+
+    def save_config(self, name, data):
+        """
+            Saves the sensor config in the cache, it is written to the database by the
+            background flusher or when the store is closed.
+        :param name: The key name, usually sensor id.
+        :param data: The configuration data.
+        """
+        with self._lock:
+            self._configs[name] = dict(data)
+            self._dirty.add(name)
+            closed = self._closed
+            if not closed:
+                self._start_flusher()
+        if closed:
+            self.flush()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="SensorsConfigFlusher", daemon=True
+            )
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._flusher_wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except RedisError as e:
+                self.logger.warning(f"can't flush sensor configs, will retry: {e}")
+
+    def flush(self) -> int:
+        """
+            Writes the configs changed since the last flush to the database.
+        :return: The number of configs written.
+        :raises: RedisError if the write failed, the configs are written on the next flush.
+        """
+        with self._lock:
+            names, self._dirty = self._dirty, set()
+            mapping = {name: json.dumps(self._configs[name]) for name in names}
+        if not mapping:
+            return 0
+        try:
+            self.client.get_redis().hset(self.KEY, mapping=mapping)
+        except RedisError:
+            with self._lock:
+                self._dirty.update(names)
+            raise
+        return len(mapping)
+
+    def close(self):
+        """
+            Stops the background flusher and writes the configs that are left.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._flusher_wakeup.set()
+        if (
+            self._flusher is not None
+            and self._flusher is not threading.current_thread()
+        ):
+            self._flusher.join(timeout=self.flush_interval + 1)
+        try:
+            self.flush()
+        except RedisError as e:
+            self.logger.error(f"can't flush sensor configs on close: {e}")
@@ -1,55 +1,411 @@
 import concurrent.futures
-import importlib
-import pathlib
-import pkgutil
+import functools
 import signal
+import threading
 import time
 import traceback
 import typing
 
+from nucuhub import runtime
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure.catalog import SensorCatalog, channel_key
+from nucuhub.infrastructure.measurements import MeasurementBatch
 from nucuhub.logging import get_logger
 from nucuhub.sensors import infrastructure
-from nucuhub.sensors.types import SensorModule
+from nucuhub.sensors.breaker import BreakerState, CircuitBreaker
+from nucuhub.sensors.filters import DeadbandFilter
+from nucuhub.sensors.manifest import ManifestEntry, SensorManifest
+from nucuhub.sensors.reader import ConcurrentReader, stop_executor
+from nucuhub.sensors.scheduler import DeadlineScheduler
+from nucuhub.sensors.synthetic import SyntheticFarm
+from nucuhub.sensors.types import SensorModule, SensorState
 
 
 class SensorsWorker:
     def __init__(self):
-        self.message_broker = infrastructure.Messaging()
+        self.message_broker = self._create_message_broker()
         self.logger = get_logger("SensorWorker")
         self.sleep_time = 10
 
         self._reading_loop_should_run = True
         self._command_loop_should_run = True
         self._worker_loop_should_run = True
+        self._reading_loop_wakeup = threading.Event()
 
-        self.sensor_modules = self._import_sensor_modules()
+        self.scheduler = DeadlineScheduler()
+        self.reader = self._create_reader()
+        self.manifest = SensorManifest().load()
+        # Imported by _load_modules, only the modules of the enabled sensors are imported.
+        self.sensor_modules: typing.Optional[
+            typing.List[typing.Type[SensorModule]]
+        ] = None
         self.loaded_sensor_modules = []
+        self.sensors_by_id = {}
+        self.catalog = SensorCatalog()
+        # Maps the channel keys written to the catalog to their metadata.
+        self._registered_channels: typing.Dict[str, dict] = {}
+        self.deadband_filter = DeadbandFilter()
+        # Failing sensors aren't read until a probe read succeeds, see _due_sensors.
+        self.breakers: typing.Dict[str, CircuitBreaker] = {}
+        # Sensors are read once their probe finished, see _probe_sensors.
+        self._ready_sensors = set()
+        self._probe_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=ApplicationConfig.SENSORS_PROBE_WORKERS,
+            thread_name_prefix="SensorsProbe",
+        )
+        # Maps the probes running on the executor to their sensor ids, see shutdown.
+        self._probe_futures = {}
+        # The last recovery probe of every sensor, see _start_recovery.
+        self._recoveries: typing.Dict[str, concurrent.futures.Future] = {}
+        self._recovery_lock = threading.Lock()
+
+    def _create_message_broker(self):
+        return infrastructure.Messaging()
+
+    def _create_reader(self):
+        return ConcurrentReader(ApplicationConfig.SENSORS_READ_WORKERS)
+
+    def _is_enabled(self, entry: ManifestEntry) -> bool:
+        """
+            Checks if a sensor is enabled, by its saved config or by its default one.
+        """
+        config = SensorModule.config_store().load_config(entry.sensor_id)
+        if config is not None and "enabled" in config:
+            return config["enabled"]
+        # Sensors whose default can't be known without importing them are imported.
+        return entry.enabled is not False
+
+    def _import_sensor_module(
+        self, entry: ManifestEntry
+    ) -> typing.Optional[typing.Type[SensorModule]]:
+        """
+            Imports the module of a sensor.
+        :return: The sensor class or None if the module can't be imported.
+        """
+        try:
+            return entry.load_class()
+        except (ImportError, AttributeError) as e:
+            self.logger.error(f"can't import sensor {entry.sensor_id}: {e}")
+            return None
 
     def _import_sensor_modules(self) -> typing.List[typing.Type[SensorModule]]:
         """
-            Imports all sensor modules.
+            Imports the modules of the enabled sensors, see SensorManifest.
         """
         sensor_modules = []
-        module_path = pathlib.Path(__file__).parent / "modules"
-        for (_, submodule_name, _) in pkgutil.iter_modules([module_path]):
-            module = importlib.import_module(
-                f".modules.{submodule_name}", package="nucuhub.sensors"
-            )
-            for mod in dir(module):
-                if mod.startswith("_") or mod == "SensorModule":
-                    continue
-                try:
-                    sensor_module = getattr(module, mod)
-                    if issubclass(sensor_module, SensorModule):
-                        sensor_modules.append(sensor_module)
-                except TypeError:
-                    pass
+        for entry in self.manifest.values():
+            if not self._is_enabled(entry):
+                self.logger.info(
+                    f"sensor {entry.sensor_id} is disabled, not loading it."
+                )
+                continue
+            sensor_module = self._import_sensor_module(entry)
+            if sensor_module is not None:
+                sensor_modules.append(sensor_module)
+        farm = SyntheticFarm.from_config()
+        if farm is not None:
+            self.logger.info(f"loading the synthetic farm {farm.spec}")
+            sensor_modules.extend(farm.sensor_factories())
         self.logger.debug(f"Loaded the following sensor modules: {sensor_modules}")
         return sensor_modules
 
     def _load_modules(self):
-        for m in self.sensor_modules:
-            self.loaded_sensor_modules.append(m())
+        """
+            Instantiates the sensors and starts probing them in the background.
+        """
+        SensorModule.config_store().preload()
+        if self.sensor_modules is None:
+            self.sensor_modules = self._import_sensor_modules()
+        sensors = [self._load_sensor(m) for m in self.sensor_modules]
+        self._start_probes(sensors)
+
+    def _start_probes(self, sensors: typing.List[SensorModule]):
+        if sensors:
+            threading.Thread(
+                target=self._probe_sensors,
+                args=(sensors,),
+                name="SensorsProbeWatchdog",
+                daemon=True,
+            ).start()
+
+    def _probe_sensors(self, sensors: typing.List[SensorModule]):
+        """
+            Probes the sensors concurrently. Every sensor is read as soon as its probe
+            finished; the sensors whose probe takes longer than their probe_timeout are
+            set in the ERROR state and are read if the probe finishes later.
+        """
+        deadlines = {}
+        now = time.monotonic()
+        for sensor in sensors:
+            future = self._submit_probe(sensor.probe, sensor)
+            future.add_done_callback(functools.partial(self._on_probe_done, sensor))
+            deadlines[future] = (now + sensor.probe_timeout, sensor)
+        self._watch_probes(deadlines, self._on_probe_timeout)
+
+    def _watch_probes(self, deadlines: dict, on_timeout):
+        """
+            Waits for the probes until their deadlines.
+        :param deadlines: A dict mapping the probe futures to (deadline, sensor) tuples.
+        :param on_timeout: Called with the sensors whose probe didn't finish in time.
+        """
+        pending = set(deadlines)
+        while pending:
+            next_deadline = min(deadlines[future][0] for future in pending)
+            _, pending = concurrent.futures.wait(
+                pending,
+                timeout=max(0.0, next_deadline - time.monotonic()),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            now = time.monotonic()
+            for future in list(pending):
+                deadline, sensor = deadlines[future]
+                if deadline <= now:
+                    pending.discard(future)
+                    on_timeout(sensor)
+
+    def _on_probe_timeout(self, sensor: SensorModule):
+        self.logger.error(
+            f"sensor {sensor.id} didn't finish probing in {sensor.probe_timeout}s."
+        )
+        sensor.set_state(SensorState.ERROR)
+
+    def _submit_probe(self, fn, sensor: SensorModule) -> concurrent.futures.Future:
+        future = self._probe_executor.submit(fn)
+        self._probe_futures[future] = sensor.id
+        future.add_done_callback(lambda done: self._probe_futures.pop(done, None))
+        return future
+
+    def _on_probe_done(self, sensor: SensorModule, future: concurrent.futures.Future):
+        """
+            Makes the sensor ready to be read once its probe finished.
+        """
+        error = future.exception()
+        if error is not None:
+            self.logger.error(f"sensor {sensor.id} probe failed: {error}")
+            self._breaker(sensor).trip()
+            self._on_breaker_open(sensor)
+            return
+        if sensor.id in self._ready_sensors:
+            return
+        if sensor.state == SensorState.ERROR.value:
+            # The probe finished after its timeout.
+            self.logger.info(f"sensor {sensor.id} finished probing late.")
+            sensor.set_state(SensorState.OK)
+        self._make_ready(sensor)
+
+    def _make_ready(self, sensor: SensorModule):
+        """
+            Starts reading a sensor that was probed successfully.
+        """
+        self._ready_sensors.add(sensor.id)
+        # Probing may have discovered the channels of the sensor.
+        self._register_sensor_channels(sensor)
+        sensor.start_sampling()
+        self.scheduler.add(
+            sensor, delay=sensor.sampling_interval if sensor.sample_rate else 0
+        )
+        self._wake_reading_loop()
+
+    def _breaker(self, sensor: SensorModule) -> CircuitBreaker:
+        breaker = self.breakers.get(sensor.id)
+        if breaker is None:
+            # The breakers are used by the reading, probe and callback threads.
+            breaker = self.breakers.setdefault(sensor.id, CircuitBreaker())
+        return breaker
+
+    def _on_breaker_open(self, sensor: SensorModule):
+        """
+            Stops reading a failed sensor until its breaker allows a probe read.
+        """
+        retry_in = self._breaker(sensor).retry_in()
+        self.logger.warning(
+            f"sensor {sensor.id} is failing, probing it again in {retry_in:.1f}s."
+        )
+        sensor.set_state(SensorState.ERROR)
+        sensor.stop_sampling()
+        self.scheduler.add(sensor, delay=retry_in)
+
+    def _start_recovery(self, sensor: SensorModule):
+        """
+            Probes a failed sensor again in the background, see _on_recovery_done. A
+            probe that doesn't finish in the sensor's probe_timeout opens the breaker
+            again, see _on_recovery_timeout.
+        """
+        self.scheduler.remove(sensor.id)
+        previous = self._recoveries.get(sensor.id)
+        if previous is not None and not previous.done():
+            # The last probe still hangs, another one would wait on the same device.
+            self._on_recovery_timeout(sensor)
+            return
+        future = self._submit_probe(functools.partial(self._probe_read, sensor), sensor)
+        self._recoveries[sensor.id] = future
+        future.add_done_callback(functools.partial(self._on_recovery_done, sensor))
+        threading.Thread(
+            target=self._watch_probes,
+            args=(
+                {future: (time.monotonic() + sensor.probe_timeout, sensor)},
+                self._on_recovery_timeout,
+            ),
+            name="SensorsRecoveryWatchdog",
+            daemon=True,
+        ).start()
+
+    def _on_recovery_timeout(self, sensor: SensorModule):
+        """
+            Opens the breaker of a sensor whose probe read didn't finish in time.
+        """
+        with self._recovery_lock:
+            if self._breaker(sensor).state is not BreakerState.HALF_OPEN:
+                # The probe read finished in the meantime.
+                return
+            self.logger.error(
+                f"sensor {sensor.id} probe read didn't finish in {sensor.probe_timeout}s."
+            )
+            self._breaker(sensor).record_failure()
+            self._on_breaker_open(sensor)
+
+    @staticmethod
+    def _probe_read(sensor: SensorModule):
+        """
+            Sets the sensor up again and reads it once, the data is discarded.
+        """
+        sensor.probe()
+        if sensor.sample_rate:
+            sensor.sample()
+        else:
+            sensor.read_into(MeasurementBatch())
+
+    def _on_recovery_done(
+        self, sensor: SensorModule, future: concurrent.futures.Future
+    ):
+        """
+            Closes the breaker of the sensor if the probe read succeeded or opens it again.
+        """
+        breaker = self._breaker(sensor)
+        error = future.exception()
+        with self._recovery_lock:
+            if error is None:
+                # A probe read that finished after its timeout still closes the breaker.
+                self.logger.info(f"sensor {sensor.id} recovered.")
+                breaker.record_success()
+                sensor.set_state(SensorState.OK)
+                self._make_ready(sensor)
+                return
+            self.logger.warning(f"sensor {sensor.id} probe read failed: {error}")
+            if breaker.state is not BreakerState.HALF_OPEN:
+                # It timed out, the breaker was already opened again.
+                return
+            breaker.record_failure()
+            self._on_breaker_open(sensor)
+
+    def _record_reads(self, sensors: typing.List[SensorModule], result):
+        """
+            Records the outcome of the reads in the breakers of the sensors.
+        :param result: The ReadResult.
+        """
+        missed = set(result.missed)
+        for sensor in sensors:
+            breaker = self._breaker(sensor)
+            if sensor.id not in missed:
+                breaker.record_success()
+                continue
+            breaker.record_failure()
+            if breaker.state is BreakerState.OPEN:
+                self._on_breaker_open(sensor)
+
+    def _stop_executors(self) -> typing.Set[str]:
+        """
+            Stops the reads and the probes, waiting up to SENSORS_SHUTDOWN_TIMEOUT
+            seconds for the ones in flight.
+        :return: The ids of the sensors that are still being read or probed.
+        """
+        deadline = time.monotonic() + ApplicationConfig.SENSORS_SHUTDOWN_TIMEOUT
+        busy = self.reader.shutdown(timeout=ApplicationConfig.SENSORS_SHUTDOWN_TIMEOUT)
+        busy |= stop_executor(
+            self._probe_executor,
+            self._probe_futures,
+            timeout=max(0.0, deadline - time.monotonic()),
+        )
+        return busy
+
+    def _close_sensors(self, busy: typing.Collection[str] = ()):
+        """
+            Closes the sensors, except the busy ones: their reads or probes may still
+            use the resources, e.g. the open files of a sysfs sensor.
+        """
+        for sensor in self.loaded_sensor_modules:
+            if sensor.id in busy:
+                self.logger.warning(
+                    f"sensor {sensor.id} is still busy, not closing it."
+                )
+                continue
+            sensor.close()
+
+    def _load_sensor(
+        self, sensor_module: typing.Callable[[], SensorModule]
+    ) -> SensorModule:
+        """
+            Instantiates a sensor, schedules it and registers its channels. The sensor
+            isn't read before it is probed.
+        :param sensor_module: The sensor class or a factory, e.g. of a synthetic sensor.
+        """
+        sensor = sensor_module()
+        self.loaded_sensor_modules.append(sensor)
+        self.sensors_by_id[sensor.id] = sensor
+        self.scheduler.add(sensor)
+        self._register_sensor_channels(sensor)
+        return sensor
+
+    def _register_sensor_channels(self, sensor: SensorModule):
+        """
+            Configures the deadbands of the sensor's channels and registers them.
+        """
+        for name, deadband in sensor.deadbands.items():
+            self.deadband_filter.configure(channel_key(sensor.id, name), deadband)
+        self._register_channels(
+            {
+                channel_key(sensor.id, name): {
+                    "sensor_id": sensor.id,
+                    "name": name,
+                    "description": description,
+                }
+                for name, description in sensor.channels.items()
+            },
+            update=True,
+        )
+
+    def _load_sensor_lazily(self, sensor_id: str) -> typing.Optional[SensorModule]:
+        """
+            Loads a sensor that wasn't loaded at startup because it was disabled.
+        :return: The sensor or None if there's no such sensor.
+        """
+        entry = self.manifest.get(sensor_id)
+        if entry is None:
+            return None
+        sensor_module = self._import_sensor_module(entry)
+        if sensor_module is None:
+            return None
+        self.logger.info(f"loading sensor {sensor_id}.")
+        sensor = self._load_sensor(sensor_module)
+        self._start_probes([sensor])
+        return sensor
+
+    def _register_channels(self, entries: typing.Dict[str, dict], update: bool = False):
+        """
+            Writes the channels that weren't registered yet to the SensorCatalog.
+        :param entries: A dict mapping channel keys to their metadata.
+        :param update: Also writes the registered channels whose metadata changed, e.g.
+            when a sensor was probed again.
+        """
+        new_entries = {
+            channel: meta
+            for channel, meta in entries.items()
+            if channel not in self._registered_channels
+            or (update and self._registered_channels[channel] != meta)
+        }
+        if new_entries:
+            self.catalog.register(new_entries)
+            self._registered_channels.update(new_entries)
 
     def _command_loop(self):
         """
@@ -61,35 +417,90 @@ class SensorsWorker:
             }
         """
         while self._command_loop_should_run:
-            message = self.message_broker.get_command()
-            self.logger.debug(f"pooling for cmd message, got: {message}")
-            if message:
-                sensor_id = message.get("sensor_id")
-                action = message.get("action")
-                if action not in ("enable", "disable"):
-                    continue
-                for sensor in self.loaded_sensor_modules:
-                    if sensor.id == sensor_id:
-                        getattr(sensor, action)()
-                        self.logger.info(
-                            f"ran the action '{action}' on sensor: {sensor_id}."
-                        )
-                        break
-            time.sleep(self.sleep_time)
+            messages = self.message_broker.get_commands(timeout=self.sleep_time)
+            self.logger.debug(f"pooling for cmd messages, got: {messages}")
+            for message in messages:
+                self._handle_command(message)
+
+    def _handle_command(self, message: dict):
+        """
+            Runs a sensor command.
+        :param message: The command, see _command_loop.
+        """
+        sensor_id = message.get("sensor_id")
+        action = message.get("action")
+        if action not in ("enable", "disable"):
+            return
+        sensor = self.sensors_by_id.get(sensor_id)
+        if sensor is None and action == "enable":
+            sensor = self._load_sensor_lazily(sensor_id)
+        if sensor is None:
+            return
+        getattr(sensor, action)()
+        self.logger.info(f"ran the action '{action}' on sensor: {sensor_id}.")
+        if action == "enable":
+            # Read the sensor right away instead of waiting for its next deadline.
+            self.scheduler.add(sensor)
+            self._wake_reading_loop()
+
+    def _wake_reading_loop(self):
+        """
+            Wakes the reading loop up so it picks up the sensors that became due.
+        """
+        self._reading_loop_wakeup.set()
+
+    def _due_sensors(self) -> typing.List[SensorModule]:
+        """
+            Pops the enabled and probed sensors that are due for a read. Failed sensors
+            whose breaker allows it are probed again instead.
+        """
+        due = []
+        for sensor in self.scheduler.pop_due():
+            if not sensor.is_enabled:
+                continue
+            breaker = self._breaker(sensor)
+            if breaker.state is BreakerState.CLOSED:
+                if sensor.id in self._ready_sensors:
+                    due.append(sensor)
+            elif breaker.allow():
+                self._start_recovery(sensor)
+            elif breaker.state is BreakerState.OPEN:
+                self.scheduler.add(sensor, delay=breaker.retry_in())
+        return due
+
+    def _prepare_data(self, result) -> MeasurementBatch:
+        """
+            Prepares the measurements of a read for publishing.
+        :param result: The ReadResult.
+        """
+        # Sensors can output channels they didn't declare, e.g. discovered at runtime.
+        self._register_channels(result.batch.catalog_entries())
+        if ApplicationConfig.SENSORS_DEADBAND_FILTER:
+            return self.deadband_filter.filter(result.batch)
+        return result.batch
+
+    def _wait_for_next_deadline(self):
+        """
+            Sleeps until the next sensor is due or until the reading loop is woken up.
+        """
+        timeout = self.scheduler.time_until_next()
+        if timeout is None:
+            timeout = self.sleep_time
+        self._reading_loop_wakeup.wait(timeout)
+        self._reading_loop_wakeup.clear()
 
     def _reading_loop(self):
         """
-            Loops through sensors and publises data.
+            Reads the sensors that are due and publishes their data.
         """
         while self._reading_loop_should_run:
-            all_data = []
-            # Iterate through all sensors and retrieve data
-            for sensor in self.loaded_sensor_modules:
-                if sensor.is_enabled:
-                    json_data = [item.__dict__ for item in sensor.get_data()]
-                    all_data.extend(json_data)
-            self.message_broker.publish(all_data)
-            time.sleep(self.sleep_time)
+            sensors = self._due_sensors()
+            result = self.reader.read(sensors)
+            self._record_reads(sensors, result)
+            all_data = self._prepare_data(result)
+            if all_data:
+                self.message_broker.publish(all_data)
+            self._wait_for_next_deadline()
 
     def loop_forever(self) -> None:
         """
@@ -143,10 +554,19 @@ class SensorsWorker:
         self._worker_loop_should_run = False
         self._command_loop_should_run = False
         self._reading_loop_should_run = False
+        self._wake_reading_loop()
+        self._close_sensors(self._stop_executors())
+        SensorModule.config_store().close()
 
 
 def main():
-    s = SensorsWorker()
+    if runtime.use_asyncio():
+        # Imported here, the asyncio worker builds on top of this module.
+        from nucuhub.sensors.aio import AsyncSensorsWorker
+
+        s = AsyncSensorsWorker()
+    else:
+        s = SensorsWorker()
     s.loop_forever()
 
 
@@ -0,0 +1,153 @@
+import ast
+import importlib
+import json
+import pathlib
+import typing
+from dataclasses import asdict, dataclass
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.logging import get_logger
+
+logger = get_logger("SensorsManifest")
+
+
+@dataclass
+class ManifestEntry:
+    sensor_id: str
+    module: str
+    class_name: str
+    # The enabled value of the sensor's default SensorConfig, None if it isn't a literal.
+    enabled: typing.Optional[bool]
+
+    def load_class(self) -> type:
+        """
+            Imports the sensor module and returns the sensor class.
+        """
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+
+class SensorManifest:
+    """
+        Maps the sensor ids to the classes implementing them without importing the sensor
+        modules, so the hardware libraries of the disabled sensors are never imported.
+
+        The manifest is built by parsing the modules in the sensor modules package: a
+        sensor is a class defining a _configure method that returns a SensorConfig. The
+        manifest is cached as JSON and rebuilt when a module file changes.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        package: str = "nucuhub.sensors.modules",
+        path: pathlib.Path = None,
+        cache_path: str = None,
+    ):
+        self.package = package
+        self.path = path or pathlib.Path(__file__).parent / "modules"
+        self.cache_path = pathlib.Path(
+            cache_path or ApplicationConfig.SENSORS_MANIFEST_CACHE
+        )
+
+    def _fingerprint(self) -> dict:
+        fingerprint = {}
+        for file in sorted(self.path.glob("*.py")):
+            stat = file.stat()
+            fingerprint[file.name] = [stat.st_mtime_ns, stat.st_size]
+        return {"version": self.VERSION, "package": self.package, "files": fingerprint}
+
+    def load(self) -> typing.Dict[str, ManifestEntry]:
+        """
+            Loads the manifest from the cache, it is rebuilt if the cache is stale.
+        :return: A dict mapping sensor ids to their manifest entry.
+        """
+        fingerprint = self._fingerprint()
+        try:
+            cache = json.loads(self.cache_path.read_text())
+            if cache["fingerprint"] == fingerprint:
+                return {
+                    entry["sensor_id"]: ManifestEntry(**entry)
+                    for entry in cache["entries"]
+                }
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        entries = self.scan()
+        try:
+            self.cache_path.write_text(
+                json.dumps(
+                    {
+                        "fingerprint": fingerprint,
+                        "entries": [asdict(entry) for entry in entries.values()],
+                    }
+                )
+            )
+        except OSError as e:
+            logger.warning(f"can't write the sensors manifest cache: {e}")
+        return entries
+
+    def scan(self) -> typing.Dict[str, ManifestEntry]:
+        """
+            Builds the manifest by parsing the sensor modules.
+        """
+        entries = {}
+        for file in sorted(self.path.glob("*.py")):
+            if file.name == "__init__.py":
+                continue
+            module = f"{self.package}.{file.stem}"
+            try:
+                tree = ast.parse(file.read_bytes(), filename=str(file))
+            except SyntaxError as e:
+                logger.error(f"can't parse sensor module {module}: {e}")
+                continue
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef):
+                    entry = self._scan_class(module, node)
+                    if entry is not None:
+                        entries[entry.sensor_id] = entry
+        logger.debug(f"scanned sensor modules, found: {list(entries)}")
+        return entries
+
+    @staticmethod
+    def _literal(node):
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            return None
+
+    def _scan_class(self, module: str, node: ast.ClassDef):
+        attributes = {}
+        sensor_config = None
+        for item in node.body:
+            if isinstance(item, ast.Assign):
+                for target in item.targets:
+                    if isinstance(target, ast.Name):
+                        attributes[target.id] = item.value
+            elif isinstance(item, ast.FunctionDef) and item.name == "_configure":
+                for call in ast.walk(item):
+                    if (
+                        isinstance(call, ast.Call)
+                        and isinstance(call.func, ast.Name)
+                        and call.func.id == "SensorConfig"
+                    ):
+                        sensor_config = {kw.arg: kw.value for kw in call.keywords}
+        if sensor_config is None:
+            return None
+
+        id_node = sensor_config.get("id")
+        if isinstance(id_node, ast.Attribute) and id_node.attr in attributes:
+            # e.g. SensorConfig(id=self.sensor_id, ...)
+            id_node = attributes[id_node.attr]
+        sensor_id = self._literal(id_node) if id_node is not None else None
+        enabled = sensor_config.get("enabled")
+        enabled = self._literal(enabled) if enabled is not None else None
+        if not isinstance(sensor_id, str):
+            # The id is computed, key the entry by its import path, it is always imported.
+            sensor_id, enabled = f"{module}:{node.name}", None
+        return ManifestEntry(
+            sensor_id=sensor_id,
+            module=module,
+            class_name=node.name,
+            enabled=enabled if isinstance(enabled, bool) else None,
+        )
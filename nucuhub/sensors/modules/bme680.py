@@ -1,3 +1,4 @@
+import time
 import typing
 
 import bme680
@@ -5,38 +6,119 @@ import bme680
 from nucuhub import utils
 
 from nucuhub.sensors.types import (  # isort:skip
+    Deadband,
+    MeasurementBatch,
     SensorConfig,
-    SensorMeasurement,
+    SensorException,
     SensorModule,
-    SensorState,
 )
 
+# Measurement cycles of the oversampling settings, indexed by the OS_* constants.
+OVERSAMPLING_CYCLES = (0, 1, 2, 4, 8, 16)
+# Driver versions read_fields was checked against, it relies on their internals.
+TWO_PHASE_DRIVER_VERSIONS = ("1.0.5",)
+
+
+def driver_supports_two_phase_read() -> bool:
+    return getattr(bme680, "__version__", None) in TWO_PHASE_DRIVER_VERSIONS
+
+
+def read_fields(device: bme680.BME680) -> typing.Optional[dict]:
+    """
+        Reads the results of a forced measurement like BME680.get_sensor_data, which
+        can't be used because it starts a new measurement and waits for it. The field
+        registers and the compensation methods aren't part of the driver's public API,
+        so only the TWO_PHASE_DRIVER_VERSIONS are supported.
+    :param device: The BME680 driver.
+    :return: The measurements, None if the measurement isn't done yet.
+    :raises: SensorException if the driver version isn't supported.
+    """
+    if not driver_supports_two_phase_read():
+        raise SensorException(
+            f"bme680 driver {getattr(bme680, '__version__', None)} isn't supported, "
+            f"supported versions: {TWO_PHASE_DRIVER_VERSIONS}"
+        )
+    regs = device._get_regs(bme680.FIELD0_ADDR, bme680.FIELD_LENGTH)
+    if not regs[0] & bme680.NEW_DATA_MSK:
+        return None
+    adc_pressure = (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4)
+    adc_temperature = (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4)
+    adc_humidity = (regs[8] << 8) | regs[9]
+    adc_gas_resistance = (regs[13] << 2) | (regs[14] >> 6)
+    gas_range = regs[14] & bme680.GAS_RANGE_MSK
+
+    # The temperature must be computed first, the other conversions depend on it.
+    temperature = device._calc_temperature(adc_temperature)
+    device.ambient_temperature = temperature
+    # If heat_stable is false then gas_resistance is not ok
+    return {
+        "temperature": temperature / 100.0,
+        "pressure": device._calc_pressure(adc_pressure) / 100.0,
+        "humidity": device._calc_humidity(adc_humidity) / 1000.0,
+        "gas_resistance": device._calc_gas_resistance(adc_gas_resistance, gas_range),
+        "heat_stable": (regs[14] & bme680.HEAT_STAB_MSK) > 0,
+    }
+
 
 class Bme680(SensorModule):
+    """
+        Reads the BME680 in two phases: trigger starts a forced measurement and
+        collect_into reads its results once the measurement and the gas heater are done.
+        With a driver version that isn't in TWO_PHASE_DRIVER_VERSIONS the sensor is
+        read in one phase, through BME680.get_sensor_data.
+    """
+
     sensor_id = "bme680"
+    two_phase_read = True
+    channels = {
+        "temperature": "bme680 temperature, celsius",
+        "pressure": "bme680 pressure. hPa",
+        "humidity": "bme680 humidity, %RH",
+        "gas_resistance": "bme680 gas resistance, Ohms",
+        "heat_stable": "bme680 heat_stable, boolean",
+    }
+    deadbands = {
+        "temperature": Deadband(absolute=0.1),
+        "pressure": Deadband(absolute=0.1),
+        "humidity": Deadband(absolute=0.5),
+        "gas_resistance": Deadband(relative=0.05),
+        "heat_stable": Deadband(),
+    }
+    humidity_oversample = bme680.OS_2X
+    pressure_oversample = bme680.OS_4X
+    temperature_oversample = bme680.OS_8X
+    # Gas heater temperature in celsius and duration in milliseconds.
+    heater_temperature = 320
+    heater_duration = 150
+    # Attempts to read the results if the measurement took longer than expected.
+    collect_attempts = 10
     _sensor = None
 
-    def _initialize(self):
-        super(Bme680, self)._initialize()
+    def _probe(self):
         try:
             try:
                 self._sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY)
             except IOError:
                 self._sensor = bme680.BME680(bme680.I2C_ADDR_SECONDARY)
 
-            self._sensor.set_humidity_oversample(bme680.OS_2X)
-            self._sensor.set_pressure_oversample(bme680.OS_4X)
-            self._sensor.set_temperature_oversample(bme680.OS_8X)
+            self._sensor.set_humidity_oversample(self.humidity_oversample)
+            self._sensor.set_pressure_oversample(self.pressure_oversample)
+            self._sensor.set_temperature_oversample(self.temperature_oversample)
             self._sensor.set_filter(bme680.FILTER_SIZE_3)
             self._sensor.set_gas_status(bme680.ENABLE_GAS_MEAS)
 
-            self._sensor.set_gas_heater_temperature(320)
-            self._sensor.set_gas_heater_duration(150)
+            self._sensor.set_gas_heater_temperature(self.heater_temperature)
+            self._sensor.set_gas_heater_duration(self.heater_duration)
             self._sensor.select_gas_heater_profile(0)
-        except (FileNotFoundError, PermissionError):
-            self._logger.error("Bme680 initialization failed!")
-            self.set_state(SensorState.ERROR)
-            self.disable()
+            self.two_phase_read = driver_supports_two_phase_read()
+            if not self.two_phase_read:
+                self._logger.warning(
+                    f"bme680 driver {getattr(bme680, '__version__', None)} isn't in "
+                    f"{TWO_PHASE_DRIVER_VERSIONS}, reading it in one phase."
+                )
+        except (FileNotFoundError, PermissionError) as e:
+            self._sensor = None
+            raise SensorException(f"Bme680 initialization failed: {e}")
 
     def _configure(self) -> SensorConfig:
         return SensorConfig(
@@ -46,59 +128,49 @@ class Bme680(SensorModule):
             enabled=True,
         )
 
-    def _get_data(self) -> typing.List[SensorMeasurement]:
-        return_value = []
-        if self.state == SensorState.ERROR:
-            return return_value
-
-        read_ok = self._sensor.get_sensor_data()
-        if read_ok:
-            timestamp = utils.get_now_timestamp()
-            return_value.append(
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="temperature",
-                    description="bme680 temperature, celsius",
-                    value=self._sensor.data.temperature,
-                    timestamp=timestamp,
-                )
-            )
-            return_value.append(
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="pressure",
-                    description="bme680 pressure. hPa",
-                    value=self._sensor.data.pressure,
-                    timestamp=timestamp,
-                )
-            )
-            return_value.append(
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="humidity",
-                    description="bme680 humidity, %RH",
-                    value=self._sensor.data.humidity,
-                    timestamp=timestamp,
-                )
-            )
-            return_value.append(
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="gas_resistance",
-                    description="bme680 gas resistance, Ohms",
-                    value=self._sensor.data.gas_resistance,
-                    timestamp=timestamp,
-                )
-            )
-            # If heat_stable is false then gas_resistance is not ok
-            return_value.append(
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="heat_stable",
-                    description="bme680 heat_stable, boolean",
-                    value=self._sensor.data.heat_stable,
-                    timestamp=timestamp,
-                )
+    def measurement_duration(self) -> float:
+        """
+            Computes the duration of a forced measurement like the Bosch BME680 driver.
+        :return: The duration in seconds.
+        """
+        cycles = sum(
+            OVERSAMPLING_CYCLES[oversample]
+            for oversample in (
+                self.temperature_oversample,
+                self.pressure_oversample,
+                self.humidity_oversample,
             )
+        )
+        # TPH switching, gas measurement and wake up durations in microseconds.
+        duration = cycles * 1963 + 477 * 4 + 477 * 5 + 1000
+        return duration / 1_000_000 + self.heater_duration / 1000
+
+    def _trigger(self) -> float:
+        if self._sensor is None:
+            raise SensorException("Bme680 isn't initialized.")
+        self._sensor.set_power_mode(bme680.FORCED_MODE, blocking=False)
+        return self.measurement_duration()
+
+    def _collect_into(self, batch: MeasurementBatch):
+        for _ in range(self.collect_attempts):
+            measurements = read_fields(self._sensor)
+            if measurements is not None:
+                break
+            time.sleep(bme680.POLL_PERIOD_MS / 1000)
+        else:
+            raise SensorException("Bme680 measurement didn't finish.")
+        self._append(batch, measurements)
+
+    def _read_into(self, batch: MeasurementBatch):
+        if self._sensor is None:
+            raise SensorException("Bme680 isn't initialized.")
+        if not self._sensor.get_sensor_data():
+            raise SensorException("Bme680 measurement didn't finish.")
+        self._append(
+            batch, {name: getattr(self._sensor.data, name) for name in self.channels}
+        )
 
-        return return_value
+    def _append(self, batch: MeasurementBatch, measurements: dict):
+        timestamp = utils.get_now_timestamp()
+        for name, value in measurements.items():
+            batch.append(self.sensor_id, name, timestamp, value, self.channels[name])
@@ -1,18 +1,33 @@
+import re
 import typing
 
-from nucuhub import utils
+from nucuhub.sensors.sysfs import SysfsInput, SysfsSensor
+from nucuhub.sensors.types import Deadband, SensorConfig
 
-from nucuhub.sensors.types import (  # isort:skip
-    SensorConfig,
-    SensorMeasurement,
-    SensorModule,
-    SensorState,
-)
 
+def _numbered(paths, pattern: str):
+    """
+        Sorts the paths by the number matched by the pattern, e.g. thermal_zone2 before
+        thermal_zone10.
+    """
+    numbered = []
+    for path in paths:
+        match = re.fullmatch(pattern, path.name)
+        if match:
+            numbered.append((int(match.group(1)), path))
+    return sorted(numbered)
+
+
+class CpuTemperature(SysfsSensor):
+    """
+        Reads every thermal zone, the current frequency of every CPU and the hwmon
+        temperature inputs.
+    """
 
-class CpuTemperature(SensorModule):
     sensor_id = "cpu_temperature_sensor"
-    file_name = "/sys/class/thermal/thermal_zone0/temp"
+    sampling_interval = 5
+    channels = {"thermal_zone0": "CPU package temperature in celsius"}
+    deadbands = {"thermal_zone0": Deadband(absolute=0.5)}
 
     def _configure(self) -> SensorConfig:
         return SensorConfig(
@@ -22,21 +37,47 @@ class CpuTemperature(SensorModule):
             enabled=True,
         )
 
-    def _get_data(self) -> typing.List[SensorMeasurement]:
-        try:
-            with open(self.file_name) as fd:
-                data = fd.readline()
-            return [
-                SensorMeasurement(
-                    sensor_id=self.sensor_id,
-                    name="thermal_zone0",
-                    description="CPU package temperature in celsius",
-                    value=float(data) / 1000,
-                    timestamp=utils.get_now_timestamp(),
+    def _discover(self) -> typing.List[SysfsInput]:
+        inputs = []
+        thermal = self.sysfs_root / "class" / "thermal"
+        for _, zone in _numbered(thermal.glob("thermal_zone*"), r"thermal_zone(\d+)"):
+            zone_type = self._read_text(zone / "type", zone.name)
+            inputs.append(
+                SysfsInput(
+                    name=zone.name,
+                    path=str(zone / "temp"),
+                    description=f"{zone_type} temperature in celsius",
+                    scale=0.001,
+                    deadband=Deadband(absolute=0.5),
+                )
+            )
+        cpus = self.sysfs_root / "devices" / "system" / "cpu"
+        for number, cpu in _numbered(cpus.glob("cpu*"), r"cpu(\d+)"):
+            frequency = cpu / "cpufreq" / "scaling_cur_freq"
+            if frequency.exists():
+                inputs.append(
+                    SysfsInput(
+                        name=f"cpu{number}_frequency",
+                        path=str(frequency),
+                        description=f"cpu{number} frequency in MHz",
+                        scale=0.001,
+                        deadband=Deadband(),
+                    )
+                )
+        hwmons = self.sysfs_root / "class" / "hwmon"
+        for number, hwmon in _numbered(hwmons.glob("hwmon*"), r"hwmon(\d+)"):
+            device = self._read_text(hwmon / "name", hwmon.name)
+            for temp, temp_input in _numbered(
+                hwmon.glob("temp*_input"), r"temp(\d+)_input"
+            ):
+                label = self._read_text(hwmon / f"temp{temp}_label", f"temp{temp}")
+                inputs.append(
+                    SysfsInput(
+                        name=f"{hwmon.name}_temp{temp}",
+                        path=str(temp_input),
+                        description=f"{device} {label} temperature in celsius",
+                        scale=0.001,
+                        deadband=Deadband(absolute=0.5),
+                    )
                 )
-            ]
-        except IOError as e:
-            self.set_state(SensorState.ERROR)
-            self.disable()
-            self._logger.error(f"CpuTemperatureSensor: {e}")
-            return []
+        return inputs
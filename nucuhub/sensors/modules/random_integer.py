@@ -1,12 +1,15 @@
 import random
-import typing
 
 from nucuhub import utils
-from nucuhub.sensors.types import SensorConfig, SensorMeasurement, SensorModule
+from nucuhub.sensors.types import MeasurementBatch, SensorConfig, SensorModule
 
 
 class RandomInteger(SensorModule):
     sensor_id = "random_integer"
+    channels = {
+        "random_int_1": "A random integer between 0 and 15.",
+        "random_int_2": "A random integer between 100 and 200",
+    }
 
     def _configure(self) -> SensorConfig:
         return SensorConfig(
@@ -16,25 +19,10 @@ class RandomInteger(SensorModule):
             enabled=False,
         )
 
-    def _get_data(self) -> typing.List[SensorMeasurement]:
-        return_value = []
+    def _read_into(self, batch: MeasurementBatch):
         timestamp = utils.get_now_timestamp()
-        return_value.append(
-            SensorMeasurement(
-                sensor_id=self.sensor_id,
-                name="random_int_1",
-                description="A random integer between 0 and 15.",
-                value=random.randint(0, 15),
-                timestamp=timestamp,
-            )
-        )
-        return_value.append(
-            SensorMeasurement(
-                sensor_id=self.sensor_id,
-                name="random_int_2",
-                description="A random integer between 100 and 200",
-                value=random.randint(100, 200),
-                timestamp=timestamp,
-            )
-        )
-        return return_value
+        for name, value in (
+            ("random_int_1", random.randint(0, 15)),
+            ("random_int_2", random.randint(100, 200)),
+        ):
+            batch.append(self.sensor_id, name, timestamp, value, self.channels[name])
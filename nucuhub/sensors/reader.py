@@ -0,0 +1,276 @@
+import asyncio
+import collections
+import concurrent.futures
+import time
+import typing
+from dataclasses import dataclass, field
+
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.logging import get_logger
+from nucuhub.sensors.types import SensorModule
+
+
+@dataclass
+class ReadResult:
+    batch: MeasurementBatch = field(default_factory=MeasurementBatch)
+    missed: typing.List[str] = field(default_factory=list)
+
+
+def read_sensor(sensor: SensorModule) -> MeasurementBatch:
+    """
+        Reads a sensor into a new batch.
+    """
+    batch = MeasurementBatch()
+    sensor.read_into(batch)
+    return batch
+
+
+def trigger_sensor(sensor: SensorModule) -> float:
+    """
+        Starts the conversion of a sensor with a two-phase read.
+    :return: The seconds until its results can be collected.
+    """
+    return sensor.trigger()
+
+
+def collect_sensor(sensor: SensorModule) -> MeasurementBatch:
+    """
+        Collects the results of a triggered sensor into a new batch.
+    """
+    batch = MeasurementBatch()
+    sensor.collect_into(batch)
+    return batch
+
+
+def stop_executor(
+    executor: concurrent.futures.ThreadPoolExecutor,
+    futures: typing.Dict[concurrent.futures.Future, str],
+    timeout: typing.Optional[float],
+) -> typing.Set[str]:
+    """
+        Shuts the executor down, cancels the calls that didn't start and waits up to
+        timeout seconds for the running ones.
+    :param executor: The executor.
+    :param futures: A dict mapping the futures in flight to the ids of their sensors.
+    :param timeout: The seconds to wait, None waits until all the calls finished.
+    :return: The ids of the sensors whose calls are still running.
+    """
+    executor.shutdown(wait=False)
+    in_flight = dict(futures)
+    for future in in_flight:
+        future.cancel()
+    _, running = concurrent.futures.wait(in_flight, timeout=timeout)
+    return {in_flight[future] for future in running}
+
+
+class ReaderBase:
+    """
+        Reads sensors concurrently on a bounded thread pool.
+
+        Every read is bounded by the sensor's read_timeout. A read that doesn't finish
+        in time is reported as a miss and the results of the other sensors are returned
+        without waiting for it. While a read is still hanging the sensor isn't submitted
+        again, so a stuck sensor can hold at most one worker of the pool.
+
+        Sensors with a two-phase read are triggered first, the reader waits once for the
+        longest conversion while the other sensors are read and then collects them.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="SensorRead"
+        )
+        self._in_flight = {}
+        # Maps the futures running on the pool to their sensor ids, see shutdown.
+        self._futures = {}
+        self._logger = get_logger("SensorReader")
+        self.misses = collections.Counter()
+
+    def _miss(self, result: ReadResult, sensor_id: str, reason: str):
+        self._logger.warning(f"missed reading for sensor {sensor_id}: {reason}")
+        self.misses[sensor_id] += 1
+        result.missed.append(sensor_id)
+
+    @staticmethod
+    def _split(sensors: typing.List[SensorModule]):
+        """
+            Splits the sensors into the ones read at once and the ones with a two-phase read.
+        """
+        return (
+            [sensor for sensor in sensors if not sensor.two_phase_read],
+            [sensor for sensor in sensors if sensor.two_phase_read],
+        )
+
+    @staticmethod
+    def _in_order(sensors: typing.List[SensorModule], submitted):
+        """
+            Sorts the submitted (sensor, future) tuples in sensor order.
+        """
+        futures = {sensor.id: future for sensor, future in submitted}
+        return [
+            (sensor, futures[sensor.id]) for sensor in sensors if sensor.id in futures
+        ]
+
+    def _submit_to_executor(self, read, sensor: SensorModule):
+        future = self._executor.submit(read, sensor)
+        self._futures[future] = sensor.id
+        future.add_done_callback(lambda done: self._futures.pop(done, None))
+        return future
+
+    def _submit(self, result: ReadResult, sensors, submit, read=read_sensor):
+        """
+            Submits a read for every sensor that doesn't have one in flight.
+        :param read: The function called with the sensor, by default read_sensor.
+        :return: A list of (sensor, future) tuples.
+        """
+        submitted = []
+        for sensor in sensors:
+            previous = self._in_flight.get(sensor.id)
+            if previous is not None and not previous.done():
+                self._miss(result, sensor.id, "previous read is still in flight")
+                continue
+            future = submit(read, sensor)
+            self._in_flight[sensor.id] = future
+            submitted.append((sensor, future))
+        return submitted
+
+    def _triggered(self, result: ReadResult, triggers):
+        """
+            Checks the finished triggers and reports the others as misses.
+        :return: The triggered sensors and the seconds to wait for their conversions.
+        """
+        triggered = []
+        conversion_time = 0.0
+        for sensor, future in triggers:
+            if not future.done():
+                self._miss(result, sensor.id, "trigger timed out")
+                continue
+            try:
+                conversion_time = max(conversion_time, future.result())
+            except Exception as e:
+                self._miss(result, sensor.id, f"trigger failed with {e!r}")
+                continue
+            triggered.append(sensor)
+        return triggered, conversion_time
+
+    def _collect(self, result: ReadResult, submitted) -> ReadResult:
+        """
+            Collects the finished reads and reports the others as misses.
+        """
+        for sensor, future in submitted:
+            if not future.done():
+                self._miss(result, sensor.id, "read timed out")
+                continue
+            try:
+                result.batch.merge(future.result())
+            except Exception as e:
+                self._miss(result, sensor.id, f"read failed with {e!r}")
+        return result
+
+    def shutdown(self, timeout: typing.Optional[float] = 0) -> typing.Set[str]:
+        """
+            Stops the worker pool, waiting up to timeout seconds for the reads in flight.
+            By default it doesn't wait for hanging reads.
+        :return: The ids of the sensors whose reads are still running.
+        """
+        return stop_executor(self._executor, self._futures, timeout)
+
+
+class ConcurrentReader(ReaderBase):
+    def __init__(
+        self,
+        max_workers: int,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ):
+        super().__init__(max_workers)
+        self._clock = clock
+        self._sleep = sleep
+
+    def _wait(self, submitted, start: float):
+        """
+            Waits for the submitted futures until the read_timeout of their sensors.
+        """
+        deadlines = {
+            future: start + sensor.read_timeout for sensor, future in submitted
+        }
+        pending = set(deadlines)
+        while pending:
+            now = self._clock()
+            pending = {future for future in pending if deadlines[future] > now}
+            if not pending:
+                break
+            timeout = min(deadlines[future] for future in pending) - now
+            _, pending = concurrent.futures.wait(
+                pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+
+    def read(self, sensors: typing.Iterable[SensorModule]) -> ReadResult:
+        """
+            Reads the given sensors concurrently.
+        :param sensors: The sensors to read.
+        :return: A ReadResult with the measurements, in sensor order, and the ids of the missed sensors.
+        """
+        sensors = list(sensors)
+        result = ReadResult()
+        start = self._clock()
+        reads, two_phase = self._split(sensors)
+        submitted = self._submit(result, reads, self._submit_to_executor)
+        triggers = self._submit(
+            result, two_phase, self._submit_to_executor, trigger_sensor
+        )
+        if triggers:
+            self._wait(triggers, start)
+            triggered, conversion_time = self._triggered(result, triggers)
+            if triggered:
+                self._sleep(conversion_time)
+                submitted += self._submit(
+                    result, triggered, self._submit_to_executor, collect_sensor
+                )
+        self._wait(submitted, start)
+        return self._collect(result, self._in_order(sensors, submitted))
+
+
+class AsyncConcurrentReader(ReaderBase):
+    """
+        Asyncio version of the ConcurrentReader, the blocking sensor drivers run on the
+        reader's thread pool.
+    """
+
+    @staticmethod
+    async def _wait(submitted):
+        # asyncio.wait doesn't cancel the futures, so a hanging read stays in flight.
+        await asyncio.gather(
+            *(
+                asyncio.wait([future], timeout=sensor.read_timeout)
+                for sensor, future in submitted
+            )
+        )
+
+    async def read(self, sensors: typing.Iterable[SensorModule]) -> ReadResult:
+        """
+            Reads the given sensors concurrently.
+        :param sensors: The sensors to read.
+        :return: A ReadResult with the measurements, in sensor order, and the ids of the missed sensors.
+        """
+        loop = asyncio.get_running_loop()
+
+        def submit(read, sensor):
+            # Like loop.run_in_executor, the pool's futures are tracked for shutdown.
+            return asyncio.wrap_future(
+                self._submit_to_executor(read, sensor), loop=loop
+            )
+
+        sensors = list(sensors)
+        result = ReadResult()
+        reads, two_phase = self._split(sensors)
+        submitted = self._submit(result, reads, submit)
+        triggers = self._submit(result, two_phase, submit, trigger_sensor)
+        if triggers:
+            await self._wait(triggers)
+            triggered, conversion_time = self._triggered(result, triggers)
+            if triggered:
+                await asyncio.sleep(conversion_time)
+                submitted += self._submit(result, triggered, submit, collect_sensor)
+        await self._wait(submitted)
+        return self._collect(result, self._in_order(sensors, submitted))
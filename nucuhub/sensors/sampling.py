@@ -0,0 +1,169 @@
+import array
+import math
+import threading
+import time
+import typing
+
+from nucuhub import utils
+from nucuhub.infrastructure.measurements import Aggregates, MeasurementBatch
+from nucuhub.logging import get_logger
+
+logger = get_logger("SensorsSampling")
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class RingBuffer:
+    """
+        Fixed size buffer of doubles, when it is full the oldest values are overwritten.
+    """
+
+    __slots__ = ("_data", "_start", "_size", "dropped")
+
+    def __init__(self, capacity: int):
+        self._data = array.array("d", bytes(8 * max(1, capacity)))
+        self._start = 0
+        self._size = 0
+        # Number of values overwritten before they were drained.
+        self.dropped = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value: float):
+        capacity = len(self._data)
+        self._data[(self._start + self._size) % capacity] = value
+        if self._size < capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % capacity
+            self.dropped += 1
+
+    def drain(self) -> array.array:
+        """
+            Removes all the values from the buffer.
+        :return: The values, oldest first.
+        """
+        end = self._start + self._size
+        if end <= len(self._data):
+            values = self._data[self._start : end]
+        else:
+            values = self._data[self._start :] + self._data[: end - len(self._data)]
+        self._start = self._size = 0
+        return values
+
+
+def _percentile(ordered: typing.List[float], fraction: float) -> float:
+    # Linear interpolation between the closest ranks.
+    position = (len(ordered) - 1) * fraction
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def aggregate(values: typing.Sequence[float]) -> typing.Optional[Aggregates]:
+    """
+        Computes the statistics of a window of samples. The samples are sorted once, the
+        min, max and the percentiles are read from the sorted samples.
+    :return: The Aggregates or None if there are no samples.
+    """
+    count = len(values)
+    if count == 0:
+        return None
+    ordered = sorted(values)
+    mean = math.fsum(ordered) / count
+    variance = math.fsum((value - mean) ** 2 for value in ordered) / count
+    return Aggregates(
+        count,
+        ordered[0],
+        ordered[-1],
+        mean,
+        math.sqrt(variance),
+        *(_percentile(ordered, fraction) for fraction in PERCENTILES),
+    )
+
+
+class HighRateSampler:
+    """
+        Samples a sensor sample_rate times per second on a dedicated thread into one ring
+        buffer per channel. Every drain_into() closes a publish window: it replaces the
+        samples of each channel with a single reading whose value is the mean of the
+        window and which carries the window's Aggregates.
+    """
+
+    def __init__(
+        self, sensor, window: float, clock: typing.Callable[[], float] = time.monotonic
+    ):
+        """
+        :param sensor: The SensorModule, it must implement sample().
+        :param window: Seconds between two drains, the buffers hold two windows.
+        """
+        self.sensor = sensor
+        self.period = 1 / sensor.sample_rate
+        self.capacity = math.ceil(sensor.sample_rate * window * 2)
+        self._clock = clock
+        self._buffers: typing.Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._sample_loop, name=f"Sampler-{self.sensor.id}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.period + 1)
+            self._thread = None
+
+    def sample_once(self):
+        """
+            Takes one sample of every channel of the sensor.
+        """
+        samples = self.sensor.sample()
+        with self._lock:
+            for name, value in samples.items():
+                buffer = self._buffers.get(name)
+                if buffer is None:
+                    buffer = self._buffers[name] = RingBuffer(self.capacity)
+                buffer.append(value)
+
+    def _sample_loop(self):
+        deadline = self._clock()
+        while not self._stop.is_set():
+            if self.sensor.is_enabled:
+                try:
+                    self.sample_once()
+                except Exception as e:
+                    logger.warning(f"sampling {self.sensor.id} failed: {e}")
+            # Deadlines advance by the period so the rate doesn't drift; if we fell
+            # behind the missed samples are skipped.
+            deadline += self.period
+            now = self._clock()
+            if deadline < now:
+                deadline = now
+            self._stop.wait(deadline - now)
+
+    def drain_into(self, batch: MeasurementBatch):
+        """
+            Appends the aggregated readings of the window to the batch.
+        """
+        with self._lock:
+            windows = {name: buffer.drain() for name, buffer in self._buffers.items()}
+        timestamp = utils.get_now_timestamp()
+        for name, values in windows.items():
+            aggregates = aggregate(values)
+            if aggregates is not None:
+                batch.append(
+                    self.sensor.id,
+                    name,
+                    timestamp,
+                    aggregates.mean,
+                    self.sensor.channels.get(name),
+                    aggregates,
+                )
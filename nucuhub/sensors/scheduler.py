@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import threading
+import time
+import typing
+
+from nucuhub.sensors.types import SensorModule
+
+
+class DeadlineScheduler:
+    """
+        Priority queue of sensor deadlines.
+
+        Every sensor is due once per sampling_interval. Deadlines are taken from a
+        monotonic clock and advanced from the previous deadline, not from the time
+        the read finished, so slow reads don't make the schedule drift.
+    """
+
+    def __init__(self, clock: typing.Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._heap = []
+        self._deadlines = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _push(self, deadline: float, sensor: SensorModule):
+        self._deadlines[sensor.id] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), sensor))
+
+    def add(self, sensor: SensorModule, delay: float = 0):
+        """
+            Schedules a sensor, the first read is due after delay seconds. A sensor
+            that is already scheduled is moved to the new deadline.
+        :param sensor: The SensorModule instance.
+        :param delay: Seconds until the first read.
+        """
+        with self._lock:
+            self._push(self._clock() + delay, sensor)
+
+    def remove(self, sensor_id: str):
+        """
+            Removes a sensor from the schedule.
+        :param sensor_id: The sensor's id.
+        """
+        with self._lock:
+            self._deadlines.pop(sensor_id, None)
+
+    def pop_due(self) -> typing.List[SensorModule]:
+        """
+            Pops the sensors that are due and schedules their next deadline.
+        :return: A list of SensorModule instances, ordered by deadline.
+        """
+        due = []
+        with self._lock:
+            now = self._clock()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, sensor = heapq.heappop(self._heap)
+                # Entries that were rescheduled or removed are dropped lazily.
+                if self._deadlines.get(sensor.id) != deadline:
+                    continue
+                due.append(sensor)
+                next_deadline = deadline + sensor.sampling_interval
+                if next_deadline <= now:
+                    # We fell behind by more than an interval, skip the missed reads.
+                    next_deadline = now + sensor.sampling_interval
+                self._push(next_deadline, sensor)
+        return due
+
+    def time_until_next(self) -> typing.Optional[float]:
+        """
+            Computes the time until the next deadline.
+        :return: The number of seconds until the next sensor is due or None if nothing is scheduled.
+        """
+        with self._lock:
+            while self._heap:
+                deadline, _, sensor = self._heap[0]
+                if self._deadlines.get(sensor.id) == deadline:
+                    return max(0.0, deadline - self._clock())
+                heapq.heappop(self._heap)
+        return None
@@ -0,0 +1,248 @@
+"""
+    Synthetic sensor farm, used to load test the sensors -> redis -> monitoring path
+    without hardware.
+
+    The farm is configured by SENSORS_SYNTHETIC, a JSON object with the fields of
+    FarmSpec, e.g. {"sensors": 1000, "channels": 4, "interval": 1}, and it is loaded
+    by the sensors worker next to the sensor modules. It can also run on its own:
+    Usage: python -m nucuhub.sensors.synthetic --sensors 1000 --interval 1 --error-rate 0.01
+"""
+import argparse
+import functools
+import json
+import random
+import string
+import time
+import typing
+from dataclasses import asdict, dataclass, fields
+
+from nucuhub import utils
+from nucuhub.config import ApplicationConfig
+from nucuhub.logging import get_logger
+
+from nucuhub.sensors.types import (  # isort:skip
+    MeasurementBatch,
+    SensorConfig,
+    SensorException,
+    SensorModule,
+)
+
+logger = get_logger("SyntheticSensors")
+
+# Maps the distribution names to their default parameters.
+DISTRIBUTIONS = {
+    "uniform": (0.0, 100.0),
+    "normal": (20.0, 2.0),
+    "walk": (20.0, 0.5),
+    "integer": (0, 100),
+    "bool": (0.5,),
+}
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+        The distribution of the values of a channel, parsed from "name:param,param":
+
+        - uniform:low,high
+        - normal:mean,stddev
+        - walk:start,step, a random walk with normally distributed steps.
+        - integer:low,high
+        - bool:probability, of True.
+    """
+
+    name: str
+    params: typing.Tuple[float, ...]
+
+    @classmethod
+    def parse(cls, value: str) -> "Distribution":
+        name, _, params = value.partition(":")
+        if name not in DISTRIBUTIONS:
+            raise ValueError(f"unknown distribution {name!r}")
+        default = DISTRIBUTIONS[name]
+        parsed = tuple(float(param) for param in params.split(",") if param)
+        if parsed and len(parsed) != len(default):
+            raise ValueError(f"{name} takes {len(default)} parameters: {value!r}")
+        return cls(name, parsed or default)
+
+    def generator(self, rng: random.Random) -> typing.Callable[[], typing.Any]:
+        """
+            Creates a generator of values, every channel has its own.
+        """
+        if self.name == "uniform":
+            return functools.partial(rng.uniform, *self.params)
+        if self.name == "normal":
+            return functools.partial(rng.gauss, *self.params)
+        if self.name == "integer":
+            low, high = self.params
+            return functools.partial(rng.randint, int(low), int(high))
+        if self.name == "bool":
+            probability = self.params[0]
+            return lambda: rng.random() < probability
+        value, step = self.params
+
+        def walk():
+            nonlocal value
+            value += rng.gauss(0, step)
+            return value
+
+        return walk
+
+
+@dataclass
+class FarmSpec:
+    # Number of sensors and channels per sensor.
+    sensors: int = 100
+    channels: int = 2
+    # Seconds between two reads of a sensor.
+    interval: float = 10
+    distribution: str = "normal"
+    # Mean read latency in seconds, the latencies are exponentially distributed.
+    latency: float = 0
+    # Probability that a read fails.
+    error_rate: float = 0
+    # Size in bytes of an extra string channel, 0 for none.
+    payload: int = 0
+    # Seed of the values, None for random ones.
+    seed: typing.Optional[int] = None
+
+    @classmethod
+    def from_json(cls, value: str) -> "FarmSpec":
+        names = {field.name for field in fields(cls)}
+        spec = json.loads(value)
+        unknown = set(spec) - names
+        if unknown:
+            raise ValueError(f"unknown synthetic farm fields: {sorted(unknown)}")
+        return cls(**spec)
+
+
+class SyntheticSensor(SensorModule):
+    """
+        A sensor outputting generated values, with injected read latency and errors.
+    """
+
+    def __init__(
+        self,
+        sensor_id: str,
+        channels: int = 2,
+        distribution: Distribution = Distribution.parse("normal"),
+        sampling_interval: float = 10,
+        latency: float = 0,
+        error_rate: float = 0,
+        payload: int = 0,
+        rng: random.Random = None,
+    ):
+        self.sensor_id = sensor_id
+        self.sampling_interval = sampling_interval
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = rng or random.Random()
+        self.channels = {
+            f"channel_{index}": f"synthetic {distribution.name} values"
+            for index in range(channels)
+        }
+        self._generators = [
+            (name, distribution.generator(self._rng)) for name in self.channels
+        ]
+        if payload:
+            self.channels["payload"] = f"synthetic {payload} bytes payload"
+            letters = self._rng.choices(string.ascii_letters, k=payload)
+            self._generators.append(
+                ("payload", functools.partial(str, "".join(letters)))
+            )
+        super().__init__()
+
+    def _configure(self) -> SensorConfig:
+        return SensorConfig(
+            id=self.sensor_id,
+            name="Synthetic",
+            description="Outputs generated values, for load tests",
+            enabled=True,
+        )
+
+    def _read_into(self, batch: MeasurementBatch):
+        if self.latency:
+            time.sleep(self._rng.expovariate(1 / self.latency))
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise SensorException(f"{self.sensor_id} injected read error.")
+        timestamp = utils.get_now_timestamp()
+        for name, generate in self._generators:
+            batch.append(
+                self.sensor_id, name, timestamp, generate(), self.channels[name]
+            )
+
+
+class SyntheticFarm:
+    def __init__(self, spec: FarmSpec):
+        self.spec = spec
+        self.distribution = Distribution.parse(spec.distribution)
+
+    @classmethod
+    def from_config(cls) -> typing.Optional["SyntheticFarm"]:
+        """
+            Creates the farm configured by SENSORS_SYNTHETIC.
+        :return: The farm or None if it isn't configured.
+        """
+        if not ApplicationConfig.SENSORS_SYNTHETIC:
+            return None
+        try:
+            return cls(FarmSpec.from_json(ApplicationConfig.SENSORS_SYNTHETIC))
+        except (ValueError, TypeError) as e:
+            logger.error(f"invalid synthetic farm config, ignoring it: {e}")
+            return None
+
+    def sensor_factories(self) -> typing.List[typing.Callable[[], SyntheticSensor]]:
+        """
+            Returns a factory for every sensor of the farm, the worker loads them like
+            the sensor module classes.
+        """
+        spec = self.spec
+        return [
+            functools.partial(
+                SyntheticSensor,
+                f"synthetic_{index:05d}",
+                channels=spec.channels,
+                distribution=self.distribution,
+                sampling_interval=spec.interval,
+                latency=spec.latency,
+                error_rate=spec.error_rate,
+                payload=spec.payload,
+                rng=random.Random(f"{spec.seed}:{index}")
+                if spec.seed is not None
+                else None,
+            )
+            for index in range(spec.sensors)
+        ]
+
+
+def main():
+    defaults = FarmSpec()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sensors", type=int, default=defaults.sensors)
+    parser.add_argument("--channels", type=int, default=defaults.channels)
+    parser.add_argument("--interval", type=float, default=defaults.interval)
+    parser.add_argument(
+        "--distribution",
+        default=defaults.distribution,
+        help=f"One of {', '.join(DISTRIBUTIONS)}, e.g. normal:20,2.",
+    )
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--payload", type=int, default=defaults.payload)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    spec = FarmSpec(**{name: getattr(args, name) for name in asdict(defaults)})
+    # Imported here, the worker imports this module.
+    from nucuhub.sensors.main import SensorsWorker
+
+    worker = SensorsWorker()
+    worker.sensor_modules = SyntheticFarm(spec).sensor_factories()
+    logger.info(f"running the synthetic farm {spec}")
+    worker.loop_forever()
+
+
+if __name__ == "__main__":
+    main()
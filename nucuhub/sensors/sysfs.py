@@ -0,0 +1,102 @@
+import os
+import pathlib
+import typing
+from dataclasses import dataclass
+
+from nucuhub import utils
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.sensors.filters import Deadband
+from nucuhub.sensors.types import SensorException, SensorModule
+
+
+@dataclass
+class SysfsInput:
+    name: str
+    path: str
+    description: str
+    # The raw integer value is multiplied by scale, e.g. millidegrees to degrees.
+    scale: float = 1
+    deadband: typing.Optional[Deadband] = None
+
+
+class SysfsSensor(SensorModule):
+    """
+        Base of the sensors reading numeric sysfs attributes.
+
+        The inputs are discovered when the sensor is probed and their files are kept
+        open, every read re-reads them with pread at offset 0 instead of opening them
+        again. All the inputs are read into the same batch.
+    """
+
+    # Maximum number of bytes of an attribute.
+    read_size = 32
+
+    def __init__(self, sysfs_root: str = None):
+        self.sysfs_root = pathlib.Path(
+            sysfs_root or ApplicationConfig.SENSORS_SYSFS_ROOT
+        )
+        self._inputs: typing.List[typing.Tuple[int, SysfsInput]] = []
+        super().__init__()
+
+    def _discover(self) -> typing.List[SysfsInput]:
+        """
+            Finds the inputs of the sensor under sysfs_root, to be implemented in sub-classes.
+        """
+        raise NotImplementedError()
+
+    def _probe(self):
+        self.close()
+        inputs = []
+        for sysfs_input in self._discover():
+            try:
+                inputs.append((os.open(sysfs_input.path, os.O_RDONLY), sysfs_input))
+            except OSError as e:
+                self._logger.warning(f"can't open {sysfs_input.path}: {e}")
+        self._inputs = inputs
+        if not inputs:
+            raise SensorException(f"{self.id} didn't find any inputs.")
+        self.channels = {i.name: i.description for _, i in inputs}
+        self.deadbands = {i.name: i.deadband for _, i in inputs if i.deadband}
+        self._logger.info(f"{self.id} found the inputs: {list(self.channels)}")
+
+    def _read_values(self) -> typing.Dict[str, float]:
+        values = {}
+        for fd, sysfs_input in self._inputs:
+            try:
+                raw = os.pread(fd, self.read_size, 0)
+                values[sysfs_input.name] = int(raw) * sysfs_input.scale
+            except (OSError, ValueError) as e:
+                # e.g. hwmon inputs return EIO while the device is asleep.
+                self._logger.debug(f"can't read {sysfs_input.path}: {e}")
+        if not values:
+            raise SensorException(f"{self.id} couldn't read any of its inputs.")
+        return values
+
+    def _sample(self) -> typing.Dict[str, float]:
+        return self._read_values()
+
+    def _read_into(self, batch: MeasurementBatch):
+        timestamp = utils.get_now_timestamp()
+        for name, value in self._read_values().items():
+            batch.append(self.id, name, timestamp, value, self.channels[name])
+
+    def close(self):
+        """
+            Closes the files of the inputs.
+        """
+        super().close()
+        for fd, _ in self._inputs:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._inputs = []
+
+    def _read_text(
+        self, path: pathlib.Path, default: str = None
+    ) -> typing.Optional[str]:
+        try:
+            return path.read_text().strip()
+        except OSError:
+            return default
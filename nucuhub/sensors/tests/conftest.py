@@ -2,16 +2,23 @@ import pytest
 
 from nucuhub.config import ApplicationConfig
 from nucuhub.infrastructure.redis import RedisService
+from nucuhub.sensors.infrastructure import ConfigStore
+from nucuhub.sensors.types import SensorModule
 
 
 @pytest.fixture
 def redis_fixture():
     redis = None
+    config_store = SensorModule._db
     try:
         ApplicationConfig.REDIS_URL = "localhost"
         RedisService.set_singleton(None)
         redis = RedisService.instance()
+        # The configs cached by the store must not leak between tests.
+        SensorModule._db = ConfigStore()
         yield redis
     finally:
+        SensorModule._db.close()
+        SensorModule._db = config_store
         if redis is not None:
             redis.get_redis().flushall()
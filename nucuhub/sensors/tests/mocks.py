@@ -1,7 +1,13 @@
 import random
+import threading
 import typing
 
-from nucuhub.sensors.types import SensorConfig, SensorMeasurement, SensorModule
+from nucuhub.sensors.types import (  # isort:skip
+    Deadband,
+    SensorConfig,
+    SensorMeasurement,
+    SensorModule,
+)
 
 
 class DummySensor(SensorModule):
@@ -44,3 +50,103 @@ class ExactDummySensor(DummySensor):
                 timestamp=0,
             )
         ]
+
+
+class ProbedDummySensor(ExactDummySensor):
+    """
+        A sensor whose probe blocks until probe_done is set.
+    """
+
+    probe_timeout = 0.1
+
+    def __init__(self, sensor_id="probed"):
+        self.sensor_id = sensor_id
+        self.probe_done = threading.Event()
+        super().__init__()
+
+    def _configure(self):
+        config = super()._configure()
+        config.id = self.sensor_id
+        return config
+
+    def _probe(self):
+        self.probe_done.wait(5)
+
+
+class BlockingReadDummySensor(ExactDummySensor):
+    """
+        A sensor whose reads block until release is set, it records its reads and close.
+    """
+
+    read_timeout = 0.05
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.events = []
+        super().__init__()
+
+    def _read_into(self, batch):
+        self.release.wait(5)
+        self.events.append("read")
+        super()._read_into(batch)
+
+    def close(self):
+        self.events.append("close")
+        super().close()
+
+
+class DiscoveringDummySensor(ExactDummySensor):
+    """
+        A sensor that discovers the type of its thermal zone when it is probed.
+    """
+
+    zone_type = "cpu"
+
+    def __init__(self):
+        self.channels = {}
+        super().__init__()
+
+    def _probe(self):
+        self.channels = {"zone0": f"{self.zone_type} temperature"}
+
+
+class DeadbandDummySensor(ExactDummySensor):
+    deadbands = {"tests": Deadband(absolute=1)}
+
+    def _read_into(self, batch):
+        batch.append("tid", "tests", 0, 2.22, "tests")
+
+
+class HighRateDummySensor(ExactDummySensor):
+    sample_rate = 100
+    channels = {"vibration": "vibration, mm/s"}
+
+    def __init__(self):
+        self.samples = 0
+        super().__init__()
+
+    def _sample(self):
+        self.samples += 1
+        return {"vibration": self.samples - 1}
+
+
+class TwoPhaseDummySensor(ExactDummySensor):
+    two_phase_read = True
+
+    def __init__(self, sensor_id="two_phase", conversion_time=0.1):
+        self.sensor_id = sensor_id
+        self.conversion_time = conversion_time
+        self.triggered = 0
+        super().__init__()
+
+    def _configure(self):
+        config = super()._configure()
+        config.id = self.sensor_id
+        return config
+
+    def _trigger(self):
+        self.triggered += 1
+        return self.conversion_time
+
+    def _collect_into(self, batch):
+        batch.append(self.sensor_id, "value", 0, self.triggered)
@@ -0,0 +1,53 @@
+import pytest
+
+from nucuhub.sensors.breaker import BreakerState, CircuitBreaker
+
+
+@pytest.fixture
+def now():
+    return [0.0]
+
+
+def create_breaker(now, rand=lambda: 0.0):
+    return CircuitBreaker(
+        failure_threshold=2, base_delay=1, max_delay=5, clock=lambda: now[0], rand=rand,
+    )
+
+
+def test_breaker_opens_after_consecutive_failures(now):
+    breaker = create_breaker(now)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state is BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 1
+
+
+def test_breaker_half_open_probe(now):
+    breaker = create_breaker(now)
+    breaker.trip()
+    now[0] = 1
+    assert breaker.allow()
+    assert breaker.state is BreakerState.HALF_OPEN
+    # Only a single probe read is allowed.
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state is BreakerState.OPEN
+    assert breaker.retry_in() == 2
+
+    now[0] = 3
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state is BreakerState.CLOSED
+    assert breaker.trips == 0
+
+
+def test_breaker_backoff():
+    breaker = create_breaker([0.0])
+    assert [breaker.backoff(trips) for trips in range(1, 6)] == [1, 2, 4, 5, 5]
+    jittered = create_breaker([0.0], rand=lambda: 1.0)
+    assert jittered.backoff(3) == 2
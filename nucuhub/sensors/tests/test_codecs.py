@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.infrastructure import codecs
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.sensors.infrastructure import Messaging
+from nucuhub.sensors.sampling import aggregate
+
+
+def create_batch():
+    batch = MeasurementBatch()
+    batch.append("bme680", "temperature", 1.5, 21.3, "bme680 temperature")
+    batch.append("bme680", "heat_stable", 1.5, True, "bme680 heat_stable")
+    batch.append("bme680", "temperature", 2.0, 21.4)
+    batch.append("random_integer", "random_int_1", 2.0, 7)
+    batch.append("random_integer", "label", 2.0, "ok")
+    batch.append("random_integer", "missing", 2.0, None)
+    return batch
+
+
+def expected_readings():
+    return json.loads(create_batch().to_json(compact=True))
+
+
+@pytest.mark.parametrize("name", ["json", "columns"])
+def test_codec_round_trip(monkeypatch, name):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_COMPACT_READINGS", True)
+    codec = codecs.get_codec(name)
+    payload = codec.encode(create_batch())
+    assert codec.decode(payload) == expected_readings()
+    assert codecs.decode(payload) == expected_readings()
+
+
+def test_codec_columns_version_byte():
+    payload = codecs.get_codec("columns").encode(create_batch())
+    assert payload[0] == codecs.ColumnsCodec.version
+    assert len(payload) < len(create_batch().to_json(compact=True))
+
+
+def test_codec_columns_empty_batch():
+    payload = codecs.get_codec("columns").encode(MeasurementBatch())
+    assert codecs.decode(payload) == []
+
+
+def test_codec_columns_malformed():
+    payload = codecs.get_codec("columns").encode(create_batch())
+    with pytest.raises(codecs.CodecException):
+        codecs.decode(payload[:-3])
+
+
+def test_codec_decoder_not_enabled(monkeypatch):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_DECODERS", ["json"])
+    payload = codecs.get_codec("columns").encode(create_batch())
+    with pytest.raises(codecs.CodecException):
+        codecs.decode(payload)
+
+
+def test_codec_unknown():
+    with pytest.raises(codecs.CodecException):
+        codecs.get_codec("msgpack")
+
+
+@pytest.mark.parametrize("name", ["json", "columns"])
+def test_messaging_encode_uses_configured_codec(monkeypatch, name):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_ENCODER", name)
+    payload = Messaging.encode(create_batch())
+    assert payload == codecs.get_codec(name).encode(create_batch())
+    # Data that isn't a batch, like the sensor commands, is always JSON.
+    assert Messaging.encode({"ok": True}) == '{"ok": true}'
+
+
+@pytest.mark.parametrize("name", ["json", "columns"])
+def test_codec_round_trip_aggregates(monkeypatch, name):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_COMPACT_READINGS", True)
+    batch = create_batch()
+    batch.append("vibration", "x", 3.0, 2.0, None, aggregate([1.0, 2.0, 3.0]))
+    readings = codecs.decode(codecs.get_codec(name).encode(batch))
+    assert readings == json.loads(batch.to_json(compact=True))
+    assert readings[-1]["aggregates"]["count"] == 3
+    assert "aggregates" not in readings[0]
+
+
+def test_codec_non_utf8_payload():
+    with pytest.raises(codecs.CodecException):
+        codecs.decode(b"\xff\xfe")
+
+
+def test_codec_columns_too_many_channels_falls_back_to_json(monkeypatch):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_ENCODER", "columns")
+    batch = MeasurementBatch()
+    for index in range(codecs.ColumnsCodec.MAX_CHANNELS + 1):
+        batch.append("synthetic", f"c{index}", 1.0, index)
+    with pytest.raises(codecs.CodecException):
+        codecs.get_codec("columns").encode(batch)
+
+    readings = codecs.decode(codecs.encode(batch).encode())
+    assert len(readings) == codecs.ColumnsCodec.MAX_CHANNELS + 1
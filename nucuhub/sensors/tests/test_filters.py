@@ -0,0 +1,83 @@
+import pytest
+
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.sensors.filters import Deadband, DeadbandFilter
+
+
+def create_filter(now, **deadbands):
+    deadband_filter = DeadbandFilter(
+        overrides={}, default_heartbeat=60, clock=lambda: now[0]
+    )
+    for name, deadband in deadbands.items():
+        deadband_filter.configure(f"s:{name}", deadband)
+    return deadband_filter
+
+
+def publish(deadband_filter, name, value):
+    batch = MeasurementBatch()
+    batch.append("s", name, 0, value, "description")
+    return list(deadband_filter.filter(batch).values)
+
+
+@pytest.mark.parametrize(
+    "deadband, values, expected",
+    [
+        pytest.param(
+            Deadband(absolute=0.5),
+            [20.0, 20.2, 20.5, 20.6, 19.9],
+            [20.0, 20.6, 19.9],
+            id="absolute",
+        ),
+        pytest.param(
+            Deadband(relative=0.1),
+            [100, 105, 109, 111, 120],
+            [100, 111],
+            id="relative",
+        ),
+        pytest.param(
+            Deadband(absolute=1, relative=0.1),
+            [5, 5.9, 6.1, 100, 109],
+            [5, 6.1, 100],
+            id="largest-threshold",
+        ),
+        pytest.param(
+            Deadband(), [True, True, False, "a", "a"], [True, False, "a"], id="change"
+        ),
+    ],
+)
+def test_deadband_filter(deadband, values, expected):
+    deadband_filter = create_filter([0], value=deadband)
+    published = []
+    for value in values:
+        published.extend(publish(deadband_filter, "value", value))
+    assert published == expected
+    assert deadband_filter.published == len(expected)
+    assert deadband_filter.held == len(values) - len(expected)
+
+
+def test_deadband_filter_heartbeat():
+    now = [0]
+    deadband_filter = create_filter(
+        now, slow=Deadband(absolute=1), fast=Deadband(absolute=1, heartbeat=10)
+    )
+    assert publish(deadband_filter, "slow", 1) == [1]
+    assert publish(deadband_filter, "fast", 1) == [1]
+    now[0] = 10
+    assert publish(deadband_filter, "slow", 1) == []
+    assert publish(deadband_filter, "fast", 1) == [1]
+    now[0] = 60
+    assert publish(deadband_filter, "slow", 1) == [1]
+
+
+def test_deadband_filter_unconfigured_channels_pass():
+    deadband_filter = create_filter([0])
+    assert publish(deadband_filter, "value", 1) == [1]
+    assert publish(deadband_filter, "value", 1) == [1]
+
+
+def test_deadband_filter_overrides():
+    overrides = DeadbandFilter.parse_overrides('{"s:value": {"absolute": 10}}')
+    deadband_filter = DeadbandFilter(overrides=overrides)
+    deadband_filter.configure("s:value", Deadband(absolute=1))
+    assert deadband_filter.deadband("s:value") == Deadband(absolute=10)
+    assert DeadbandFilter.parse_overrides('{"s:value": {"unknown": 1}}') == {}
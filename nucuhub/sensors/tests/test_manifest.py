@@ -0,0 +1,73 @@
+import os
+from unittest.mock import MagicMock
+
+from nucuhub.sensors.manifest import ManifestEntry, SensorManifest
+from nucuhub.sensors.modules.random_integer import RandomInteger
+
+SENSOR_MODULE = """
+import not_installed_hardware_library
+
+from nucuhub.sensors.types import SensorConfig, SensorModule
+
+
+class Hardware(SensorModule):
+    sensor_id = "hardware"
+
+    def _configure(self):
+        return SensorConfig(id=self.sensor_id, name="hw", description="", enabled={enabled})
+
+
+class Computed(SensorModule):
+    def _configure(self):
+        return SensorConfig(id=compute_id(), name="c", description="", enabled=False)
+
+
+class Helper:
+    pass
+"""
+
+
+def create_manifest(tmp_path, enabled=False):
+    modules = tmp_path / "modules"
+    modules.mkdir(exist_ok=True)
+    (modules / "__init__.py").write_text("")
+    (modules / "hardware.py").write_text(SENSOR_MODULE.format(enabled=enabled))
+    return SensorManifest("plugins", modules, str(tmp_path / "manifest.json"))
+
+
+def test_manifest_scan_sensor_modules():
+    manifest = SensorManifest(cache_path=os.devnull)
+    assert manifest.scan()["random_integer"] == ManifestEntry(
+        sensor_id="random_integer",
+        module="nucuhub.sensors.modules.random_integer",
+        class_name="RandomInteger",
+        enabled=False,
+    )
+    assert manifest.scan()["random_integer"].load_class() is RandomInteger
+
+
+def test_manifest_scan_without_importing(tmp_path):
+    entries = create_manifest(tmp_path).scan()
+    assert entries == {
+        "hardware": ManifestEntry("hardware", "plugins.hardware", "Hardware", False),
+        # Sensors with a computed id are keyed by import path and always imported.
+        "plugins.hardware:Computed": ManifestEntry(
+            "plugins.hardware:Computed", "plugins.hardware", "Computed", None
+        ),
+    }
+
+
+def test_manifest_load_uses_cache(tmp_path):
+    manifest = create_manifest(tmp_path)
+    entries = manifest.load()
+    manifest.scan = MagicMock()
+    assert manifest.load() == entries
+    manifest.scan.assert_not_called()
+
+
+def test_manifest_load_rebuilds_stale_cache(tmp_path):
+    create_manifest(tmp_path).load()
+    # Changing a module invalidates the cache.
+    manifest = create_manifest(tmp_path, enabled=True)
+    os.utime(manifest.path / "hardware.py", ns=(0, 0))
+    assert manifest.load()["hardware"].enabled is True
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from nucuhub.infrastructure.measurements import (  # isort:skip
+    Aggregates,
+    MeasurementBatch,
+    SensorMeasurement,
+)
+
+
+def create_measurements():
+    return [
+        SensorMeasurement("bme680", "temperature", "bme680 temperature", 1.5, 21.3),
+        SensorMeasurement("bme680", "heat_stable", "bme680 heat_stable", 1.5, True),
+        SensorMeasurement("bme680", "temperature", "bme680 temperature", 2.0, 21.4),
+        SensorMeasurement("random_integer", "random_int_1", None, 2.0, 7),
+    ]
+
+
+def test_measurement_is_slotted():
+    measurement = create_measurements()[0]
+    assert not hasattr(measurement, "__dict__")
+    with pytest.raises(AttributeError):
+        measurement.unit = "celsius"
+
+
+def test_batch_round_trip():
+    batch = MeasurementBatch()
+    batch.extend(create_measurements())
+    assert len(batch) == 4
+    assert list(batch) == create_measurements()
+    # Descriptions are stored once per channel.
+    assert batch.descriptions == {
+        ("bme680", "temperature"): "bme680 temperature",
+        ("bme680", "heat_stable"): "bme680 heat_stable",
+    }
+
+
+def test_batch_to_json():
+    batch = MeasurementBatch()
+    batch.extend(create_measurements())
+    assert json.loads(batch.to_json()) == [m.to_dict() for m in create_measurements()]
+
+
+def test_batch_to_json_integer_timestamp():
+    batch = MeasurementBatch()
+    batch.append("sensor", "name", 0, 2.22, "description")
+    assert (
+        batch.to_json()
+        == '[{"sensor_id": "sensor", "name": "name", "description": "description", "timestamp": 0, "value": 2.22}]'
+    )
+
+
+def test_batch_to_json_compact():
+    batch = MeasurementBatch()
+    batch.extend(create_measurements())
+    assert json.loads(batch.to_json(compact=True)) == [
+        {
+            "channel": f"{m.sensor_id}:{m.name}",
+            "timestamp": m.timestamp,
+            "value": m.value,
+        }
+        for m in create_measurements()
+    ]
+
+
+def test_batch_catalog_entries():
+    batch = MeasurementBatch()
+    batch.extend(create_measurements())
+    assert batch.catalog_entries() == {
+        "bme680:temperature": {
+            "sensor_id": "bme680",
+            "name": "temperature",
+            "description": "bme680 temperature",
+        },
+        "bme680:heat_stable": {
+            "sensor_id": "bme680",
+            "name": "heat_stable",
+            "description": "bme680 heat_stable",
+        },
+    }
+
+
+def test_batch_aggregates():
+    aggregates = Aggregates(2, 1.0, 3.0, 2.0, 1.0, 2.0, 2.8, 2.98)
+    first, second = MeasurementBatch(), MeasurementBatch()
+    first.extend(create_measurements())
+    second.append("vibration", "x", 1.0, 2.0, "vibration", aggregates)
+    first.merge(second)
+    assert list(first)[-1].aggregates == aggregates
+    assert json.loads(first.to_json())[-1] == list(first)[-1].to_dict()
+    assert json.loads(first.to_json())[-1]["aggregates"]["p99"] == 2.98
+
+
+def test_batch_merge():
+    first, second = MeasurementBatch(), MeasurementBatch()
+    first.extend(create_measurements()[:2])
+    second.extend(create_measurements()[2:])
+    first.merge(second)
+    assert list(first) == create_measurements()
@@ -0,0 +1,105 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from nucuhub.sensors.reader import ConcurrentReader
+from nucuhub.sensors.tests.mocks import TwoPhaseDummySensor
+
+
+def fake_sensor(sensor_id, get_value, read_timeout=0.2):
+    def read_into(batch):
+        batch.append(sensor_id, "value", 0, get_value())
+
+    return SimpleNamespace(
+        id=sensor_id,
+        read_into=read_into,
+        read_timeout=read_timeout,
+        two_phase_read=False,
+    )
+
+
+@pytest.fixture
+def reader():
+    reader = ConcurrentReader(max_workers=2)
+    yield reader
+    reader.shutdown()
+
+
+@pytest.fixture
+def hanging_read():
+    release = threading.Event()
+
+    def get_value():
+        release.wait(5)
+        return "late"
+
+    yield get_value
+    release.set()
+
+
+def test_reader_reads_concurrently(reader):
+    sensors = [
+        fake_sensor("a", lambda: time.sleep(0.1) or "a"),
+        fake_sensor("b", lambda: time.sleep(0.1) or "b"),
+    ]
+    start = time.monotonic()
+    result = reader.read(sensors)
+    assert time.monotonic() - start < 0.19
+    assert result.batch.values == ["a", "b"]
+    assert result.missed == []
+
+
+def test_reader_reports_timeout_as_miss(reader, hanging_read):
+    sensors = [fake_sensor("hanging", hanging_read), fake_sensor("ok", lambda: "ok")]
+    start = time.monotonic()
+    result = reader.read(sensors)
+    assert time.monotonic() - start < 0.5
+    assert result.batch.values == ["ok"]
+    assert result.missed == ["hanging"]
+
+    # The hanging read is not submitted again while it's in flight.
+    result = reader.read(sensors)
+    assert result.batch.values == ["ok"]
+    assert result.missed == ["hanging"]
+    assert reader.misses["hanging"] == 2
+
+
+def test_reader_reports_exception_as_miss(reader):
+    def get_value():
+        raise IOError("i2c error")
+
+    result = reader.read([fake_sensor("broken", get_value)])
+    assert len(result.batch) == 0
+    assert result.missed == ["broken"]
+
+
+def test_reader_overlaps_two_phase_reads(redis_fixture):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        time.sleep(seconds)
+
+    reader = ConcurrentReader(max_workers=4, sleep=sleep)
+    sensors = [
+        TwoPhaseDummySensor("a", conversion_time=0.1),
+        fake_sensor("b", lambda: time.sleep(0.1) or "b"),
+        TwoPhaseDummySensor("c", conversion_time=0.15),
+    ]
+    try:
+        start = time.monotonic()
+        result = reader.read(sensors)
+        assert time.monotonic() - start < 0.24
+    finally:
+        reader.shutdown()
+    assert sleeps == [0.15]
+    assert result.batch.sensor_ids == ["a", "b", "c"]
+    assert result.batch.values == [1, "b", 1]
+    assert result.missed == []
+
+
+def test_two_phase_sensor_read_into(redis_fixture):
+    sensor = TwoPhaseDummySensor(conversion_time=0.01)
+    assert [m.value for m in sensor.get_data()] == [1]
@@ -0,0 +1,67 @@
+import statistics
+import time
+
+import pytest
+
+from nucuhub.infrastructure.measurements import MeasurementBatch
+from nucuhub.sensors.sampling import HighRateSampler, RingBuffer, aggregate
+from nucuhub.sensors.tests.mocks import HighRateDummySensor
+
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = RingBuffer(3)
+    for value in range(5):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.dropped == 2
+    assert list(buffer.drain()) == [2.0, 3.0, 4.0]
+    assert len(buffer) == 0
+    buffer.append(5)
+    assert list(buffer.drain()) == [5.0]
+
+
+def test_aggregate():
+    values = [float(value) for value in range(1, 101)]
+    aggregates = aggregate(values)
+    assert aggregates.count == 100
+    assert (aggregates.min, aggregates.max) == (1, 100)
+    assert aggregates.mean == pytest.approx(statistics.mean(values))
+    assert aggregates.stddev == pytest.approx(statistics.pstdev(values))
+    assert aggregates.p50 == pytest.approx(50.5)
+    assert aggregates.p90 == pytest.approx(90.1)
+    assert aggregates.p99 == pytest.approx(99.01)
+    assert aggregate([]) is None
+    assert aggregate([3.0]).p99 == 3.0
+
+
+def test_sampler_drain_into(redis_fixture):
+    sensor = HighRateDummySensor()
+    sampler = HighRateSampler(sensor, window=1)
+    for _ in range(10):
+        sampler.sample_once()
+
+    batch = MeasurementBatch()
+    sampler.drain_into(batch)
+    measurements = {m.name: m for m in batch}
+    assert measurements["vibration"].aggregates.count == 10
+    assert measurements["vibration"].value == measurements["vibration"].aggregates.mean
+    assert measurements["vibration"].aggregates.max == 9
+
+    # Every drain closes the window.
+    batch = MeasurementBatch()
+    sampler.drain_into(batch)
+    assert len(batch) == 0
+
+
+def test_sensor_high_rate_read(redis_fixture):
+    sensor = HighRateDummySensor()
+    sensor.enable()
+    sensor.start_sampling()
+    try:
+        time.sleep(0.2)
+        measurements = sensor.get_data()
+    finally:
+        sensor.stop_sampling()
+    assert [m.name for m in measurements] == ["vibration"]
+    assert measurements[0].aggregates.count > 5
+    assert measurements[0].to_dict()["aggregates"]["count"] > 5
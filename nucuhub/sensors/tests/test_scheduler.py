@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from nucuhub.sensors.scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def fake_sensor(sensor_id, sampling_interval):
+    return SimpleNamespace(id=sensor_id, sampling_interval=sampling_interval)
+
+
+def test_scheduler_per_sensor_interval(clock):
+    scheduler = DeadlineScheduler(clock)
+    fast = fake_sensor("fast", 2)
+    slow = fake_sensor("slow", 5)
+    scheduler.add(fast)
+    scheduler.add(slow)
+
+    assert scheduler.pop_due() == [fast, slow]
+    assert scheduler.time_until_next() == 2
+    clock.now += 2
+    assert scheduler.pop_due() == [fast]
+    clock.now += 2
+    assert scheduler.pop_due() == [fast]
+    assert scheduler.time_until_next() == 1
+    clock.now += 1
+    assert scheduler.pop_due() == [slow]
+
+
+def test_scheduler_does_not_drift(clock):
+    scheduler = DeadlineScheduler(clock)
+    sensor = fake_sensor("sensor", 10)
+    scheduler.add(sensor)
+    scheduler.pop_due()
+    # The read is picked up late, the next deadline stays on the original grid.
+    clock.now += 13
+    assert scheduler.pop_due() == [sensor]
+    assert scheduler.time_until_next() == 7
+
+
+def test_scheduler_skips_missed_deadlines(clock):
+    scheduler = DeadlineScheduler(clock)
+    sensor = fake_sensor("sensor", 10)
+    scheduler.add(sensor)
+    scheduler.pop_due()
+    clock.now += 35
+    assert scheduler.pop_due() == [sensor]
+    assert scheduler.pop_due() == []
+    assert scheduler.time_until_next() == 10
+
+
+def test_scheduler_add_reschedules(clock):
+    scheduler = DeadlineScheduler(clock)
+    sensor = fake_sensor("sensor", 10)
+    scheduler.add(sensor)
+    scheduler.pop_due()
+    clock.now += 3
+    scheduler.add(sensor)
+    assert scheduler.pop_due() == [sensor]
+    assert scheduler.pop_due() == []
+    assert len(scheduler) == 1
+
+
+def test_scheduler_remove(clock):
+    scheduler = DeadlineScheduler(clock)
+    scheduler.add(fake_sensor("sensor", 10))
+    scheduler.remove("sensor")
+    assert scheduler.pop_due() == []
+    assert scheduler.time_until_next() is None
+    assert len(scheduler) == 0
@@ -1,15 +1,206 @@
-import tempfile
+import os
 
+import bme680
+import pytest
+
+from nucuhub.infrastructure.measurements import MeasurementBatch
 from nucuhub.sensors.modules import CpuTemperature
+from nucuhub.sensors.modules.bme680 import Bme680, read_fields
+from nucuhub.sensors.types import SensorException
+
+
+def write(path, value):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{value}\n")
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    thermal = tmp_path / "class" / "thermal"
+    write(thermal / "thermal_zone0" / "temp", 13000)
+    write(thermal / "thermal_zone0" / "type", "cpu-thermal")
+    write(thermal / "thermal_zone10" / "temp", 41500)
+    cpus = tmp_path / "devices" / "system" / "cpu"
+    write(cpus / "cpu0" / "cpufreq" / "scaling_cur_freq", 1500000)
+    (cpus / "cpufreq").mkdir()
+    hwmon = tmp_path / "class" / "hwmon" / "hwmon0"
+    write(hwmon / "name", "nvme")
+    write(hwmon / "temp1_input", 35850)
+    write(hwmon / "temp1_label", "Composite")
+    return tmp_path
+
+
+def test_cpu_temperature_read(redis_fixture, sysfs):
+    sensor = CpuTemperature(sysfs_root=str(sysfs))
+    sensor.enable()
+    sensor.probe()
+    data = {measurement.name: measurement for measurement in sensor.get_data()}
+    assert {name: m.value for name, m in data.items()} == pytest.approx(
+        {
+            "thermal_zone0": 13.0,
+            "thermal_zone10": 41.5,
+            "cpu0_frequency": 1500.0,
+            "hwmon0_temp1": 35.85,
+        }
+    )
+    assert data["thermal_zone0"].description == "cpu-thermal temperature in celsius"
+    assert data["hwmon0_temp1"].description == "nvme Composite temperature in celsius"
+    assert set(sensor.deadbands) == set(data)
+    sensor.close()
+
+
+def test_cpu_temperature_rereads_open_files(redis_fixture, sysfs):
+    sensor = CpuTemperature(sysfs_root=str(sysfs))
+    sensor.enable()
+    sensor.probe()
+    temp = sysfs / "class" / "thermal" / "thermal_zone0" / "temp"
+    with open(temp, "r+") as f:
+        f.write("20000\n")
+    assert sensor.sample()["thermal_zone0"] == pytest.approx(20.0)
+    # The file is still read through the descriptor opened by the probe.
+    os.remove(temp)
+    batch = MeasurementBatch()
+    sensor.read_into(batch)
+    assert "thermal_zone0" in batch.names
+    sensor.close()
+    assert sensor._inputs == []
+
+
+def test_cpu_temperature_unreadable_inputs(redis_fixture, tmp_path):
+    write(tmp_path / "class" / "thermal" / "thermal_zone0" / "temp", "invalid")
+    sensor = CpuTemperature(sysfs_root=str(tmp_path))
+    sensor.enable()
+    sensor.probe()
+    with pytest.raises(SensorException):
+        sensor.get_data()
+    # The worker's circuit breaker retries it, the sensor isn't disabled.
+    assert sensor.is_enabled
+    sensor.close()
+
+    with pytest.raises(SensorException):
+        CpuTemperature(sysfs_root=str(tmp_path / "missing")).probe()
+
+
+class FakeBme680Device:
+    def __init__(self, regs, not_ready=1):
+        self.regs = regs
+        self.not_ready = not_ready
+        self.power_modes = []
+
+    def set_power_mode(self, value, blocking=True):
+        self.power_modes.append((value, blocking))
+
+    def _get_regs(self, register, length):
+        if self.not_ready:
+            self.not_ready -= 1
+            return [0] * length
+        return self.regs
+
+    def _calc_temperature(self, adc):
+        return adc
+
+    def _calc_pressure(self, adc):
+        return adc
+
+    def _calc_humidity(self, adc):
+        return adc
+
+    def _calc_gas_resistance(self, adc, gas_range):
+        return adc * 10 + gas_range
+
+
+def test_bme680_two_phase_read(redis_fixture):
+    sensor = Bme680()
+    sensor.enable()
+    regs = [0x80, 0, 0, 0x10, 0, 0, 0x08, 0x20, 0x03, 0xE8, 0, 0, 0, 0x01, 0x52]
+    sensor._sensor = FakeBme680Device(regs)
+
+    # 14 oversampling cycles and the 150 ms heater duration.
+    assert sensor.trigger() == pytest.approx(0.0327 + 0.15, abs=0.0005)
+    assert sensor._sensor.power_modes == [(bme680.FORCED_MODE, False)]
+    batch = MeasurementBatch()
+    sensor.collect_into(batch)
+    assert dict(zip(batch.names, batch.values)) == {
+        "temperature": 1.3,
+        "pressure": 2.56,
+        "humidity": 1.0,
+        "gas_resistance": 52,
+        "heat_stable": True,
+    }
+
+
+class RegisterMapI2C:
+    """
+        I2C bus with one BME680, backed by a register dump with typical calibration
+        values and the results of a forced measurement.
+    """
+
+    CALIBRATION1 = bytes.fromhex("00f4660300b48d1bd75800611bacff291e0000f8f1d0f71e00")
+    CALIBRATION2 = bytes.fromhex("3fef2f002d14789c51667ccde8120000")
+    FIELDS = bytes.fromhex("8000512a407d16305a3c0000005eb5")
+
+    def __init__(self):
+        self.registers = [0] * 256
+        self.registers[bme680.CHIP_ID_ADDR] = bme680.CHIP_ID
+        self.registers[bme680.ADDR_RES_HEAT_RANGE_ADDR] = 0x16
+        self.registers[bme680.ADDR_RES_HEAT_VAL_ADDR] = 0x2C
+        self._write(bme680.COEFF_ADDR1, self.CALIBRATION1)
+        self._write(bme680.COEFF_ADDR2, self.CALIBRATION2)
+        self._write(bme680.FIELD0_ADDR, self.FIELDS)
+
+    def _write(self, register, values):
+        self.registers[register : register + len(values)] = list(values)
+
+    def read_byte_data(self, address, register):
+        return self.registers[register]
+
+    def read_i2c_block_data(self, address, register, length):
+        return self.registers[register : register + length]
+
+    def write_byte_data(self, address, register, value):
+        self.registers[register] = value
+
+    def write_i2c_block_data(self, address, register, values):
+        self._write(register, values)
+
+
+def test_bme680_read_fields_matches_driver():
+    device = bme680.BME680(i2c_device=RegisterMapI2C())
+    assert device.get_sensor_data()
+    expected = {name: getattr(device.data, name) for name in Bme680.channels}
+    assert expected == pytest.approx(
+        {
+            "temperature": 29.31,
+            "pressure": 1047.0,
+            "humidity": 58.988,
+            "gas_resistance": 276157.29,
+            "heat_stable": True,
+        }
+    )
+    assert read_fields(device) == expected
 
 
-def test_cpu_temperature_read(redis_fixture):
-    with tempfile.NamedTemporaryFile(mode="w") as f:
-        f.writelines("13000")
-        f.flush()
+def test_bme680_unsupported_driver_reads_in_one_phase(redis_fixture, monkeypatch):
+    driver = bme680.BME680
+    monkeypatch.setattr(
+        bme680, "BME680", lambda address: driver(address, RegisterMapI2C())
+    )
+    monkeypatch.setattr(bme680, "__version__", "2.0.0")
+    sensor = Bme680()
+    sensor.enable()
+    sensor.probe()
+    assert sensor.two_phase_read is False
+    with pytest.raises(SensorException):
+        read_fields(sensor._sensor)
 
-        sensor = CpuTemperature()
-        sensor.file_name = f.name
-        sensor.enable()
-        data = sensor.get_data()
-        assert data is not None
+    batch = MeasurementBatch()
+    sensor.read_into(batch)
+    assert dict(zip(batch.names, batch.values)) == pytest.approx(
+        {
+            "temperature": 29.31,
+            "pressure": 1047.0,
+            "humidity": 58.988,
+            "gas_resistance": 276157.29,
+            "heat_stable": True,
+        }
+    )
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from nucuhub.sensors.aio import AsyncSensorsWorker
+from nucuhub.sensors.reader import AsyncConcurrentReader
+from nucuhub.sensors.tests.mocks import ExactDummySensor
+
+
+def test_async_reader_reports_timeout_as_miss():
+    release = threading.Event()
+
+    def hanging_read(batch):
+        release.wait(5)
+        batch.append("hanging", "value", 0, "late")
+
+    sensors = [
+        SimpleNamespace(
+            id="hanging",
+            read_into=hanging_read,
+            read_timeout=0.2,
+            two_phase_read=False,
+        ),
+        SimpleNamespace(
+            id="ok",
+            read_into=lambda batch: batch.append("ok", "value", 0, "ok"),
+            read_timeout=0.2,
+            two_phase_read=False,
+        ),
+    ]
+    reader = AsyncConcurrentReader(max_workers=2)
+    try:
+        start = time.monotonic()
+        result = asyncio.run(reader.read(sensors))
+        assert time.monotonic() - start < 0.5
+        assert result.batch.values == ["ok"]
+        assert result.missed == ["hanging"]
+    finally:
+        release.set()
+        reader.shutdown()
+
+
+def test_async_worker_publishes_and_runs_commands(redis_fixture):
+    redis = redis_fixture.get_redis()
+    pubsub = redis.pubsub()
+    pubsub.subscribe("sensors")
+
+    async def run_worker():
+        worker = AsyncSensorsWorker()
+        worker.sensor_modules = [ExactDummySensor]
+        handle_command = worker._handle_command
+
+        def record_thread(message):
+            # The commands don't block the event loop.
+            command_threads.append(threading.current_thread())
+            handle_command(message)
+
+        worker._handle_command = record_thread
+        task = asyncio.ensure_future(worker.run())
+        await asyncio.sleep(0.5)
+        redis.publish(
+            "sensors_cmd", json.dumps({"sensor_id": "tid", "action": "disable"})
+        )
+        await asyncio.sleep(0.5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return worker
+
+    command_threads = []
+    worker = asyncio.run(run_worker())
+
+    message = pubsub.get_message(timeout=1)
+    while message["type"] != "message":
+        message = pubsub.get_message(timeout=1)
+    assert json.loads(message["data"]) == [
+        {"channel": "dummy_sensor:tests", "timestamp": 0, "value": 2.22}
+    ]
+    assert worker.loaded_sensor_modules[0].is_enabled is False
+    assert command_threads and threading.main_thread() not in command_threads
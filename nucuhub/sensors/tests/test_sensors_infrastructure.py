@@ -3,7 +3,8 @@ import time
 
 import pytest
 
-from nucuhub.sensors.infrastructure import Database, Messaging
+from nucuhub.config import ApplicationConfig
+from nucuhub.sensors.infrastructure import ConfigStore, Database, Messaging
 
 
 @pytest.mark.parametrize(
@@ -30,6 +31,20 @@ def test_messaging_publish(redis_fixture, message_data):
     assert json.loads(message["data"]) == message_data
 
 
+def test_messaging_publish_stream(redis_fixture, monkeypatch):
+    monkeypatch.setattr(ApplicationConfig, "MESSAGING_TRANSPORT", "streams")
+    monkeypatch.setattr(ApplicationConfig, "STREAMS_MAXLEN", 10)
+    messaging = Messaging()
+    for index in range(300):
+        messaging.publish({"index": index})
+
+    redis = redis_fixture.get_redis()
+    entries = redis.xrange("sensors")
+    assert json.loads(entries[-1][1][b"data"]) == {"index": 299}
+    # The stream is trimmed approximately, whole nodes at a time.
+    assert len(entries) < 300
+
+
 def test_database_save(redis_fixture):
     redis_cli = redis_fixture.get_redis()
     database = Database()
@@ -43,3 +58,53 @@ def test_database_load(redis_fixture):
     database.save_config("test_config", {"test_data": 1})
     database = database.load_config("test_config")
     assert database == {"test_data": 1}
+
+
+def test_config_store_preload(redis_fixture):
+    redis = redis_fixture.get_redis()
+    redis.hset(ConfigStore.KEY, mapping={"s1": '{"enabled": true}', "s2": "{}"})
+    store = ConfigStore()
+    store.preload()
+    redis.delete(ConfigStore.KEY)
+    # Served from the cache, no round trip.
+    assert store.load_config("s1") == {"enabled": True}
+    assert store.load_config("s2") == {}
+    assert store.load_config("s3") is None
+
+
+def test_config_store_write_behind(redis_fixture):
+    redis = redis_fixture.get_redis()
+    store = ConfigStore(flush_interval=60)
+    for state in ("OK", "ERROR", "OK", "ERROR"):
+        store.save_config("s1", {"state": state})
+    assert redis.hget(ConfigStore.KEY, "s1") is None
+    assert store.load_config("s1") == {"state": "ERROR"}
+
+    # The changes are coalesced into a single write.
+    assert store.flush() == 1
+    assert store.flush() == 0
+    store.save_config("s1", {"state": "OK"})
+    store.close()
+    assert json.loads(redis.hget(ConfigStore.KEY, "s1")) == {"state": "OK"}
+
+    # Saves after close are written right away.
+    store.save_config("s1", {"state": "ERROR"})
+    assert json.loads(redis.hget(ConfigStore.KEY, "s1")) == {"state": "ERROR"}
+
+
+def test_config_store_background_flush(redis_fixture):
+    redis = redis_fixture.get_redis()
+    store = ConfigStore(flush_interval=0.05)
+    store.save_config("s1", {"state": "OK"})
+    time.sleep(0.2)
+    assert json.loads(redis.hget(ConfigStore.KEY, "s1")) == {"state": "OK"}
+    store.close()
+
+
+def test_config_store_migrates_database_configs(redis_fixture):
+    redis = redis_fixture.get_redis()
+    Database().save_config("s1", {"enabled": True})
+    store = ConfigStore()
+    assert store.load_config("s1") == {"enabled": True}
+    store.close()
+    assert json.loads(redis.hget(ConfigStore.KEY, "s1")) == {"enabled": True}
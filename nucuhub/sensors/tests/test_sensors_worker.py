@@ -1,13 +1,28 @@
 import concurrent.futures
 import json
+import threading
 import time
 
 import pytest
 
+from nucuhub.config import ApplicationConfig
+from nucuhub.sensors.breaker import BreakerState
 from nucuhub.sensors.main import SensorsWorker
-from nucuhub.sensors.tests.mocks import ExactDummySensor
+from nucuhub.sensors.manifest import ManifestEntry
+from nucuhub.sensors.modules.random_integer import RandomInteger
+from nucuhub.sensors.reader import ReadResult
+from nucuhub.sensors.types import SensorException, SensorModule, SensorState
 from tests.conftest import SKIP_SLOW_TESTS
 
+from nucuhub.sensors.tests.mocks import (  # isort:skip
+    BlockingReadDummySensor,
+    DeadbandDummySensor,
+    DiscoveringDummySensor,
+    DummySensor,
+    ExactDummySensor,
+    ProbedDummySensor,
+)
+
 
 @pytest.fixture
 def sensor_worker():
@@ -16,6 +31,12 @@ def sensor_worker():
     return worker
 
 
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
 @pytest.mark.skipif(SKIP_SLOW_TESTS, reason="Reading loop tests is slow!")
 def test_reading_loop(redis_fixture, sensor_worker):
     sensor_worker.sensor_modules = [ExactDummySensor]
@@ -33,7 +54,7 @@ def test_reading_loop(redis_fixture, sensor_worker):
     message = pubsub.get_message()
     assert (
         message.get("data").decode()
-        == '[{"sensor_id": "dummy_sensor", "name": "tests", "description": "tests", "timestamp": 0, "value": 2.22}]'
+        == '[{"channel": "dummy_sensor:tests", "timestamp": 0, "value": 2.22}]'
     )
 
 
@@ -55,3 +76,217 @@ def test_command_loop(redis_fixture, sensor_worker):
         executor.shutdown()
 
     assert sensor_worker.loaded_sensor_modules[0].is_enabled is False
+
+
+def test_get_commands_drains_queued_commands(redis_fixture, sensor_worker):
+    redis = sensor_worker.message_broker.client.get_redis()
+    for action in ("disable", "enable", "disable"):
+        redis.publish("sensors_cmd", json.dumps({"sensor_id": "tid", "action": action}))
+
+    commands = sensor_worker.message_broker.get_commands(timeout=1)
+    assert [command["action"] for command in commands] == [
+        "disable",
+        "enable",
+        "disable",
+    ]
+
+
+def test_enable_command_triggers_read(redis_fixture, sensor_worker):
+    sensor_worker.sensor_modules = [DummySensor]
+    sensor_worker._load_modules()
+    sensor_worker.scheduler.pop_due()
+
+    sensor_worker._handle_command({"sensor_id": "tid", "action": "enable"})
+    assert sensor_worker.sensors_by_id["tid"].is_enabled is True
+    assert sensor_worker._reading_loop_wakeup.is_set() is True
+    assert sensor_worker.scheduler.pop_due() == [sensor_worker.sensors_by_id["tid"]]
+
+
+def test_load_modules_registers_catalog(redis_fixture, sensor_worker):
+    sensor_worker.sensor_modules = [RandomInteger]
+    sensor_worker._load_modules()
+    catalog = sensor_worker.catalog.load()
+    assert catalog["random_integer:random_int_1"] == {
+        "sensor_id": "random_integer",
+        "name": "random_int_1",
+        "description": "A random integer between 0 and 15.",
+    }
+
+
+def test_prepare_data_registers_undeclared_channels(redis_fixture, sensor_worker):
+    result = ReadResult()
+    result.batch.extend(ExactDummySensor().get_data())
+    sensor_worker._prepare_data(result)
+    assert sensor_worker.catalog.load() == {
+        "dummy_sensor:tests": {
+            "sensor_id": "dummy_sensor",
+            "name": "tests",
+            "description": "tests",
+        }
+    }
+
+
+def test_import_sensor_modules_skips_disabled(redis_fixture, sensor_worker):
+    sensor_worker.manifest = {
+        "random_integer": ManifestEntry(
+            "random_integer", RandomInteger.__module__, "RandomInteger", False
+        ),
+        "missing": ManifestEntry("missing", "nucuhub.not_installed", "Missing", True),
+    }
+    # Disabled sensors and sensors that can't be imported aren't loaded.
+    assert sensor_worker._import_sensor_modules() == []
+
+    SensorModule.config_store().save_config("random_integer", {"enabled": True})
+    assert sensor_worker._import_sensor_modules() == [RandomInteger]
+
+
+def test_enable_command_loads_sensor_lazily(redis_fixture, sensor_worker):
+    sensor_worker.manifest = {
+        "random_integer": ManifestEntry(
+            "random_integer", RandomInteger.__module__, "RandomInteger", False
+        )
+    }
+    sensor_worker._load_modules()
+    assert sensor_worker.sensors_by_id == {}
+
+    sensor_worker._handle_command({"sensor_id": "random_integer", "action": "enable"})
+    sensor = sensor_worker.sensors_by_id["random_integer"]
+    assert sensor.is_enabled is True
+    assert sensor_worker.scheduler.pop_due() == [sensor]
+
+
+def test_probe_timeout_does_not_block_other_sensors(redis_fixture, sensor_worker):
+    slow, fast = ProbedDummySensor("slow"), ProbedDummySensor("fast")
+    fast.probe_done.set()
+    sensor_worker._probe_sensors([slow, fast])
+
+    # The slow sensor timed out, the fast one can be read.
+    assert slow.state == SensorState.ERROR.value
+    assert sensor_worker._due_sensors() == [fast]
+
+    # A probe that finishes late makes the sensor ready.
+    slow.probe_done.set()
+    deadline = time.monotonic() + 2
+    while "slow" not in sensor_worker._ready_sensors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.state == SensorState.OK.value
+    assert sensor_worker._due_sensors() == [slow]
+
+
+def test_prepare_data_holds_back_unchanged_readings(redis_fixture, sensor_worker):
+    sensor_worker.sensor_modules = [DeadbandDummySensor]
+    sensor_worker._load_modules()
+    published = []
+    for _ in range(3):
+        result = ReadResult()
+        result.batch.extend(DeadbandDummySensor().get_data())
+        published.append(len(sensor_worker._prepare_data(result)))
+    assert published == [1, 0, 0]
+
+
+def test_failing_sensor_recovers(redis_fixture, sensor_worker):
+    fail = [True]
+
+    class FlakySensor(ExactDummySensor):
+        def _read_into(self, batch):
+            if fail[0]:
+                raise SensorException("read failed")
+            super()._read_into(batch)
+
+    sensor_worker.sensor_modules = [FlakySensor]
+    sensor_worker._load_modules()
+    sensor = sensor_worker.sensors_by_id["tid"]
+    breaker = sensor_worker._breaker(sensor)
+    breaker.failure_threshold = 2
+    breaker.base_delay = 0.05
+    wait_for(lambda: "tid" in sensor_worker._ready_sensors)
+
+    for _ in range(2):
+        sensors = [sensor]
+        sensor_worker._record_reads(sensors, sensor_worker.reader.read(sensors))
+    assert breaker.state is BreakerState.OPEN
+    assert sensor.state == SensorState.ERROR.value
+    assert sensor.is_enabled
+
+    # The failed probe read opens the breaker again.
+    time.sleep(0.05)
+    assert sensor_worker._due_sensors() == []
+    wait_for(lambda: breaker.state is BreakerState.OPEN)
+    assert breaker.trips == 2
+
+    fail[0] = False
+    time.sleep(breaker.retry_in())
+    assert sensor_worker._due_sensors() == []
+    wait_for(lambda: breaker.state is BreakerState.CLOSED)
+    assert sensor.state == SensorState.OK.value
+    assert sensor_worker._due_sensors() == [sensor]
+
+
+def test_reprobe_updates_catalog(redis_fixture, sensor_worker):
+    sensor = DiscoveringDummySensor()
+    sensor_worker.sensor_modules = [lambda: sensor]
+    sensor_worker._load_modules()
+    wait_for(lambda: "tid" in sensor_worker._ready_sensors)
+    assert sensor_worker.catalog.load()["tid:zone0"]["description"] == (
+        "cpu temperature"
+    )
+
+    sensor.zone_type = "gpu"
+    sensor_worker._start_recovery(sensor)
+    wait_for(
+        lambda: sensor_worker.catalog.load()["tid:zone0"]["description"]
+        == "gpu temperature"
+    )
+    assert sensor_worker.catalog.load()["tid:zone0"]["description"] == (
+        "gpu temperature"
+    )
+
+
+def test_shutdown_waits_for_reads_before_closing_sensors(redis_fixture, sensor_worker):
+    sensor = BlockingReadDummySensor()
+    sensor_worker.loaded_sensor_modules.append(sensor)
+    assert sensor_worker.reader.read([sensor]).missed == ["tid"]
+
+    threading.Timer(0.1, sensor.release.set).start()
+    sensor_worker.shutdown(None, None)
+    assert sensor.events == ["read", "close"]
+
+
+def test_shutdown_doesnt_close_busy_sensors(redis_fixture, sensor_worker, monkeypatch):
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_SHUTDOWN_TIMEOUT", 0.1)
+    sensor = BlockingReadDummySensor()
+    sensor_worker.loaded_sensor_modules.append(sensor)
+    assert sensor_worker.reader.read([sensor]).missed == ["tid"]
+
+    sensor_worker.shutdown(None, None)
+    assert sensor.events == []
+    sensor.release.set()
+
+
+def test_hanging_recovery_probe_opens_breaker(redis_fixture, sensor_worker):
+    sensor = ProbedDummySensor("hanging")
+    breaker = sensor_worker._breaker(sensor)
+    breaker.base_delay = 0.05
+    breaker.trip()
+    time.sleep(breaker.retry_in())
+    assert breaker.allow()
+
+    sensor_worker._start_recovery(sensor)
+    wait_for(lambda: breaker.state is BreakerState.OPEN)
+    assert breaker.trips == 2
+    assert sensor.state == SensorState.ERROR.value
+    # The sensor is scheduled again, for its next probe read.
+    assert sensor_worker.scheduler.time_until_next() is not None
+
+    # While the probe read hangs no other one is started on the sensor.
+    time.sleep(breaker.retry_in())
+    assert breaker.allow()
+    sensor_worker._start_recovery(sensor)
+    assert breaker.state is BreakerState.OPEN
+    assert list(sensor_worker._probe_futures.values()) == ["hanging"]
+
+    # The probe read that finishes late closes the breaker.
+    sensor.probe_done.set()
+    wait_for(lambda: breaker.state is BreakerState.CLOSED)
+    assert sensor.state == SensorState.OK.value
+    assert "hanging" in sensor_worker._ready_sensors
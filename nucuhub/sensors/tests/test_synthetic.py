@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from nucuhub.config import ApplicationConfig
+from nucuhub.sensors.main import SensorsWorker
+from nucuhub.sensors.synthetic import Distribution, FarmSpec, SyntheticFarm
+from nucuhub.sensors.types import SensorException
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("normal", Distribution("normal", (20.0, 2.0))),
+        ("uniform:1,2", Distribution("uniform", (1.0, 2.0))),
+        ("bool:0.25", Distribution("bool", (0.25,))),
+    ],
+)
+def test_distribution_parse(value, expected):
+    assert Distribution.parse(value) == expected
+
+
+@pytest.mark.parametrize("value", ["poisson", "uniform:1", "normal:a,b"])
+def test_distribution_parse_invalid(value):
+    with pytest.raises(ValueError):
+        Distribution.parse(value)
+
+
+def test_distribution_generators():
+    rng = random.Random(1)
+    assert 1 <= Distribution.parse("uniform:1,2").generator(rng)() <= 2
+    assert Distribution.parse("integer:3,3").generator(rng)() == 3
+    assert Distribution.parse("bool:1").generator(rng)() is True
+    walk = Distribution.parse("walk:10,0").generator(rng)
+    assert [walk(), walk()] == [10, 10]
+
+
+def test_synthetic_farm_sensors(redis_fixture):
+    spec = FarmSpec(sensors=3, channels=2, interval=1, payload=16, seed=7)
+    sensors = [factory() for factory in SyntheticFarm(spec).sensor_factories()]
+    assert [sensor.id for sensor in sensors] == [
+        "synthetic_00000",
+        "synthetic_00001",
+        "synthetic_00002",
+    ]
+    data = sensors[0].get_data()
+    assert [m.name for m in data] == ["channel_0", "channel_1", "payload"]
+    assert len(data[2].value) == 16
+    assert sensors[0].sampling_interval == 1
+
+    # The values are reproducible with a seed.
+    again = SyntheticFarm(spec).sensor_factories()[0]()
+    assert [m.value for m in again.get_data()] == [m.value for m in data]
+
+
+def test_synthetic_sensor_injects_errors(redis_fixture):
+    spec = FarmSpec(sensors=1, error_rate=1)
+    sensor = SyntheticFarm(spec).sensor_factories()[0]()
+    with pytest.raises(SensorException):
+        sensor.get_data()
+
+
+def test_worker_loads_configured_farm(redis_fixture, monkeypatch):
+    monkeypatch.setattr(
+        ApplicationConfig, "SENSORS_SYNTHETIC", '{"sensors": 2, "interval": 1}'
+    )
+    worker = SensorsWorker()
+    worker.manifest = {}
+    worker._load_modules()
+    assert sorted(worker.sensors_by_id) == ["synthetic_00000", "synthetic_00001"]
+
+    monkeypatch.setattr(ApplicationConfig, "SENSORS_SYNTHETIC", '{"unknown": 1}')
+    assert SyntheticFarm.from_config() is None
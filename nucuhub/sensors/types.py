@@ -1,19 +1,19 @@
 import abc
 import enum
+import time
 import typing
 from dataclasses import dataclass
 
 from nucuhub.logging import get_logger
-from nucuhub.sensors.infrastructure import Database
+from nucuhub.sensors.filters import Deadband
+from nucuhub.sensors.infrastructure import ConfigStore
+from nucuhub.sensors.sampling import HighRateSampler
 
-
-@dataclass
-class SensorMeasurement:
-    sensor_id: str
-    name: str
-    description: str
-    timestamp: int
-    value: typing.Union[int, float, str]
+from nucuhub.infrastructure.measurements import (  # isort:skip
+    Aggregates,
+    MeasurementBatch,
+    SensorMeasurement,
+)
 
 
 @dataclass
@@ -42,13 +42,38 @@ class SensorException(Exception):
 
 
 class SensorModule(abc.ABC):
+    # Seconds between two reads of the sensor.
+    sampling_interval: float = 10
+    # Seconds after which a read is reported as missed.
+    read_timeout: float = 5
+    # Seconds after which a probe that didn't finish marks the sensor as failed.
+    probe_timeout: float = 10
+    # Samples per second of high-rate sensors. They are sampled on a dedicated thread
+    # and every read outputs the aggregates of the samples taken since the last read.
+    sample_rate: typing.Optional[float] = None
+    # Sensors with a two-phase read implement _trigger and _collect_into; the worker
+    # triggers all of them, waits once for the longest conversion and then collects
+    # the results, so the conversions overlap.
+    two_phase_read: bool = False
+    _sampler: typing.Optional[HighRateSampler] = None
+    # Maps the name of every channel the sensor outputs to its description.
+    channels: typing.Dict[str, str] = {}
+    # Maps channel names to the deadband used to hold back readings that barely changed.
+    deadbands: typing.Dict[str, Deadband] = {}
     _config: SensorConfig = None
-    _db: Database = Database()
+    _db: ConfigStore = ConfigStore()
     _logger = get_logger("SensorModule")
 
     def __init__(self):
         self._initialize()
 
+    @classmethod
+    def config_store(cls) -> ConfigStore:
+        """
+            Returns the store shared by the sensors to persist their config.
+        """
+        return cls._db
+
     def _save_config(self):
         if self._config:
             self._db.save_config(self._config.id, self._config.__dict__)
@@ -69,6 +94,12 @@ class SensorModule(abc.ABC):
         """
         raise NotImplementedError()
 
+    def _probe(self):
+        """
+            Sets the sensor hardware up, e.g. finds the device and writes its settings.
+            Custom logic to be implemented in sub-classes.
+        """
+
     def _get_data(self) -> typing.List[SensorMeasurement]:
         """
             Performs a read from the sensor.
@@ -76,6 +107,34 @@ class SensorModule(abc.ABC):
         """
         raise NotImplementedError()
 
+    def _sample(self) -> typing.Dict[str, float]:
+        """
+            Takes one sample of every channel, to be implemented by high-rate sensors.
+        :return: A dict mapping the channel names to their sample.
+        """
+        raise NotImplementedError()
+
+    def _trigger(self) -> float:
+        """
+            Starts a conversion, to be implemented by sensors with a two-phase read.
+        :return: The seconds until the results can be collected.
+        """
+        raise NotImplementedError()
+
+    def _collect_into(self, batch: MeasurementBatch):
+        """
+            Appends the results of the conversion started by _trigger to the batch.
+        """
+        raise NotImplementedError()
+
+    def _read_into(self, batch: MeasurementBatch):
+        """
+            Performs a read from the sensor and appends the measurements to the batch.
+            Sub-classes can implement it instead of _get_data to avoid creating a
+            SensorMeasurement for every value.
+        """
+        batch.extend(self._get_data())
+
     @property
     def id(self) -> str:
         return self._config.id
@@ -112,11 +171,77 @@ class SensorModule(abc.ABC):
         """
             Performs a sensor read and returns the data.
         """
+        batch = MeasurementBatch()
+        self.read_into(batch)
+        return list(batch)
+
+    def probe(self):
+        """
+            Sets the sensor hardware up. It is called once by the worker, on a separate
+            thread, before the sensor is read for the first time and it may block.
+        """
+        self._probe()
+
+    def read_into(self, batch: MeasurementBatch):
+        """
+            Performs a sensor read and appends the data to the batch.
+        """
+        if not self._config.enabled:
+            raise SensorException(
+                "Invalid operation: performing read on disabled sensor."
+            )
+        if self._sampler is not None:
+            self._sampler.drain_into(batch)
+        elif self.two_phase_read:
+            time.sleep(self.trigger())
+            self.collect_into(batch)
+        else:
+            self._read_into(batch)
+
+    def trigger(self) -> float:
+        """
+            Starts a conversion of a sensor with a two-phase read.
+        :return: The seconds to wait before calling collect_into.
+        """
         if not self._config.enabled:
             raise SensorException(
                 "Invalid operation: performing read on disabled sensor."
             )
-        return self._get_data()
+        return self._trigger()
+
+    def collect_into(self, batch: MeasurementBatch):
+        """
+            Appends the results of the conversion started by trigger to the batch.
+        """
+        self._collect_into(batch)
+
+    def sample(self) -> typing.Dict[str, float]:
+        """
+            Takes one sample of a high-rate sensor.
+        """
+        return self._sample()
+
+    def start_sampling(self):
+        """
+            Starts sampling a high-rate sensor, it does nothing for the other sensors.
+        """
+        if self.sample_rate and self._sampler is None:
+            self._sampler = HighRateSampler(self, self.sampling_interval)
+            self._sampler.start()
+
+    def stop_sampling(self):
+        """
+            Stops sampling a high-rate sensor.
+        """
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+    def close(self):
+        """
+            Releases the resources held by the sensor, it is called when the worker stops.
+        """
+        self.stop_sampling()
 
     def enable(self):
         """
@@ -138,5 +263,6 @@ class SensorModule(abc.ABC):
         """
             Sets the sensor state.
         """
-        self._config.state = sensor_state.value
-        self._save_config()
+        if self._config.state != sensor_state.value:
+            self._config.state = sensor_state.value
+            self._save_config()